@@ -0,0 +1,83 @@
+from typing import Optional, Type
+
+import numpy as np
+import pytest
+
+from wwclouds.helpers.axis_helper import AxisHelper
+from wwclouds.helpers.latitude_helper import LatitudeHelper
+from wwclouds.helpers.longitude_helper import LongitudeHelper
+
+
+def get_indexes_from_axis_per_value(axis_values: np.ndarray, from_axis_val: float, to_axis_val: float,
+                                    axis_helper: Type[AxisHelper], edge_size: int = 0,
+                                    max_length: Optional[int] = None) -> list[int]:
+    # The linear scan which EqcBlend used before the searchsorted index finder
+    indexes = []
+    for index, value in enumerate(axis_values):
+        if axis_helper.is_between(value, from_axis_val, to_axis_val):
+            if len(indexes) == 0:
+                for i in range(edge_size):
+                    indexes.append((index - (1 + i)) % len(axis_values))
+            indexes.append(index)
+        elif len(indexes) != 0:
+            for i in range(edge_size):
+                indexes.append((index + i) % len(axis_values))
+            break
+
+    if max_length is not None and max_length < len(indexes):
+        middle_axis_val = axis_helper.get_middle(from_axis_val, to_axis_val)
+        start_index = 0
+        end_index = len(indexes) - 1
+        for _ in range(len(indexes) - max_length):
+            start_val, end_val = (axis_values[indexes[i]] for i in (start_index, end_index))
+            start_diff, end_diff = (axis_helper.get_diff(val, middle_axis_val) for val in (start_val, end_val))
+            if start_diff > end_diff:
+                start_index += 1
+            else:
+                end_index -= 1
+        indexes = indexes[start_index:(end_index + 1)]
+
+    return indexes
+
+
+def get_longitude_axis(lon_0: float, half_width: float = 81.0, count: int = 400) -> np.ndarray:
+    lons = lon_0 - half_width + 2 * half_width * (np.arange(count) + 0.5) / count
+    return (lons + 180) % 360 - 180
+
+
+def assert_indexes_match(axis_values: np.ndarray, from_axis_val: float, to_axis_val: float,
+                         axis_helper: Type[AxisHelper], **kwargs) -> None:
+    expected = get_indexes_from_axis_per_value(axis_values, from_axis_val, to_axis_val, axis_helper, **kwargs)
+    actual = axis_helper.get_indexes_from_axis(axis_values, from_axis_val, to_axis_val, **kwargs)
+    np.testing.assert_array_equal(actual, np.array(expected, dtype=np.int64))
+
+
+@pytest.mark.parametrize("lon_0", [0.0, 140.7, 170.0, -137.2, -175.0])
+@pytest.mark.parametrize("edge_size", [0, 1])
+def test_longitude_indexes_match_linear_scan(lon_0, edge_size):
+    lons = get_longitude_axis(lon_0)
+    random_state = np.random.RandomState(0)
+    for from_lon, to_lon in random_state.uniform(-180, 180, (200, 2)):
+        assert_indexes_match(lons, from_lon, to_lon, LongitudeHelper, edge_size=edge_size)
+
+
+@pytest.mark.parametrize("from_lon, to_lon", [(170.0, -170.0), (179.0, -179.5), (150.0, 180.0), (-180.0, -150.0)])
+@pytest.mark.parametrize("edge_size", [0, 1])
+def test_longitude_indexes_match_linear_scan_across_antimeridian(from_lon, to_lon, edge_size):
+    for lon_0 in (175.0, 180.0, -175.0):
+        assert_indexes_match(get_longitude_axis(lon_0), from_lon, to_lon, LongitudeHelper, edge_size=edge_size)
+
+
+def test_longitude_indexes_on_axis_values():
+    lons = get_longitude_axis(180.0, count=360)  # The antimeridian lies between lons[179] and lons[180]
+    for from_lon, to_lon in ((lons[10], lons[20]), (lons[170], lons[190]), (lons[-1], lons[0])):
+        assert_indexes_match(lons, from_lon, to_lon, LongitudeHelper, edge_size=1)
+
+
+@pytest.mark.parametrize("max_length", [None, 1, 37, 1000])
+@pytest.mark.parametrize("edge_size", [0, 5])
+def test_latitude_indexes_match_linear_scan(max_length, edge_size):
+    lats = np.flip(81.0 - 162.0 * (np.arange(300) + 0.5) / 300)
+    random_state = np.random.RandomState(1)
+    for from_lat, to_lat in random_state.uniform(-90, 90, (200, 2)):
+        assert_indexes_match(lats, from_lat, to_lat, LatitudeHelper, edge_size=edge_size, max_length=max_length)
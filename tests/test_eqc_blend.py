@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+import xarray as xr
+from pyresample import AreaDefinition
+
+from wwclouds.data_types.axis import Axis
+from wwclouds.data_types.bounding_box import BoundingBox
+from wwclouds.domains.processing.blend_executor import BlendExecutor, BlendExecutorType
+from wwclouds.domains.processing.eqc_blend import EqcBlend
+from wwclouds.helpers.area_axis_helper import AreaAxisHelper
+
+METRES_PER_DEGREE = Axis.LAT.length_in_metres / Axis.LAT.degree_count
+
+
+def create_latitude_data_array(lon_0: float) -> xr.DataArray:
+    # Every pixel holds its own latitude, so that the rows chosen by the blend can be checked against its area.
+    # The areas are wide enough to cover the seams between three satellites.
+    area_extent = tuple(degrees * METRES_PER_DEGREE for degrees in (-150, -81, 150, 81))
+    projection = {"proj": "eqc", "lon_0": lon_0, "R": Axis.LAT.length_in_metres / np.pi, "units": "m"}
+    area = AreaDefinition(f"eqc_{lon_0}", "synthetic satellite", f"eqc_{lon_0}", projection, 300, 90, area_extent)
+    _, lats = AreaAxisHelper.get_lonlat_axes(area)
+    values = np.repeat(lats[:, np.newaxis], area.width, axis=1)
+    attrs = {"area": area, "start_time": datetime(2022, 2, 1, 10), "end_time": datetime(2022, 2, 1, 10, 10)}
+    return xr.DataArray(values, dims=("y", "x"), attrs=attrs)
+
+
+def blend(data_arrays: list[xr.DataArray], bbox: BoundingBox = None) -> tuple[xr.DataArray, tuple[int, int]]:
+    with EqcBlend(latitude_range=(-70, 70), use_remap_plan_cache=False, bbox=bbox,
+                  executor=BlendExecutor(BlendExecutorType.SERIAL)) as eqc_blend:
+        return eqc_blend(data_arrays), eqc_blend.remap_plan.offset
+
+
+@pytest.mark.parametrize("bbox", [BoundingBox(-30, -20, 40, 35), BoundingBox(100, -45, -150, 5)])
+def test_bbox_across_equator_keeps_rows_at_their_latitudes(bbox):
+    data_arrays = [create_latitude_data_array(lon_0) for lon_0 in (0.0, 120.0, -120.0)]
+    window, (lat_offset, lon_offset) = blend(data_arrays, bbox)
+
+    min_x, min_y, max_x, max_y = window.attrs["area"].area_extent
+    pixel_height = (max_y - min_y) / window.shape[0]
+    row_latitudes = (max_y - np.arange(window.shape[0]) * pixel_height) / METRES_PER_DEGREE
+    assert row_latitudes[-1] < 0 < row_latitudes[0]
+    assert not np.isnan(window.values).any()
+    np.testing.assert_allclose(window.values, np.repeat(row_latitudes[:, np.newaxis], window.shape[1], axis=1),
+                               atol=pixel_height / METRES_PER_DEGREE)
+    assert row_latitudes[0] > bbox.max_lat - pixel_height / METRES_PER_DEGREE
+    assert row_latitudes[-1] < bbox.min_lat + pixel_height / METRES_PER_DEGREE
+
+    earth, _ = blend(data_arrays)
+    height, width = window.shape
+    earth_window = np.take(earth.values[lat_offset:lat_offset + height], np.arange(lon_offset, lon_offset + width),
+                           axis=1, mode="wrap")
+    np.testing.assert_array_equal(window.values, earth_window)
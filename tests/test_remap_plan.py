@@ -0,0 +1,144 @@
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from wwclouds.data_types.output_encoding import OutputEncoding
+from wwclouds.domains.processing.eqc_blend import EqcBlend
+from wwclouds.domains.processing.remap_plan import RemapPlan, RemapPlanCache, RemapSection, _assign_values, _blend_seam
+from wwclouds.helpers.math_helper import MathHelper
+
+
+def assign_values_per_pixel(dst: np.ndarray, lat_indexes: np.ndarray, lon_indexes: np.ndarray, values: np.ndarray,
+                            encoding: OutputEncoding) -> None:
+    # The pixel by pixel loop which EqcBlend used before the scatter was vectorized
+    for i, lat_index in enumerate(lat_indexes):
+        for j, lon_index in enumerate(lon_indexes):
+            value = values[..., i, j]
+            for band_index in np.ndindex(dst.shape[:-2]):
+                if np.isnan(value[band_index]):
+                    continue
+                dst[band_index + (lat_index, lon_index)] = encoding.encode(value[band_index][np.newaxis])[0]
+
+
+def create_values(shape: tuple[int, ...], seed: int = 0) -> np.ndarray:
+    random_state = np.random.RandomState(seed)
+    values = random_state.uniform(200, 320, shape)
+    values[random_state.uniform(size=shape) < 0.2] = np.nan
+    return values
+
+
+@pytest.mark.parametrize("encoding", [OutputEncoding(), OutputEncoding.brightness_temperature_uint16()])
+@pytest.mark.parametrize("band_shape", [(), (3,)])
+def test_assign_values_matches_pixel_loop(encoding, band_shape):
+    lat_indexes, lon_indexes = np.array([2, 3, 4, 7]), np.array([9, 0, 1, 2, 5])  # Wraps around the antimeridian
+    values = create_values(band_shape + (len(lat_indexes), len(lon_indexes)))
+    expected = np.full(band_shape + (8, 10), encoding.fill_value, dtype=encoding.dtype)
+    actual = expected.copy()
+
+    assign_values_per_pixel(expected, lat_indexes, lon_indexes, values, encoding)
+    _assign_values(actual, lat_indexes, lon_indexes, values, encoding)
+
+    np.testing.assert_array_equal(actual, expected)
+
+
+@pytest.mark.parametrize("band_shape", [(), (2,)])
+def test_assign_values_keeps_last_write_of_duplicate_indexes(band_shape):
+    encoding = OutputEncoding()
+    lat_indexes, lon_indexes = np.array([1, 1, 2, 1, 3]), np.array([4, 5, 4, 6, 5])
+    values = create_values(band_shape + (len(lat_indexes), len(lon_indexes)), seed=1)
+    values[..., 3, 2] = np.nan  # The last write of a pixel is skipped when it is NaN
+    values[..., 3, 4] = 300.0
+    expected = np.full(band_shape + (5, 8), encoding.fill_value, dtype=encoding.dtype)
+    actual = expected.copy()
+
+    assign_values_per_pixel(expected, lat_indexes, lon_indexes, values, encoding)
+    _assign_values(actual, lat_indexes, lon_indexes, values, encoding)
+
+    np.testing.assert_array_equal(actual, expected)
+    np.testing.assert_array_equal(actual[..., 1, 5], 300.0)
+
+
+def blend_seam_per_pixel(dst: np.ndarray, section: RemapSection, values_list: list[np.ndarray],
+                         lon_indexes_length: int, merge_intensity: int) -> None:
+    # The pixel by pixel loop which EqcBlend used to blend two satellites before the seam kernel
+    values1, values2 = (values_list[source_index] for source_index in section.source_indexes)
+    (lat_indexes1, lat_indexes2), (lon_indexes1, lon_indexes2) = section.source_lat_indexes, section.source_lon_indexes
+    for lat_index1, lat_index2, new_lat_index in zip(lat_indexes1, lat_indexes2, section.lat_indexes):
+        for i, (lon_index1, lon_index2, new_lon_index) \
+                in enumerate(zip(lon_indexes1, lon_indexes2, section.lon_indexes)):
+            values = [values1[lat_index1][lon_index1], values2[lat_index2][lon_index2]]
+            values_filtered = list(filter(lambda val: not np.isnan(val), values))
+            if len(values_filtered) == 0:
+                continue
+            elif len(values_filtered) == 1:
+                value = values_filtered[0]
+            else:
+                progress = ((i / lon_indexes_length) - 0.5) * merge_intensity
+                weight = MathHelper.sigmoid(progress)
+                value = values_filtered[0] * (1 - weight) + values_filtered[1] * weight
+            dst[new_lat_index][new_lon_index] = value
+
+
+def get_seam_weights(lon_indexes_length: int, count: int, merge_intensity: int) -> np.ndarray:
+    blend = SimpleNamespace(merge_intensity=merge_intensity)
+    return EqcBlend._EqcBlend__get_seam_weights(blend, lon_indexes_length, count)
+
+
+@pytest.mark.parametrize("merge_intensity", [1, 60])
+def test_blend_seam_matches_pixel_loop(merge_intensity):
+    encoding = OutputEncoding()
+    lon_indexes_length, lon_count = 12, 11  # The section is cut to the shorter source, as in EqcBlend
+    values1, values2 = create_values((6, 14), seed=2), create_values((6, 14), seed=3)
+    values1[1, 3:6], values2[1, 3:6] = np.nan, np.nan  # NaN on either side
+    values1[3, 9:11], values2[2, 10:12] = np.nan, np.nan  # NaN on both sides of the same pixels
+    section = RemapSection(
+        (0, 1),
+        (np.arange(1, 6), np.arange(0, 5)),
+        (np.arange(2, 2 + lon_count), np.arange(3, 3 + lon_count)),
+        np.arange(10, 15),
+        np.arange(20, 20 + lon_count),
+        seam_weights=get_seam_weights(lon_indexes_length, lon_count, merge_intensity)
+    )
+    expected = np.full((16, 32), encoding.fill_value, dtype=encoding.dtype)
+    actual = expected.copy()
+
+    blend_seam_per_pixel(expected, section, [values1, values2], lon_indexes_length, merge_intensity)
+    section.apply(actual, [values1, values2], encoding)
+
+    np.testing.assert_allclose(actual, expected, rtol=1e-12)
+    assert np.isnan(actual[12, 27:29]).all()
+
+
+def test_seam_weights_at_section_edges():
+    seam_weights = get_seam_weights(12, 11, 60)
+
+    assert seam_weights[0] == pytest.approx(MathHelper.sigmoid(-30))
+    assert seam_weights[-1] == pytest.approx(MathHelper.sigmoid((10 / 12 - 0.5) * 60))
+    assert np.all(np.diff(seam_weights) > 0)
+    blended = _blend_seam([np.zeros((1, 11)), np.ones((1, 11))], seam_weights, np.dtype(np.float64))
+    np.testing.assert_allclose(blended[0], seam_weights)
+
+
+def create_remap_plan(lat_count: int) -> RemapPlan:
+    section = RemapSection((0,), (np.arange(lat_count),), (np.arange(4),), np.arange(lat_count), np.arange(4))
+    return RemapPlan(0.1, 0.1, (0, lat_count - 1), [section], (lat_count, 4))
+
+
+def test_remap_plan_cache_evicts_least_recently_used_plans(tmp_path):
+    create_remap_plan(1000).save(str(tmp_path / "plan.npz"))
+    plan_size = os.path.getsize(tmp_path / "plan.npz")
+    directory = tmp_path / "remap_plans"
+    cache = RemapPlanCache(str(directory), max_bytes=int(plan_size * 2.5), max_plans_in_memory=0)
+    for key in "abc":
+        cache.set(key, create_remap_plan(1000))
+        time.sleep(0.01)
+    assert sorted(os.listdir(directory)) == ["b.npz", "c.npz"]
+
+    assert cache.get("b") is not None  # Used again, so it is kept instead of the older plan
+    time.sleep(0.01)
+    cache.set("d", create_remap_plan(1000))
+    assert sorted(os.listdir(directory)) == ["b.npz", "d.npz"]
+    assert cache.get("a") is None and cache.get("c") is None
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+import xarray as xr
+from pyresample import AreaDefinition
+from satpy import Scene
+
+from wwclouds.domains.processing.scene_ext import SceneExt
+
+
+def create_scene_ext(values: np.ndarray, pixel_size: float) -> SceneExt:
+    height, width = values.shape
+    area = AreaDefinition("eqc_area", "eqc area", "eqc_area", {"proj": "eqc", "lon_0": 0.0, "units": "m"},
+                          width, height, (0, 0, width * pixel_size, height * pixel_size))
+    scn = Scene()
+    scn["IR_108"] = xr.DataArray(values, dims=("y", "x"), attrs={"area": area, "resolution": pixel_size})
+    return SceneExt.from_scene(scn)
+
+
+@pytest.mark.parametrize("resolution, factor", [(2000, 2), (3000.403165817, 3), (2500, 2), (1500, 1)])
+def test_decimate_to_resolution_rounds_only_near_whole_ratios(resolution, factor):
+    scn = create_scene_ext(np.arange(144, dtype=np.float64).reshape(12, 12), 1000.134)
+    decimated_scn = scn.decimate_to_resolution(resolution)
+
+    assert decimated_scn["IR_108"].shape == (12 // factor, 12 // factor)
+    assert decimated_scn.area.shape == (12 // factor, 12 // factor)
+    assert decimated_scn.area.pixel_size_x == pytest.approx(1000.134 * factor)
+
+
+def test_decimate_to_resolution_skips_nan_pixels():
+    values = np.arange(16, dtype=np.float64).reshape(4, 4)
+    values[0, 0] = np.nan
+    values[2:, 2:] = np.nan
+    decimated = create_scene_ext(values, 1000.0).decimate_to_resolution(2000)["IR_108"].values
+
+    np.testing.assert_array_equal(decimated, [[(1 + 4 + 5) / 3, 4.5], [10.5, np.nan]])
@@ -0,0 +1,182 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+from aiohttp import web
+from satpy import Scene
+from satpy.readers.seviri_l1b_native_hdr import get_native_header, native_trailer
+
+from wwclouds import config
+from wwclouds.domains.satellite.downloader import DownloadEngine, Meteosat
+from wwclouds.domains.satellite.downloader.download_engine import BandwidthLimiter
+from wwclouds.domains.satellite.downloader.seviri_native_subset import SeviriNativeSubset
+from wwclouds.domains.satellite.satellite_enum import SatelliteEnum
+
+PRODUCT_ID = "MSG4-SEVI-MSG15-0100-NA-20220201101241.123000000Z-NA"
+LINE_COUNT = 8
+VISIR_RECORD_SIZE = 65 + int(3712 * 1.25)
+HRV_RECORD_SIZE = 65 + int(5568 * 1.25)
+LINE_SIZE = 11 * VISIR_RECORD_SIZE + 3 * HRV_RECORD_SIZE
+
+
+def create_native_file(number_columns_visir: int = 3712) -> bytes:
+    header = np.zeros(1, dtype=get_native_header(with_archive_header=True))
+    secondary_header = header["15_SECONDARY_PRODUCT_HEADER"]
+    for name, value in {
+        "SelectedBandIDs": "XXXXXXXXXXXX",
+        "NorthLineSelectedRectangle": "3712", "SouthLineSelectedRectangle": "1",
+        "WestColumnSelectedRectangle": "3712", "EastColumnSelectedRectangle": "1",
+        "NumberLinesVISIR": str(LINE_COUNT), "NumberColumnsVISIR": str(number_columns_visir),
+        "NumberLinesHRV": str(3 * LINE_COUNT), "NumberColumnsHRV": "11136"
+    }.items():
+        secondary_header[name]["Value"] = value.encode("latin-1")
+    data_header = header["15_DATA_HEADER"]
+    data_header["SatelliteStatus"]["SatelliteDefinition"]["SatelliteId"] = 324
+    earth_model = data_header["GeometricProcessing"]["EarthModel"]
+    earth_model["TypeOfEarthModel"] = 2
+    earth_model["EquatorialRadius"] = 6378.169
+    earth_model["NorthPolarRadius"] = earth_model["SouthPolarRadius"] = 6356.5838
+    header_bytes = bytearray(header.tobytes())
+    header_bytes[:36] = b"FormatName                  : NATIVE"
+    random_state = np.random.RandomState(0)
+    lines = random_state.randint(0, 256, LINE_COUNT * LINE_SIZE, dtype=np.uint8).tobytes()
+    return bytes(header_bytes) + lines + bytes(native_trailer.itemsize)
+
+
+class NativeFileServer:
+    def __init__(self, native_file: bytes, serve_ranges: bool = True, interrupted_range_requests: int = 0):
+        self.native_file = native_file
+        self.serve_ranges = serve_ranges
+        self.interrupted_range_requests = interrupted_range_requests
+        self.bytes_served = 0
+        self.url = None
+        self.__runner = None
+
+    async def __aenter__(self) -> "NativeFileServer":
+        app = web.Application()
+        app.router.add_post("/token", self.__token)
+        app.router.add_get("/browse/{tail:.*}", self.__browse)
+        app.router.add_get("/download/{tail:.*}", self.__download)
+        self.__runner = web.AppRunner(app)
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, "127.0.0.1", 0).start()
+        host, port = self.__runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.__runner.cleanup()
+
+    async def __token(self, request: web.Request) -> web.Response:
+        return web.json_response({"access_token": "token", "expires_in": 3600})
+
+    async def __browse(self, request: web.Request) -> web.Response:
+        return web.json_response({"products": [{"id": PRODUCT_ID}]})
+
+    async def __download(self, request: web.Request) -> web.Response:
+        range_header = request.headers.get("Range")
+        if range_header is None or not self.serve_ranges:
+            self.bytes_served += len(self.native_file)
+            return web.Response(body=self.native_file)
+        if self.interrupted_range_requests > 0:
+            self.interrupted_range_requests -= 1
+            return await self.__interrupt(request)
+        file_size = len(self.native_file)
+        byte_ranges = [tuple(map(int, byte_range.split("-"))) for byte_range in range_header[6:].split(",")]
+        self.bytes_served += sum(stop + 1 - start for start, stop in byte_ranges)
+        if len(byte_ranges) == 1:
+            start, stop = byte_ranges[0]
+            return web.Response(status=206, body=self.native_file[start:stop + 1],
+                                headers={"Content-Range": f"bytes {start}-{stop}/{file_size}"})
+        body = b"".join(
+            f"\r\n--boundary\r\nContent-Range: bytes {start}-{stop}/{file_size}\r\n\r\n".encode("latin-1")
+            + self.native_file[start:stop + 1]
+            for start, stop in byte_ranges
+        ) + b"\r\n--boundary--\r\n"
+        return web.Response(status=206, body=body,
+                            headers={"Content-Type": "multipart/byteranges; boundary=boundary"})
+
+    @staticmethod
+    async def __interrupt(request: web.Request) -> web.StreamResponse:
+        # The connection is closed halfway through the announced body
+        response = web.StreamResponse(status=206, headers={"Content-Type": "multipart/byteranges; boundary=boundary"})
+        response.content_length = 1024
+        await response.prepare(request)
+        await response.write(bytes(512))
+        request.transport.close()
+        return response
+
+
+def download(monkeypatch, native_file: bytes, bands: list[str], serve_ranges: bool = True,
+             interrupted_range_requests: int = 0) -> tuple[str, int]:
+    async def download_with_server(engine: DownloadEngine) -> tuple[str, int]:
+        async with NativeFileServer(native_file, serve_ranges, interrupted_range_requests) as server:
+            monkeypatch.setattr(config, "METEOSAT_TOKEN_ENDPOINT", f"{server.url}/token")
+            monkeypatch.setattr(config, "METEOSAT_BROWSE_ENDPOINT", f"{server.url}/browse")
+            monkeypatch.setattr(config, "METEOSAT_DOWNLOAD_ENDPOINT", f"{server.url}/download")
+            file_reader = await Meteosat(SatelliteEnum.METEOSAT11).async_download(
+                engine, bands, datetime(2022, 2, 1, 10, 20)
+            )
+            return file_reader.filepaths[0], server.bytes_served
+
+    return DownloadEngine.run(download_with_server)
+
+
+def load_counts(filepath: str, channel: str) -> np.ndarray:
+    scn = Scene([filepath], reader="seviri_l1b_native")
+    scn.load([channel], calibration="counts")
+    return scn[channel].values
+
+
+@pytest.fixture(autouse=True)
+def meteosat_config(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "DATA_PATH_DOWNLOADS", str(tmp_path))
+    monkeypatch.setattr(config, "METEOSAT_BYTE_RANGES_PER_REQUEST", 3)
+
+
+def test_subset_is_loaded_by_reader(monkeypatch, tmp_path):
+    native_file = create_native_file()
+    subset_filepath, bytes_served = download(monkeypatch, native_file, ["IR_108"])
+
+    assert subset_filepath.endswith(f"{PRODUCT_ID}.IR_108.nat")
+    assert bytes_served == len(native_file) - LINE_COUNT * (LINE_SIZE - VISIR_RECORD_SIZE)
+    header = np.frombuffer(open(subset_filepath, "rb").read(SeviriNativeSubset.header_size),
+                           dtype=SeviriNativeSubset.header_dtype)[0]
+    assert header["15_SECONDARY_PRODUCT_HEADER"]["SelectedBandIDs"]["Value"] == b"--------X---"
+
+    native_filepath = str(tmp_path / f"{PRODUCT_ID}.nat")
+    with open(native_filepath, "wb") as file:
+        file.write(native_file)
+    np.testing.assert_array_equal(load_counts(subset_filepath, "IR_108"), load_counts(native_filepath, "IR_108"))
+
+
+def test_interrupted_byte_ranges_are_requested_again(monkeypatch):
+    native_file = create_native_file()
+    subset_filepath, _ = download(monkeypatch, native_file, ["IR_108"], interrupted_range_requests=2)
+
+    assert subset_filepath.endswith(f"{PRODUCT_ID}.IR_108.nat")
+    assert load_counts(subset_filepath, "IR_108").shape == (LINE_COUNT, 3712)
+
+
+def test_whole_file_is_downloaded_without_byte_ranges(monkeypatch):
+    # The bytes are counted as the engine receives them, as the server may send more than is read
+    bytes_received = []
+    consume = BandwidthLimiter.consume
+
+    async def count_and_consume(limiter: BandwidthLimiter, byte_count: int) -> None:
+        bytes_received.append(byte_count)
+        await consume(limiter, byte_count)
+
+    monkeypatch.setattr(BandwidthLimiter, "consume", count_and_consume)
+    native_file = create_native_file()
+    filepath, _ = download(monkeypatch, native_file, ["IR_108"], serve_ranges=False)
+
+    assert filepath.endswith(f"{PRODUCT_ID}.nat")
+    assert open(filepath, "rb").read() == native_file
+    assert sum(bytes_received) == len(native_file)
+
+
+def test_subset_requires_padded_visir_columns():
+    native_file = create_native_file(number_columns_visir=3716)
+    with pytest.raises(ValueError):
+        SeviriNativeSubset(native_file[:SeviriNativeSubset.header_size], len(native_file), ["IR_108"])
@@ -1,3 +1,4 @@
+import os
 import sys
 import warnings
 
@@ -8,8 +9,14 @@ if ROOT_DIR not in sys.path:
 if not sys.warnoptions:
     warnings.simplefilter("ignore")
 
+for threads_variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(threads_variable, "1")  # Parallelism is handled by dask, not by nested numpy threads
+
 from wwclouds.domains.product import ProductCreator
 
 
 if __name__ == '__main__':
-    ProductCreator.from_args().create_products()
+    if sys.argv[1:2] == ["prewarm"]:
+        ProductCreator.prewarm_from_args(sys.argv[2:]).prewarm_resample_cache()
+    else:
+        ProductCreator.from_args().create_products()
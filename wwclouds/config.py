@@ -16,9 +16,14 @@ DATA_PATH_WORLD_MAP = f"{DATA_PATH_MAPNIK}/world_map"
 DATA_PATH_PRODUCT = f"{DATA_PATH}/product"
 DATA_PATH_DATASETS = f"{DATA_PATH}/datasets"
 DATA_PATH_DOWNLOADS = f"{DATA_PATH}/downloads"
+DATA_PATH_REMAP_PLANS = f"{DATA_PATH}/remap_plans"
+REMAP_PLANS_MAX_BYTES = 5 * 2 ** 30
+DATA_PATH_SCRATCH = f"{DATA_PATH}/scratch"
+DATA_PATH_MOSAIC_STORE = f"{DATA_PATH}/mosaic_store"
 
 DATA_PATH_SATPY = f"{DATA_PATH}/satpy"
 DATA_PATH_SATPY_RESAMPLE_CACHE = f"{DATA_PATH_SATPY}/resample_cache"
+RESAMPLE_CACHE_MAX_BYTES = 20 * 2 ** 30
 
 METEOSAT_API_ENDPOINT = "https://api.eumetsat.int"
 METEOSAT_TOKEN_ENDPOINT = f"{METEOSAT_API_ENDPOINT}/token"
@@ -32,3 +37,17 @@ except KeyError as e:
     raise KeyError(f"please set METEOSAT credentials in credentials.ini: {e} not found")
 
 CPU_COUNT = mp.cpu_count()
+
+DOWNLOAD_MAX_CONCURRENCY = 4 * CPU_COUNT
+DOWNLOAD_CONNECTIONS_PER_HOST = 16
+DOWNLOAD_MAX_BYTES_PER_SECOND = None  # Unlimited
+DOWNLOAD_TIMEOUT_SECONDS = 600  # Per satellite
+DOWNLOAD_RETRIES = 3  # Interrupted transfers are resumed this many times
+METEOSAT_BYTE_RANGES_PER_REQUEST = 128  # Channel subsets are fetched in batches of this many byte ranges
+S3_TRANSFER_MAX_CONCURRENCY = 4 * CPU_COUNT
+S3_TRANSFER_MAX_POOL_CONNECTIONS = S3_TRANSFER_MAX_CONCURRENCY + CPU_COUNT  # Listings share the pool with transfers
+S3_TRANSFER_MULTIPART_CHUNKSIZE = 8 * 2 ** 20
+
+DATA_PATH_S3_LISTING_INDEX = f"{DATA_PATH}/s3_listing_index.sqlite"
+S3_LISTING_TTL_SECONDS = 60  # Listings which may still change are listed again after this
+S3_LISTING_FINAL_AFTER_SECONDS = 3600  # Listings of directories which ended this long ago never expire
@@ -0,0 +1,54 @@
+from wwclouds.data_types.axis import Axis
+
+
+class BoundingBox:
+    def __init__(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float):
+        if not all(-Axis.LON.degree_count / 2 <= lon <= Axis.LON.degree_count / 2 for lon in (min_lon, max_lon)):
+            raise ValueError("longitudes must be between -180 and 180")
+        if not -Axis.LAT.degree_count / 2 <= min_lat < max_lat <= Axis.LAT.degree_count / 2:
+            raise ValueError("latitudes must be between -90 and 90, where min_lat is less than max_lat")
+        if min_lon == max_lon:
+            raise ValueError("min_lon and max_lon cannot be equal")
+        self.min_lon = float(min_lon)
+        self.min_lat = float(min_lat)
+        self.max_lon = float(max_lon)
+        self.max_lat = float(max_lat)
+
+    @staticmethod
+    def from_list(values: list[float]) -> "BoundingBox":
+        if len(values) != 4:
+            raise ValueError("bounding box must consist of min_lon, min_lat, max_lon and max_lat")
+        return BoundingBox(*values)
+
+    def __repr__(self) -> str:
+        return f"BoundingBox({self.min_lon}, {self.min_lat}, {self.max_lon}, {self.max_lat})"
+
+    def __str__(self) -> str:
+        return "_".join(f"{value:g}" for value in (self.min_lon, self.min_lat, self.max_lon, self.max_lat))
+
+    @property
+    def crosses_antimeridian(self) -> bool:
+        return self.min_lon > self.max_lon
+
+    @property
+    def longitude_width(self) -> float:
+        lon_diff = (self.max_lon - self.min_lon) % Axis.LON.degree_count
+        return lon_diff if lon_diff != 0 else Axis.LON.degree_count
+
+    @property
+    def latitude_range(self) -> tuple[float, float]:
+        return self.min_lat, self.max_lat
+
+    def clip_latitudes(self, latitude_range: tuple[float, float]) -> "BoundingBox":
+        min_lat, max_lat = max(self.min_lat, min(latitude_range)), min(self.max_lat, max(latitude_range))
+        if min_lat >= max_lat:
+            raise ValueError("bounding box does not intersect the latitude range")
+        return BoundingBox(self.min_lon, min_lat, self.max_lon, max_lat)
+
+    def intersects_longitudes(self, lon_a: float, lon_b: float, margin: float = 0.0) -> bool:
+        # The longitude range is the shortest one between lon_a and lon_b, while the box spans eastwards
+        range_width = min((lon_b - lon_a) % Axis.LON.degree_count, (lon_a - lon_b) % Axis.LON.degree_count)
+        range_start = lon_a if (lon_b - lon_a) % Axis.LON.degree_count <= Axis.LON.degree_count / 2 else lon_b
+        box_start, box_width = self.min_lon - margin, self.longitude_width + margin * 2
+        return (range_start - box_start) % Axis.LON.degree_count <= box_width \
+            or (box_start - range_start) % Axis.LON.degree_count <= range_width
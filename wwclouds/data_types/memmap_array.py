@@ -0,0 +1,37 @@
+import os
+import tempfile
+from typing import Optional
+
+import numpy as np
+
+
+class MemmapArray:
+    def __init__(self, shape: tuple[int, ...], dtype: np.dtype, *,
+                 directory: Optional[str] = None, filepath: Optional[str] = None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.is_owner = filepath is None
+        if self.is_owner:
+            os.makedirs(directory, exist_ok=True)
+            file_descriptor, filepath = tempfile.mkstemp(suffix=".dat", dir=directory)
+            os.close(file_descriptor)
+        self.filepath = filepath
+        self.array: Optional[np.memmap] = np.memmap(
+            self.filepath, dtype=self.dtype, mode="w+" if self.is_owner else "r+", shape=self.shape
+        )
+
+    @staticmethod
+    def attach(spec: tuple[str, tuple[int, ...], str]) -> "MemmapArray":
+        filepath, shape, dtype = spec
+        return MemmapArray(shape, np.dtype(dtype), filepath=filepath)
+
+    @property
+    def spec(self) -> tuple[str, tuple[int, ...], str]:
+        return self.filepath, self.shape, self.dtype.str
+
+    def close(self) -> None:
+        if self.array is None:
+            return
+        self.array = None
+        if self.is_owner and os.path.exists(self.filepath):
+            os.remove(self.filepath)  # Existing mappings of the file stay valid until they are released
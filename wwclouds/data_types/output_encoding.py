@@ -0,0 +1,55 @@
+from typing import Optional
+
+import numpy as np
+
+
+class OutputEncoding:
+    def __init__(self, dtype: np.dtype = np.float64, *,
+                 scale_factor: float = 1.0, add_offset: float = 0.0, fill_value: Optional[int] = None):
+        self.dtype = np.dtype(dtype)
+        self.scale_factor = scale_factor
+        self.add_offset = add_offset
+        if self.is_quantized and fill_value is None:
+            fill_value = np.iinfo(self.dtype).max
+        self.__fill_value = fill_value
+
+    @staticmethod
+    def from_str(string: str) -> "OutputEncoding":
+        if string == "uint16":
+            return OutputEncoding.brightness_temperature_uint16()
+        return OutputEncoding(np.dtype(string))
+
+    @staticmethod
+    def brightness_temperature_uint16() -> "OutputEncoding":
+        return OutputEncoding(np.uint16, scale_factor=0.01, add_offset=0.0)
+
+    @property
+    def is_quantized(self) -> bool:
+        return np.issubdtype(self.dtype, np.integer)
+
+    @property
+    def fill_value(self) -> float:
+        return self.__fill_value if self.is_quantized else np.nan
+
+    @property
+    def compute_dtype(self) -> np.dtype:
+        return np.dtype(np.float32) if self.is_quantized or self.dtype.itemsize <= 4 else self.dtype
+
+    @property
+    def attrs(self) -> dict[str, float]:
+        if not self.is_quantized:
+            return dict()
+        return {
+            "scale_factor": self.scale_factor,
+            "add_offset": self.add_offset,
+            "_FillValue": self.fill_value
+        }
+
+    def encode(self, values: np.ndarray) -> np.ndarray:
+        if not self.is_quantized:
+            return values.astype(self.dtype, copy=False)
+        nan_mask = np.isnan(values)
+        quantized = np.rint((np.where(nan_mask, self.add_offset, values) - self.add_offset) / self.scale_factor)
+        encoded = np.clip(quantized, np.iinfo(self.dtype).min, self.fill_value - 1).astype(self.dtype)
+        encoded[nan_mask] = self.fill_value
+        return encoded
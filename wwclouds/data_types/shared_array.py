@@ -0,0 +1,37 @@
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+
+class SharedArray:
+    def __init__(self, shape: tuple[int, ...], dtype: np.dtype, *, name: Optional[str] = None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.is_owner = name is None
+        size = max(int(self.dtype.itemsize * np.prod(self.shape)), 1)
+        self.shared_memory = shared_memory.SharedMemory(name=name, create=self.is_owner, size=size)
+        self.array: Optional[np.ndarray] = np.ndarray(self.shape, self.dtype, buffer=self.shared_memory.buf)
+
+    @staticmethod
+    def from_array(array: np.ndarray, dtype: Optional[np.dtype] = None) -> "SharedArray":
+        shared_array = SharedArray(array.shape, dtype if dtype is not None else array.dtype)
+        shared_array.array[:] = array
+        return shared_array
+
+    @staticmethod
+    def attach(spec: tuple[str, tuple[int, ...], str]) -> "SharedArray":
+        name, shape, dtype = spec
+        return SharedArray(shape, np.dtype(dtype), name=name)
+
+    @property
+    def spec(self) -> tuple[str, tuple[int, ...], str]:
+        return self.shared_memory.name, self.shape, self.dtype.str
+
+    def close(self) -> None:
+        if self.array is None:
+            return
+        self.array = None
+        self.shared_memory.close()
+        if self.is_owner:
+            self.shared_memory.unlink()
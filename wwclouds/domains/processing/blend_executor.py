@@ -0,0 +1,99 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from enum import Enum, auto
+from typing import Type, Union
+
+import numpy as np
+
+from wwclouds.config import CPU_COUNT
+from wwclouds.data_types.shared_array import SharedArray
+from wwclouds.data_types.memmap_array import MemmapArray
+from wwclouds.data_types.output_encoding import OutputEncoding
+from wwclouds.domains.processing.remap_plan import RemapPlan
+
+
+class BlendExecutorType(Enum):
+    SERIAL = auto()
+    THREAD = auto()
+    PROCESS = auto()
+
+    @staticmethod
+    def from_str(string: str) -> "BlendExecutorType":
+        return getattr(BlendExecutorType, string.upper())
+
+
+def _apply_remap_plan_to_shared_arrays(remap_plan: RemapPlan,
+                                       dst_type: Type[Union[SharedArray, MemmapArray]], dst_spec: tuple,
+                                       source_specs: list[tuple], encoding: OutputEncoding) -> None:
+    shared_arrays = [dst_type.attach(dst_spec), *(SharedArray.attach(spec) for spec in source_specs)]
+    try:
+        dst, *values_list = (shared_array.array for shared_array in shared_arrays)
+        remap_plan.apply(dst, values_list, encoding)
+        del dst, values_list
+    finally:
+        for shared_array in shared_arrays:
+            shared_array.close()
+
+
+class BlendExecutor:
+    __pools: dict[tuple[BlendExecutorType, int], Executor] = dict()
+
+    def __init__(self, executor_type: BlendExecutorType = BlendExecutorType.THREAD, worker_count: int = CPU_COUNT):
+        if worker_count <= 0:
+            raise ValueError("worker_count must be larger than 0")
+        self.executor_type = executor_type
+        self.worker_count = worker_count
+
+    @property
+    def __pool(self) -> Executor:
+        key = (self.executor_type, self.worker_count)
+        pool = BlendExecutor.__pools.get(key)
+        if pool is None:
+            if self.executor_type == BlendExecutorType.THREAD:
+                pool = ThreadPoolExecutor(max_workers=self.worker_count)
+            elif self.executor_type == BlendExecutorType.PROCESS:
+                pool = ProcessPoolExecutor(max_workers=self.worker_count)
+            else:
+                raise ValueError(f"{self.executor_type.name} executor does not use a pool")
+            BlendExecutor.__pools[key] = pool
+        return pool
+
+    @staticmethod
+    def shutdown_all() -> None:
+        for pool in BlendExecutor.__pools.values():
+            pool.shutdown()
+        BlendExecutor.__pools.clear()
+
+    def __apply_with_threads(self, remap_plan: RemapPlan, dst: Union[SharedArray, MemmapArray],
+                             values_list: list[np.ndarray], encoding: OutputEncoding) -> None:
+        futures = [
+            self.__pool.submit(sub_plan.apply, dst.array, values_list, encoding)
+            for sub_plan in remap_plan.split_by_lat_axis(self.worker_count)
+        ]
+        for future in futures:
+            future.result()
+
+    def __apply_with_processes(self, remap_plan: RemapPlan, dst: Union[SharedArray, MemmapArray],
+                               values_list: list[np.ndarray], encoding: OutputEncoding) -> None:
+        shared_sources = [SharedArray.from_array(values, dtype=encoding.compute_dtype) for values in values_list]
+        try:
+            source_specs = [shared_source.spec for shared_source in shared_sources]
+            futures = [
+                self.__pool.submit(
+                    _apply_remap_plan_to_shared_arrays, sub_plan, type(dst), dst.spec, source_specs, encoding
+                )
+                for sub_plan in remap_plan.split_by_lat_axis(self.worker_count)
+            ]
+            for future in futures:
+                future.result()
+        finally:
+            for shared_source in shared_sources:
+                shared_source.close()
+
+    def apply_remap_plan(self, remap_plan: RemapPlan, dst: Union[SharedArray, MemmapArray],
+                         values_list: list[np.ndarray], encoding: OutputEncoding) -> None:
+        if self.executor_type == BlendExecutorType.SERIAL:
+            remap_plan.apply(dst.array, values_list, encoding)
+        elif self.executor_type == BlendExecutorType.THREAD:
+            self.__apply_with_threads(remap_plan, dst, values_list, encoding)
+        elif self.executor_type == BlendExecutorType.PROCESS:
+            self.__apply_with_processes(remap_plan, dst, values_list, encoding)
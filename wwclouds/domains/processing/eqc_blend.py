@@ -1,19 +1,34 @@
+import weakref
 import xarray as xr
 import numpy as np
-from pyresample import AreaDefinition
+import dask.array as da
+from pyresample import AreaDefinition, SwathDefinition, kd_tree
 from datetime import datetime
-import multiprocessing as mp
-from multiprocessing import shared_memory
-from typing import Optional, Type
-
-from wwclouds.config import CPU_COUNT
-from wwclouds.helpers.list_helper import ListHelper
+from enum import Enum, auto
+from typing import Any, Optional, Union
+
+from wwclouds.config import DATA_PATH_SCRATCH
+from wwclouds.data_types.shared_array import SharedArray
+from wwclouds.data_types.memmap_array import MemmapArray
+from wwclouds.data_types.output_encoding import OutputEncoding
+from wwclouds.data_types.bounding_box import BoundingBox
+from wwclouds.domains.processing.blend_executor import BlendExecutor
+from wwclouds.domains.processing.remap_plan import RemapPlan, RemapPlanCache, RemapSection, GatherSection
 from wwclouds.data_types.axis import Axis
 from wwclouds.helpers.longitude_helper import LongitudeHelper
 from wwclouds.helpers.latitude_helper import LatitudeHelper
 from wwclouds.helpers.data_array_helper import DataArraysHelper
 from wwclouds.helpers.math_helper import MathHelper
-from wwclouds.helpers.axis_helper import AxisHelper
+from wwclouds.helpers.area_axis_helper import AreaAxisHelper
+
+
+class BlendEngine(Enum):
+    EQC = auto()  # Re-indexes data arrays, which are already resampled to EQC areas
+    DIRECT = auto()  # Gathers the nearest pixels of data arrays in their native areas
+
+    @staticmethod
+    def from_str(string: str) -> "BlendEngine":
+        return getattr(BlendEngine, string.upper())
 
 
 class LongitudeSection:
@@ -84,52 +99,166 @@ class LongitudeSection:
         new_sections_filtered = list(filter(lambda sec: sec.from_longitude != sec.to_longitude, new_sections))
         return new_sections_filtered
 
+    @staticmethod
+    def __get_edge_longitudes(center_longitudes: list[float]) -> list[float]:
+        lons_sorted = sorted(center_longitudes)
+        edge_longitudes = []
+        for index in range(len(lons_sorted)):
+            lon_low = lons_sorted[index]
+            lon_high = lons_sorted[(index + 1) % len(lons_sorted)]
+            lon_middle = LongitudeHelper.get_middle(lon_low, lon_high)
+            edge_longitudes.append(lon_middle)
+        return sorted(edge_longitudes)
 
-class MapPortion:
-    def __init__(self, values: np.ndarray, lon_list: list[float], lat_list: list[float],
-                 lon_indexes: list[int], lat_indexes: list[int]):
-        self.values = values
-        self.lon_list = lon_list
-        self.lat_list = lat_list
-        self.lon_indexes = lon_indexes
-        self.lat_indexes = lat_indexes
+    @staticmethod
+    def __get_item_between_longitudes(items: list[Any], center_longitudes: list[float],
+                                      lon_a: float, lon_b: float) -> Any:
+        lon_middle = LongitudeHelper.get_middle(lon_a, lon_b)
+        lowest_lon_diff = np.inf
+        item_between = None
+        for item, center_longitude in zip(items, center_longitudes):
+            cur_lon_diff = LongitudeHelper.get_diff(center_longitude, lon_middle)
+            if cur_lon_diff < lowest_lon_diff:
+                lowest_lon_diff = cur_lon_diff
+                item_between = item
+        return item_between
+
+    @staticmethod
+    def from_center_longitudes(items: list[Any], center_longitudes: list[float]) -> list["LongitudeSection"]:
+        lon_sections_unmerged = []
+        lon_edges = LongitudeSection.__get_edge_longitudes(center_longitudes)
+        for index in range(len(lon_edges)):
+            lon_edge1 = lon_edges[index]
+            lon_edge2 = lon_edges[(index + 1) % len(lon_edges)]
+            item = LongitudeSection.__get_item_between_longitudes(items, center_longitudes, lon_edge1, lon_edge2)
+            longitude_section = LongitudeSection(item, lon_edge1, lon_edge2)
+            lon_sections_unmerged.append(longitude_section)
 
-    def __copy(self, **override_args) -> "MapPortion":
-        args = {**vars(self), **override_args}
-        return MapPortion(**args)
+        lon_sections_merged = []
+        lon_section_a = lon_sections_unmerged[0]
+        for lon_section_b in lon_sections_unmerged[1:]:
+            new_sections = lon_section_a.merge_with_section(lon_section_b)
+            lon_section_a = new_sections[-1]
+            lon_sections_merged.extend(new_sections[:-1])
+        edge_sections = lon_section_a.merge_with_section(lon_sections_merged[0])
+        lon_sections_merged[0] = edge_sections[-1]
+        lon_sections_merged.extend(edge_sections[:-1])
+        return lon_sections_merged
 
-    def split_by_lat_axis(self, count: int) -> list["MapPortion"]:
-        lat_indexes_list = ListHelper.split_list(self.lat_indexes, count)
-        map_portions = [self.__copy(lat_indexes=lat_indexes) for lat_indexes in lat_indexes_list]
-        return map_portions
+    @staticmethod
+    def get_item_longitude_span(lon_sections: list["LongitudeSection"], item: Any) -> Optional[tuple[float, float]]:
+        # Returns the eastwards span covered by all sections of the item, which lie next to each other
+        item_sections = [
+            lon_section for lon_section in lon_sections
+            if any(cur_item is item for cur_item in lon_section.data_arrays)
+        ]
+        if len(item_sections) == 0 or len(item_sections) == len(lon_sections):
+            return None
+        to_longitudes = set(lon_section.to_longitude for lon_section in item_sections)
+        first_section = next(
+            (lon_section for lon_section in item_sections if lon_section.from_longitude not in to_longitudes),
+            item_sections[0]
+        )
+        span_width = sum(
+            LongitudeHelper.get_diff(lon_section.from_longitude, lon_section.to_longitude)
+            for lon_section in item_sections
+        )
+        return first_section.from_longitude, LongitudeHelper.add(first_section.from_longitude, span_width)
 
 
 class EqcBlend:
+    remap_plan_cache = RemapPlanCache()
+
     def __init__(self,
                  latitude_range: tuple[float, float] = (-Axis.LAT.value // 2, Axis.LAT.value // 2),
-                 merge_intensity: int = 60):
+                 merge_intensity: int = 60,
+                 use_remap_plan_cache: bool = True,
+                 executor: Optional[BlendExecutor] = None,
+                 lazy: bool = False,
+                 chunk_shape: tuple[int, int] = (2048, 2048),
+                 use_memmap: bool = False,
+                 scratch_directory: str = DATA_PATH_SCRATCH,
+                 output_encoding: Optional[OutputEncoding] = None,
+                 bbox: Optional[BoundingBox] = None,
+                 section_longitudes: Optional[list[float]] = None,
+                 engine: BlendEngine = BlendEngine.EQC,
+                 resolution: Optional[float] = None,
+                 radius_of_influence: Optional[float] = None):
+        if engine == BlendEngine.DIRECT and resolution is None:
+            raise ValueError("resolution must be set for the direct engine")
+        if engine == BlendEngine.DIRECT and lazy:
+            raise ValueError("the direct engine cannot blend lazily")
         self.latitude_range = tuple(sorted(latitude_range))
+        if bbox is not None:
+            self.latitude_range = bbox.clip_latitudes(self.latitude_range).latitude_range
         self.merge_intensity = merge_intensity
+        self.use_remap_plan_cache = use_remap_plan_cache
+        self.executor = executor if executor is not None else BlendExecutor()
+        self.lazy = lazy
+        self.chunk_shape = chunk_shape
+        self.use_memmap = use_memmap
+        self.scratch_directory = scratch_directory
+        self.output_encoding = output_encoding
+        self.bbox = bbox
+        self.section_longitudes = section_longitudes
+        self.engine = engine
+        self.resolution = resolution
+        self.radius_of_influence = radius_of_influence
 
         self.data_arrays = []
+        self.remap_plan: Optional[RemapPlan] = None
         self.lon_delta_step = None
         self.lat_delta_step = None
-        self.shared_earth_array = None
+        self.shared_earth_array: Optional[Union[SharedArray, MemmapArray]] = None
         self.__earth_array = None
+        self.__shared_arrays: list[Union[SharedArray, MemmapArray]] = []
+        # Blends which are neither used as context managers nor closed still release their segments when collected
+        weakref.finalize(self, EqcBlend.__close_shared_arrays, self.__shared_arrays)
+        self.__lazy_earth_array: Optional[da.Array] = None
 
         self.__data_array_values_map = None
         self.__lon_lats = None
 
     def __call__(self, data_arrays: list[xr.DataArray]) -> xr.DataArray:
-        if len(data_arrays) == 0:
-            raise ValueError("cannot call EqcMean object with 0 DataArrays")
+        self.__validate_data_arrays(data_arrays)
         self.__init_data_arrays(data_arrays)
         self.blend()
         return self.as_data_array()
 
-    def __del__(self):
-        self.shared_earth_array.close()
-        self.shared_earth_array.unlink()
+    def update(self, data_arrays: list[xr.DataArray], previous_data_array: xr.DataArray,
+               changed_indexes: list[int]) -> xr.DataArray:
+        if self.lazy:
+            raise ValueError("cannot update a previous blend lazily")
+        self.__validate_data_arrays(data_arrays)
+        self.__init_data_arrays(data_arrays)
+        if previous_data_array.shape != self.__shape:
+            raise ValueError("the previous blend must have the same shape as the new one")
+        self.blend(previous_data_array.values, changed_indexes)
+        return self.as_data_array()
+
+    @staticmethod
+    def __validate_data_arrays(data_arrays: list[xr.DataArray]) -> None:
+        if len(data_arrays) == 0:
+            raise ValueError("cannot call EqcMean object with 0 DataArrays")
+        if len(set(data_array.shape[:-2] for data_array in data_arrays)) != 1:
+            raise ValueError("all DataArrays must have the same bands, stacked in front of the y and x dimensions")
+
+    def __enter__(self) -> "EqcBlend":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    @staticmethod
+    def __close_shared_arrays(shared_arrays: list[Union[SharedArray, MemmapArray]]) -> None:
+        for shared_array in shared_arrays:
+            shared_array.close()
+        shared_arrays.clear()
+
+    def close(self) -> None:
+        self.__earth_array = None
+        self.shared_earth_array = None
+        self.__close_shared_arrays(self.__shared_arrays)
 
     @property
     def lon_len(self) -> int:
@@ -143,13 +272,23 @@ class EqcBlend:
     def __first_data_array(self) -> xr.DataArray:
         return self.data_arrays[0]
 
+    @property
+    def __encoding(self) -> OutputEncoding:
+        if self.output_encoding is not None:
+            return self.output_encoding
+        return OutputEncoding(self.__first_data_array.dtype)
+
     @property
     def __data_type(self) -> type:
-        return self.__get_values_from_data_array(self.__first_data_array)[0][0].dtype
+        return self.__encoding.dtype
 
     @property
-    def __shape(self) -> (int, int):
-        return self.lat_len, self.lon_len
+    def __band_dims(self) -> tuple[str, ...]:
+        return tuple(self.__first_data_array.dims[:-2])
+
+    @property
+    def __shape(self) -> tuple[int, ...]:
+        return tuple(self.__first_data_array.shape[:-2]) + tuple(self.remap_plan.shape)
 
     @property
     def time_range(self) -> tuple[datetime, datetime]:
@@ -167,62 +306,109 @@ class EqcBlend:
     @property
     def coords(self):
         lons, lats = self.lonlats
+        (lat_offset, lon_offset), (height, width) = self.remap_plan.offset, self.remap_plan.shape
         return {
-            "y": lats,
-            "x": lons
+            "y": lats[lat_offset:lat_offset + height],
+            "x": np.take(lons, np.arange(lon_offset, lon_offset + width), mode="wrap")
         }
 
     @property
     def area_extent(self) -> tuple[float, float, float, float]:
-        return (
-            -Axis.LON.length_in_metres / 2,
-            -Axis.LAT.length_in_metres / 2,
-            Axis.LON.length_in_metres / 2,
-            Axis.LAT.length_in_metres / 2
-        )
+        if self.bbox is None:
+            return (
+                -Axis.LON.length_in_metres / 2,
+                -Axis.LAT.length_in_metres / 2,
+                Axis.LON.length_in_metres / 2,
+                Axis.LAT.length_in_metres / 2
+            )
+        (lat_offset, lon_offset), (height, width) = self.remap_plan.offset, self.remap_plan.shape
+        pixel_width, pixel_height = Axis.LON.length_in_metres / self.lon_len, Axis.LAT.length_in_metres / self.lat_len
+        left = -Axis.LON.length_in_metres / 2 + lon_offset * pixel_width  # Exceeds the earth if the window wraps
+        top = Axis.LAT.length_in_metres / 2 - lat_offset * pixel_height
+        return left, top - height * pixel_height, left + width * pixel_width, top
 
     @property
     def area_def(self) -> AreaDefinition:
         area: AreaDefinition = self.__first_data_array.attrs["area"]
-        projection = area.proj_dict
+        if self.engine == BlendEngine.EQC:
+            projection = area.proj_dict
+        else:
+            projection = {"proj": "eqc", "datum": "WGS84", "units": "m"}
         projection["lon_0"] = 0.0
         args = {
             "area_id": "eqc_area_earth",
-            "description": "EQC projection of the whole earth",
+            "description": "EQC projection of the whole earth" if self.bbox is None
+            else f"EQC projection of the earth within {self.bbox}",
             "projection": projection,
-            "width": self.lon_len,
-            "height": self.lat_len,
+            "width": self.__shape[-1],
+            "height": self.__shape[-2],
             "area_extent": self.area_extent
         }
+        if self.engine == BlendEngine.DIRECT:
+            return AreaDefinition(args["area_id"], args["description"], args["area_id"], projection,
+                                  args["width"], args["height"], args["area_extent"])
         return area.copy(**args)
 
+    @property
+    def __index_latitude_range(self) -> tuple[float, float]:
+        # Source rows are indexed through their flipped latitude axis, so that the earth array runs from north to
+        # south. The latitudes used for indexing are therefore mirrored around the equator.
+        return -self.latitude_range[1], -self.latitude_range[0]
+
     @property
     def __earth_array_latitude_index_range(self) -> tuple[int, int]:
-        top = self.__translate_coords_to_earth_array_indexes((0, self.latitude_range[0]))
-        bot = self.__translate_coords_to_earth_array_indexes((0, self.latitude_range[1]))
+        top = self.__translate_coords_to_earth_array_indexes((0, self.__index_latitude_range[0]))
+        bot = self.__translate_coords_to_earth_array_indexes((0, self.__index_latitude_range[1]))
         return top[1], bot[1]
 
+    @property
+    def __earth_array_longitude_index_window(self) -> tuple[int, int]:
+        if self.bbox is None or self.bbox.longitude_width >= Axis.LON.degree_count:
+            return 0, self.lon_len
+        start = self.__translate_coords_to_earth_array_indexes((self.bbox.min_lon, 0))[0]
+        end = self.__translate_coords_to_earth_array_indexes((self.bbox.max_lon, 0))[0]
+        return start, min((end - start) % self.lon_len + 1, self.lon_len)
+
     @property
     def __earth_array_latitude_length(self) -> int:
         min_index, max_index = self.__earth_array_latitude_index_range
         return max_index - min_index + 1
 
+    @property
+    def __remap_plan_key(self) -> str:
+        areas = [data_array.attrs["area"] for data_array in self.data_arrays]
+        section_longitudes = tuple(self.section_longitudes) if self.section_longitudes is not None else None
+        return RemapPlanCache.get_key(areas, self.latitude_range, self.merge_intensity, self.bbox, section_longitudes,
+                                      self.engine.name, self.resolution, self.radius_of_influence)
+
     def __init_data_arrays(self, data_arrays: list[xr.DataArray]):
+        self.close()
         self.data_arrays = data_arrays
-        self.lon_delta_step, self.lat_delta_step = self.__get_lonlats_delta_steps(20)
-        self.__init_shared_earth_array()
+        self.__data_array_values_map = None
+        self.__lon_lats = None
+        if self.use_remap_plan_cache:
+            self.remap_plan = self.remap_plan_cache.get_or_create(self.__remap_plan_key, self.__create_remap_plan)
+        else:
+            self.remap_plan = self.__create_remap_plan()
+        self.lon_delta_step, self.lat_delta_step = self.remap_plan.lon_delta_step, self.remap_plan.lat_delta_step
+        if not self.lazy:
+            self.__init_shared_earth_array()
 
-    def __get_values_from_data_array(self, data_array: xr.DataArray) -> np.ndarray:
+    def __get_values_from_data_array(self, data_array: xr.DataArray) -> Union[np.ndarray, da.Array]:
         if self.__data_array_values_map is None:
-            self.__data_array_values_map = dict((id(data_array), data_array.values) for data_array in self.data_arrays)
+            self.__data_array_values_map = dict(
+                (id(data_array), data_array.data if self.lazy else data_array.values) for data_array in self.data_arrays
+            )
         return self.__data_array_values_map[id(data_array)]
 
-    def __init_shared_earth_array(self) -> (shared_memory.SharedMemory, np.ndarray):
-        size = np.dtype(self.__data_type).itemsize * np.prod(self.lat_len * self.lon_len)
-        shm = shared_memory.SharedMemory(create=True, size=size)
-        dst = np.ndarray(self.__shape, self.__data_type, buffer=shm.buf)
-        dst[:] = np.nan
-        self.shared_earth_array, self.__earth_array = shm, dst
+    def __init_shared_earth_array(self) -> None:
+        if self.use_memmap:
+            shared_array = MemmapArray(self.__shape, self.__data_type, directory=self.scratch_directory)
+        else:
+            shared_array = SharedArray(self.__shape, self.__data_type)
+        self.__shared_arrays.append(shared_array)
+        shared_array.array[:] = self.__encoding.fill_value
+        self.shared_earth_array, self.__earth_array = shared_array, shared_array.array
 
     def __get_axis_sorted(self, axis: Axis) -> np.ndarray:
         axis_len_aim = getattr(self, f"{axis.name.lower()}_len")
@@ -240,9 +426,9 @@ class EqcBlend:
         for cur_array in self.data_arrays:
             cur_area: AreaDefinition = cur_array.attrs["area"]
 
-            lons, lats = cur_area.get_lonlats()
-            lon_gen = (lon for lon in lons[0])
-            lat_gen = (lat[0] for lat in lats)
+            lons, lats = AreaAxisHelper.get_lonlat_axes(cur_area)
+            lon_gen = (lon for lon in lons)
+            lat_gen = (lat for lat in lats)
 
             for index, axis_gen in enumerate([lon_gen, lat_gen]):
                 axis_sample_list = lonlats_sample_lists[index]
@@ -270,175 +456,198 @@ class EqcBlend:
         )
         return earth_array_indexes
 
-    def __get_indexes_from_axis(self, axis_values: list[float], from_axis_val: float, to_axis_val: float,
-                                axis_helper: Type[AxisHelper],
-                                edge_size: int = 0,
-                                max_length: Optional[int] = None) -> list[int]:
-        indexes = []
-        for index, value in enumerate(axis_values):
-            if axis_helper.is_between(value, from_axis_val, to_axis_val):
-                if len(indexes) == 0:
-                    for i in range(edge_size):
-                        indexes.append((index - (1 + i)) % len(axis_values))
-                indexes.append(index)
-            elif len(indexes) != 0:
-                for i in range(edge_size):
-                    indexes.append((index + i) % len(axis_values))
-                break
-
-        if max_length is not None and max_length < len(indexes):
-            middle_axis_val = axis_helper.get_middle(from_axis_val, to_axis_val)
-            start_index = 0
-            end_index = len(indexes) - 1
-            for _ in range(len(indexes) - max_length):
-                start_val, end_val = (axis_values[indexes[i]] for i in (start_index, end_index))
-                start_diff, end_diff = (axis_helper.get_diff(val, middle_axis_val) for val in (start_val, end_val))
-                if start_diff > end_diff:
-                    start_index += 1
-                else:
-                    end_index -= 1
-            indexes = indexes[start_index:(end_index + 1)]
-
-        return indexes
-
-    def __longitude_section_to_map_portions(
-            self,
-            lon_section: LongitudeSection) -> list[tuple[MapPortion, Optional[MapPortion]]]:
-        from_longitude = lon_section.from_longitude
-        to_longitude = lon_section.to_longitude
-        from_latitude, to_latitude = self.latitude_range
+    def __get_section_axis_indexes(self, lon_section: LongitudeSection,
+                                   data_array: xr.DataArray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        from_latitude, to_latitude = self.__index_latitude_range
         lat_edge_size = 5
         lat_indexes_count = self.__earth_array_latitude_length + lat_edge_size * 2 - 2
-        map_portion_lists = [[], []]
-        for index, data_array in enumerate(lon_section.data_arrays[:2]):
-            if data_array is None:
-                map_portion_lists[index] = [None] * CPU_COUNT
-                continue
-            values = self.__get_values_from_data_array(data_array)
-            area: AreaDefinition = data_array.attrs["area"]
-            lons, lats = area.get_lonlats()
-            longitude_list = lons[0]
-            latitude_list = list(reversed(list(map(lambda val: val[0], lats))))
-            lon_indexes = self.__get_indexes_from_axis(longitude_list, from_longitude, to_longitude, LongitudeHelper,
-                                                       edge_size=1)
-            lat_indexes = self.__get_indexes_from_axis(latitude_list, from_latitude, to_latitude, LatitudeHelper,
-                                                       max_length=lat_indexes_count,
-                                                       edge_size=lat_edge_size)
-            map_portion = MapPortion(values, longitude_list, latitude_list, lon_indexes, lat_indexes)
-            map_portion_lists[index] = map_portion.split_by_lat_axis(CPU_COUNT)
-        return [tuple(map_tuples) for map_tuples in zip(*map_portion_lists)]
-
-    def __add_value_from_single_map_portion(self, map_portion: MapPortion) -> None:
+        area: AreaDefinition = data_array.attrs["area"]
+        longitude_list, lats = AreaAxisHelper.get_lonlat_axes(area)
+        latitude_list = np.flip(lats)
+        lon_indexes = LongitudeHelper.get_indexes_from_axis(longitude_list, lon_section.from_longitude,
+                                                            lon_section.to_longitude, edge_size=1)
+        lat_indexes = LatitudeHelper.get_indexes_from_axis(latitude_list, from_latitude, to_latitude,
+                                                           max_length=lat_indexes_count,
+                                                           edge_size=lat_edge_size)
+        return longitude_list, latitude_list, lon_indexes, lat_indexes
+
+    def __translate_axis_to_earth_array_indexes(self, values: np.ndarray, axis: Axis) -> np.ndarray:
+        delta_step, axis_len = (self.lon_delta_step, self.lon_len) if axis == Axis.LON \
+            else (self.lat_delta_step, self.lat_len)
+        aligned_values = np.mod(np.asarray(values, dtype=np.float64) + (axis.degree_count // 2), axis.degree_count)
+        return np.rint(aligned_values / delta_step).astype(np.int64) % axis_len
+
+    def __get_seam_weights(self, lon_indexes_length: int, count: int) -> np.ndarray:
+        progress = ((np.arange(count) / lon_indexes_length) - 0.5) * self.merge_intensity  # Progress from -x to x, where 2x is merge_intensity
+        return MathHelper.sigmoid_array(progress)
+
+    def __longitude_section_to_remap_section(self, lon_section: LongitudeSection) -> RemapSection:
+        data_arrays = [data_array for data_array in lon_section.data_arrays if data_array is not None]
+        source_indexes = tuple(
+            next(index for index, cur_array in enumerate(self.data_arrays) if cur_array is data_array)
+            for data_array in data_arrays
+        )
+        axis_indexes_list = [self.__get_section_axis_indexes(lon_section, data_array) for data_array in data_arrays]
+        lat_count = min(len(axis_indexes[3]) for axis_indexes in axis_indexes_list)
+        lon_count = min(len(axis_indexes[2]) for axis_indexes in axis_indexes_list)
+        source_lon_indexes = tuple(np.asarray(axis_indexes[2][:lon_count], dtype=np.int64)
+                                   for axis_indexes in axis_indexes_list)
+        source_lat_indexes = tuple(np.asarray(axis_indexes[3][:lat_count], dtype=np.int64)
+                                   for axis_indexes in axis_indexes_list)
+
+        longitude_list, latitude_list, lon_indexes, _ = axis_indexes_list[0]
         earth_array_lat_range = self.__earth_array_latitude_index_range
-        for lat_index in map_portion.lat_indexes:
-            for lon_index in map_portion.lon_indexes:
-                value = map_portion.values[lat_index][lon_index]
-                new_lon_index, new_lat_index = self.__translate_coords_to_earth_array_indexes(
-                    (map_portion.lon_list[lon_index], map_portion.lat_list[lat_index])
-                )
-                if np.isnan(value) or not (earth_array_lat_range[0] <= new_lat_index <= earth_array_lat_range[1]):
-                    continue
-                self.__earth_array[new_lat_index][new_lon_index] = value
+        new_lat_indexes = self.__translate_axis_to_earth_array_indexes(latitude_list[source_lat_indexes[0]], Axis.LAT)
+        in_range_mask = (earth_array_lat_range[0] <= new_lat_indexes) & (new_lat_indexes <= earth_array_lat_range[1])
+        new_lon_indexes = self.__translate_axis_to_earth_array_indexes(longitude_list[source_lon_indexes[0]], Axis.LON)
+
+        seam_weights = self.__get_seam_weights(len(lon_indexes), lon_count) if len(data_arrays) == 2 else None
+        return RemapSection(
+            source_indexes,
+            tuple(lat_indexes[in_range_mask] for lat_indexes in source_lat_indexes),
+            source_lon_indexes,
+            new_lat_indexes[in_range_mask],
+            new_lon_indexes,
+            seam_weights=seam_weights
+        )
 
-    def __add_value_from_two_map_portions(self, map_portion1: MapPortion, map_portion2: MapPortion) -> None:
-        lon_indexes_length = len(map_portion1.lon_indexes)
+    def __is_longitude_section_in_window(self, lon_section: LongitudeSection) -> bool:
+        if all(data_array is None for data_array in lon_section.data_arrays):
+            return False
+        return self.bbox is None or self.bbox.intersects_longitudes(
+            lon_section.from_longitude, lon_section.to_longitude, margin=self.lon_delta_step
+        )
 
-        earth_array_lat_range = self.__earth_array_latitude_index_range
+    def __get_resolution_delta_steps(self) -> tuple[float, float]:
+        return tuple(
+            self.resolution / (axis.length_in_metres / axis.degree_count) for axis in (Axis.LON, Axis.LAT)
+        )
 
-        for lat_index1, lat_index2 in zip(map_portion1.lat_indexes, map_portion2.lat_indexes):
-            for i, (lon_index1, lon_index2) in enumerate(zip(map_portion1.lon_indexes, map_portion2.lon_indexes)):
-                new_lon_index, new_lat_index = self.__translate_coords_to_earth_array_indexes(
-                    (map_portion1.lon_list[lon_index1], map_portion1.lat_list[lat_index1])
-                )
-                if not (earth_array_lat_range[0] <= new_lat_index <= earth_array_lat_range[1]):
-                    continue
-                values = [map_portion1.values[lat_index1][lon_index1], map_portion2.values[lat_index2][lon_index2]]
-                values_filtered = list(filter(lambda val: not np.isnan(val), values))
-                if len(values_filtered) == 0:
-                    continue
-                elif len(values_filtered) == 1:
-                    value = values_filtered[0]
-                else:
-                    progress = ((i / lon_indexes_length) - 0.5) * self.merge_intensity  # Progress from -x to x, where 2x is merge_intensity
-                    weight = MathHelper.sigmoid(progress)
-                    value = values_filtered[0] * (1 - weight) + values_filtered[1] * weight
-                self.__earth_array[new_lat_index][new_lon_index] = value
-
-    def __add_value_from_map_portions(self, map_portion1: MapPortion, map_portion2: Optional[MapPortion]) -> None:
-        if map_portion2 is None:
-            self.__add_value_from_single_map_portion(map_portion1)
+    def __get_gather_flat_indexes(self, area: AreaDefinition, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+        radius_of_influence = self.radius_of_influence
+        if radius_of_influence is None:  # Pixels grow towards the edge of the disk, so the radius must be generous
+            radius_of_influence = 4 * max(self.resolution, area.pixel_size_x, area.pixel_size_y)
+        valid_input_index, valid_output_index, index_array, _ = kd_tree.get_neighbour_info(
+            area, SwathDefinition(lons, lats), radius_of_influence, neighbours=1
+        )
+        input_indexes = np.flatnonzero(valid_input_index)
+        output_indexes = np.flatnonzero(valid_output_index)
+        found_mask = index_array < len(input_indexes)
+        flat_indexes = np.full(lons.size, -1, dtype=np.int32)
+        flat_indexes[output_indexes[found_mask]] = input_indexes[index_array[found_mask]]
+        return flat_indexes.reshape(lons.shape)
+
+    def __longitude_section_to_gather_section(self, lon_section: LongitudeSection) -> GatherSection:
+        data_arrays = [data_array for data_array in lon_section.data_arrays if data_array is not None]
+        source_indexes = tuple(
+            next(index for index, cur_array in enumerate(self.data_arrays) if cur_array is data_array)
+            for data_array in data_arrays
+        )
+        lat_index_range = self.__earth_array_latitude_index_range
+        lat_indexes = np.arange(lat_index_range[0], lat_index_range[1] + 1)
+        lats = Axis.LAT.degree_count / 2 - lat_indexes * self.lat_delta_step  # The earth array runs from north
+
+        section_width = LongitudeHelper.get_diff(lon_section.from_longitude, lon_section.to_longitude)
+        all_lons = np.arange(self.lon_len) * self.lon_delta_step - Axis.LON.degree_count / 2
+        lon_offsets = np.mod(all_lons - lon_section.from_longitude, Axis.LON.degree_count)
+        lon_indexes = np.flatnonzero(lon_offsets <= section_width)
+        lon_indexes = lon_indexes[np.argsort(lon_offsets[lon_indexes], kind="stable")]  # Eastwards from the start
+
+        lons_2d, lats_2d = np.meshgrid(all_lons[lon_indexes], lats)
+        source_flat_indexes = tuple(
+            self.__get_gather_flat_indexes(data_array.attrs["area"], lons_2d, lats_2d) for data_array in data_arrays
+        )
+        seam_weights = None
+        if len(data_arrays) == 2:
+            progress = (lon_offsets[lon_indexes] / section_width - 0.5) * self.merge_intensity
+            seam_weights = MathHelper.sigmoid_array(progress)
+        return GatherSection(source_indexes, source_flat_indexes, lat_indexes, lon_indexes, seam_weights=seam_weights)
+
+    def __create_remap_plan(self) -> RemapPlan:
+        if self.engine == BlendEngine.DIRECT:
+            self.lon_delta_step, self.lat_delta_step = self.__get_resolution_delta_steps()
+            to_section_func = self.__longitude_section_to_gather_section
         else:
-            self.__add_value_from_two_map_portions(map_portion1, map_portion2)
-
-    def __add_lon_section(self, lon_section: LongitudeSection) -> None:
-        map_portions_list = self.__longitude_section_to_map_portions(lon_section)
-        processes = [
-            mp.Process(
-                target=self.__add_value_from_map_portions,
-                args=(map_portion1, map_portion2)
-            ) for map_portion1, map_portion2 in map_portions_list
+            self.lon_delta_step, self.lat_delta_step = self.__get_lonlats_delta_steps(20)
+            to_section_func = self.__longitude_section_to_remap_section
+        lon_sections = filter(self.__is_longitude_section_in_window, self.get_longitude_sections())
+        sections = list(map(to_section_func, lon_sections))
+        lat_index_range = self.__earth_array_latitude_index_range
+        if self.bbox is None:
+            return RemapPlan(self.lon_delta_step, self.lat_delta_step, lat_index_range, sections,
+                             (self.lat_len, self.lon_len))
+
+        window_lat_index_range = range(lat_index_range[0], lat_index_range[1] + 1)
+        lon_index_start, lon_index_count = self.__earth_array_longitude_index_window
+        cropped_sections = [
+            cropped_section for cropped_section in (
+                section.crop(window_lat_index_range, lon_index_start, lon_index_count, self.lon_len)
+                for section in sections
+            ) if cropped_section is not None
         ]
-        for methodname in ["start", "join", "close"]:
-            for process in processes:
-                getattr(process, methodname)()
+        return RemapPlan(
+            self.lon_delta_step,
+            self.lat_delta_step,
+            (0, len(window_lat_index_range) - 1),
+            cropped_sections,
+            (len(window_lat_index_range), lon_index_count),
+            (window_lat_index_range.start, lon_index_start)
+        )
 
-    def __get_data_array_edge_longitudes(self) -> list[float]:
-        lons_sorted = sorted(data_array.attrs["area"].proj_dict["lon_0"] for data_array in self.data_arrays)
-        edge_longitudes = []
-        for index in range(len(lons_sorted)):
-            lon_low = lons_sorted[index]
-            lon_high = lons_sorted[(index + 1) % len(lons_sorted)]
-            lon_middle = LongitudeHelper.get_middle(lon_low, lon_high)
-            edge_longitudes.append(lon_middle)
-        return sorted(edge_longitudes)
+    @staticmethod
+    def __get_data_array_longitude(data_array: xr.DataArray) -> float:
+        return data_array.attrs["area"].proj_dict["lon_0"]
 
-    def __get_data_array_between_longitudes(self, lon_a: float, lon_b: float) -> xr.DataArray:
-        lon_middle = LongitudeHelper.get_middle(lon_a, lon_b)
-        lowest_lon_diff = np.inf
-        data_array_between = None
-        for data_array in self.data_arrays:
-            cur_lon_diff = LongitudeHelper.get_diff(data_array.attrs["area"].proj_dict["lon_0"], lon_middle)
-            if cur_lon_diff < lowest_lon_diff:
-                lowest_lon_diff = cur_lon_diff
-                data_array_between = data_array
-        return data_array_between
+    def __get_data_array_at_longitude(self, longitude: float, max_lon_diff: float = 1.0) -> Optional[xr.DataArray]:
+        lon_diffs = [LongitudeHelper.get_diff(self.__get_data_array_longitude(data_array), longitude)
+                     for data_array in self.data_arrays]
+        closest_index = int(np.argmin(lon_diffs))
+        return self.data_arrays[closest_index] if lon_diffs[closest_index] <= max_lon_diff else None
+
+    def __get_earth_array_data(self) -> Union[np.ndarray, da.Array]:
+        if self.lazy:
+            return self.__lazy_earth_array
+        elif self.use_memmap:
+            return self.__earth_array  # The memmap stays valid after close() removes its file
+        return self.__earth_array.copy()  # Shared memory is released on close(), so its content must be copied
 
     def as_data_array(self) -> xr.DataArray:
         start_time, end_time = self.time_range
         attrs = {
             "start_time": start_time,
             "end_time": end_time,
-            "area": self.area_def
+            "area": self.area_def,
+            **self.__encoding.attrs
         }
+        band_coords = dict(
+            (dim, self.__first_data_array.coords[dim].values)
+            for dim in self.__band_dims if dim in self.__first_data_array.coords
+        )
         return xr.DataArray(
-            data=self.__earth_array.copy(),
-            dims=["y", "x"],
-            coords=self.coords,
+            data=self.__get_earth_array_data(),
+            dims=[*self.__band_dims, "y", "x"],
+            coords={**band_coords, **self.coords},
             attrs=attrs
         )
 
     def get_longitude_sections(self) -> list[LongitudeSection]:
-        lon_sections_unmerged = []
-        lon_edges = self.__get_data_array_edge_longitudes()
-        for index in range(len(lon_edges)):
-            lon_edge1 = lon_edges[index]
-            lon_edge2 = lon_edges[(index + 1) % len(lon_edges)]
-            data_array = self.__get_data_array_between_longitudes(lon_edge1, lon_edge2)
-            longitude_section = LongitudeSection(data_array, lon_edge1, lon_edge2)
-            lon_sections_unmerged.append(longitude_section)
-
-        lon_sections_merged = []
-        lon_section_a = lon_sections_unmerged[0]
-        for lon_section_b in lon_sections_unmerged[1:]:
-            new_sections = lon_section_a.merge_with_section(lon_section_b)
-            lon_section_a = new_sections[-1]
-            lon_sections_merged.extend(new_sections[:-1])
-        edge_sections = lon_section_a.merge_with_section(lon_sections_merged[0])
-        lon_sections_merged[0] = edge_sections[-1]
-        lon_sections_merged.extend(edge_sections[:-1])
-        return lon_sections_merged
-
-    def blend(self) -> None:
-        lon_sections = self.get_longitude_sections()
-        for lon_section in lon_sections:
-            self.__add_lon_section(lon_section)
+        if self.section_longitudes is None:
+            center_longitudes = list(map(self.__get_data_array_longitude, self.data_arrays))
+            return LongitudeSection.from_center_longitudes(self.data_arrays, center_longitudes)
+        # Sections are laid out for all the given longitudes, where the ones without data are left empty
+        data_arrays = list(map(self.__get_data_array_at_longitude, self.section_longitudes))
+        return LongitudeSection.from_center_longitudes(data_arrays, self.section_longitudes)
+
+    def blend(self, previous_values: Optional[np.ndarray] = None, changed_indexes: Optional[list[int]] = None) -> None:
+        values_list = [self.__get_values_from_data_array(data_array) for data_array in self.data_arrays]
+        if self.lazy:
+            self.__lazy_earth_array = self.remap_plan.to_dask_array(self.__encoding, values_list, self.chunk_shape)
+        elif previous_values is None:
+            self.executor.apply_remap_plan(self.remap_plan, self.shared_earth_array, values_list, self.__encoding)
+        else:
+            # Every section writing to the columns of the changed data arrays is blended again, in the same order
+            columns_mask = self.remap_plan.get_columns_mask_for_sources(changed_indexes)
+            self.__earth_array[:] = previous_values
+            self.__earth_array[..., columns_mask] = self.__encoding.fill_value
+            self.executor.apply_remap_plan(self.remap_plan.take_columns(columns_mask), self.shared_earth_array,
+                                           values_list, self.__encoding)
@@ -0,0 +1,61 @@
+import os
+import pickle
+from datetime import datetime
+from typing import Any, Optional
+
+import xarray as xr
+
+from wwclouds.domains.satellite.satellite_enum import SatelliteEnum
+
+
+class StoredField:
+    def __init__(self, scan_start_time: datetime, data_array: xr.DataArray):
+        self.scan_start_time = scan_start_time
+        self.data_array = data_array
+
+
+class StoredMosaic:
+    def __init__(self, scan_start_times: dict[str, datetime], dataset_ids: list[Any], data_array: xr.DataArray):
+        self.scan_start_times = scan_start_times  # Scan start time of every blended satellite, by satellite name
+        self.dataset_ids = dataset_ids
+        self.data_array = data_array
+
+
+class MosaicStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @property
+    def __mosaic_filepath(self) -> str:
+        return f"{self.directory}/mosaic.pickle"
+
+    def __get_field_filepath(self, satellite_enum: SatelliteEnum) -> str:
+        return f"{self.directory}/{satellite_enum.name.lower()}.pickle"
+
+    @staticmethod
+    def __load(filepath: str) -> Optional[Any]:
+        if not os.path.exists(filepath):
+            return None
+        with open(filepath, "rb") as file:
+            return pickle.load(file)
+
+    def __save(self, filepath: str, obj: Any) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_filepath = f"{filepath}.tmp"
+        with open(tmp_filepath, "wb") as file:
+            pickle.dump(obj, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filepath, filepath)
+
+    def get_field(self, satellite_enum: SatelliteEnum) -> Optional[StoredField]:
+        return self.__load(self.__get_field_filepath(satellite_enum))
+
+    def set_field(self, satellite_enum: SatelliteEnum, field: StoredField) -> None:
+        field.data_array.load()
+        self.__save(self.__get_field_filepath(satellite_enum), field)
+
+    def get_mosaic(self) -> Optional[StoredMosaic]:
+        return self.__load(self.__mosaic_filepath)
+
+    def set_mosaic(self, mosaic: StoredMosaic) -> None:
+        mosaic.data_array.load()
+        self.__save(self.__mosaic_filepath, mosaic)
@@ -1,10 +1,17 @@
 import time
 
+import xarray as xr
 from satpy import Scene, MultiScene, DataQuery, DataID
-from typing import Union
+from typing import Optional, Union
 from collections.abc import Iterable
 from wwclouds.domains.processing.scene_ext import SceneExt
-from wwclouds.domains.processing.eqc_blend import EqcBlend
+from wwclouds.domains.processing.eqc_blend import EqcBlend, BlendEngine, LongitudeSection
+from wwclouds.domains.processing.blend_executor import BlendExecutor
+from wwclouds.domains.processing.resample_executor import ResampleExecutor
+from wwclouds.data_types.output_encoding import OutputEncoding
+from wwclouds.data_types.bounding_box import BoundingBox
+from wwclouds.data_types.axis import Axis
+from wwclouds.helpers.longitude_helper import LongitudeHelper
 
 
 class MultiSceneExt(MultiScene):
@@ -65,6 +72,16 @@ class MultiSceneExt(MultiScene):
         super().load(query, *args, **kwargs)
         self.loaded.extend(query)
 
+    def load_for_resolution(self, wavelengths: list[float], resolution: float,
+                            legal_resolutions: list[float]) -> "MultiSceneExt":
+        start_time = time.time()
+        multi_scn_ext = self.copy(
+            [scn.load_for_resolution(wavelengths, resolution, legal_resolutions) for scn in self.scenes]
+        )
+        multi_scn_ext.loaded = [*self.loaded, *wavelengths]
+        print(f"Loaded scenes for resolution {resolution}: {round(time.time() - start_time, 4)} sec")
+        return multi_scn_ext
+
     def unload(self, keepables: Iterable):
         for scene in self.scenes:
             scene.unload(keepables)
@@ -106,26 +123,107 @@ class MultiSceneExt(MultiScene):
         for scn in self.scenes:
             scn.imshow(query)
 
-    def resample_all_to_eqc(self, resolution=None, **kwargs) -> "MultiSceneExt":
-        return MultiSceneExt([
-            scn.resample_to_eqc_area(resolution=resolution, reduce_data=False, **kwargs) for scn in self.scenes
-        ])
+    def __get_scene_at_longitude(self, longitude: float, max_lon_diff: float = 1.0) -> Optional[SceneExt]:
+        return next(
+            (scn for scn in self.scenes if LongitudeHelper.get_diff(scn.lon_0, longitude) <= max_lon_diff), None
+        )
 
-    def resample_loaded_to_eqc(self, resolution=None, **kwargs):
+    def get_eqc_windows(self, latitude_range: tuple[float, float],
+                        section_longitudes: Optional[list[float]] = None) -> list[BoundingBox]:
+        # Every scene only needs the span of its own longitude sections, which are laid out the same way as when
+        # blending, within the blended latitudes
+        if section_longitudes is None:
+            section_longitudes = [scn.lon_0 for scn in self.scenes]
+        scenes = list(map(self.__get_scene_at_longitude, section_longitudes))
+        lon_sections = LongitudeSection.from_center_longitudes(scenes, section_longitudes)
+        windows = []
+        for scn in self.scenes:
+            span = LongitudeSection.get_item_longitude_span(lon_sections, scn)
+            from_longitude, to_longitude = span if span is not None \
+                else (-Axis.LON.degree_count / 2, Axis.LON.degree_count / 2)
+            windows.append(BoundingBox(from_longitude, min(latitude_range), to_longitude, max(latitude_range)))
+        return windows
+
+    def resample_all_to_eqc(self, resolution=None, executor: Optional[ResampleExecutor] = None,
+                            windows: Optional[list[BoundingBox]] = None, **kwargs) -> "MultiSceneExt":
+        scene_windows = dict(zip(map(id, self.scenes), windows)) if windows is not None else dict()
+
+        def resample_func(scn: SceneExt) -> SceneExt:
+            window = scene_windows.get(id(scn))
+            return scn.resample_to_eqc_area(resolution=resolution, window=window, reduce_data=window is not None,
+                                            **kwargs)
+
+        if executor is None:
+            return MultiSceneExt(list(map(resample_func, self.scenes)))
+        return MultiSceneExt(executor.map(resample_func, self.scenes))
+
+    def resample_loaded_to_eqc(self, resolution=None, executor: Optional[ResampleExecutor] = None,
+                               latitude_range: Optional[tuple[float, float]] = None,
+                               section_longitudes: Optional[list[float]] = None, **kwargs):
         start_time = time.time()
         groups = self.group_loaded()
-        eqc_mscn = self.resample_all_to_eqc(resolution, **kwargs)
+        windows = self.get_eqc_windows(latitude_range, section_longitudes) if latitude_range is not None else None
+        eqc_mscn = self.resample_all_to_eqc(resolution, executor, windows, **kwargs)
         eqc_mscn.shared_dataset_ids = groups
         print(f"Resampled scenes: {round(time.time() - start_time, 4)} sec")
+        print(f"Resample cache: {SceneExt.resample_cache.stats}")
         return eqc_mscn
 
-    def combine(self, max_latitude) -> SceneExt:
+    def resample_all_to_native(self, **kwargs) -> "MultiSceneExt":
+        return MultiSceneExt([
+            scn.resample(scn.coarsest_area(), resampler="native", reduce_data=False, **kwargs) for scn in self.scenes
+        ])
+
+    def resample_loaded_to_native(self, **kwargs) -> "MultiSceneExt":
+        start_time = time.time()
+        groups = self.group_loaded()
+        native_mscn = self.resample_all_to_native(**kwargs)
+        native_mscn.shared_dataset_ids = groups
+        print(f"Aggregated scenes to their coarsest areas: {round(time.time() - start_time, 4)} sec")
+        return native_mscn
+
+    def stack_shared(self) -> tuple[list[DataID], list[xr.DataArray]]:
+        # All shared datasets are stacked along a band axis, so that they are blended together in a single pass
+        dataset_ids = sorted(self.shared_dataset_ids, key=str)
+        stacked_data_arrays = [
+            xr.concat([scn[dataset_id] for dataset_id in dataset_ids], dim="band_stack",
+                      coords="minimal", compat="override", combine_attrs="override")
+            for scn in self.scenes
+        ]
+        return dataset_ids, stacked_data_arrays
+
+    @staticmethod
+    def unstack(dataset_ids: list[DataID], stacked_data_array: xr.DataArray) -> SceneExt:
+        scn = Scene()
+        for index, dataset_id in enumerate(dataset_ids):
+            band_data_array = stacked_data_array.isel(band_stack=index, drop=True)
+            band_data_array.attrs = dict(stacked_data_array.attrs)
+            scn[dataset_id] = band_data_array
+        return SceneExt.from_scene(scn)
+
+    @staticmethod
+    def combine_stacked(stacked_data_arrays: list[xr.DataArray], max_latitude,
+                        previous_data_array: Optional[xr.DataArray] = None, changed_indexes: Optional[list[int]] = None,
+                        **eqc_blend_kwargs) -> xr.DataArray:
+        with EqcBlend(latitude_range=(-max_latitude, max_latitude), **eqc_blend_kwargs) as eqc_blend:
+            if previous_data_array is None:
+                return eqc_blend(stacked_data_arrays)
+            return eqc_blend.update(stacked_data_arrays, previous_data_array, changed_indexes)
+
+    def combine(self, max_latitude, executor: Optional[BlendExecutor] = None, lazy: bool = False,
+                use_memmap: bool = False, output_encoding: Optional[OutputEncoding] = None,
+                bbox: Optional[BoundingBox] = None, section_longitudes: Optional[list[float]] = None,
+                engine: BlendEngine = BlendEngine.EQC, resolution: Optional[float] = None) -> SceneExt:
         if len(self.scenes) == 0:
             raise ValueError("cannot combine MultiSceneExt with 0 scenes")
         start_time = time.time()
-        eqc_blend = EqcBlend(latitude_range=(-max_latitude, max_latitude))
-        combined_scn = self.blend(eqc_blend)
-        combined_scn_ext = SceneExt.from_scene(combined_scn)
+        dataset_ids, stacked_data_arrays = self.stack_shared()
+        combined_data_array = self.combine_stacked(
+            stacked_data_arrays, max_latitude, executor=executor, lazy=lazy, use_memmap=use_memmap,
+            output_encoding=output_encoding, bbox=bbox, section_longitudes=section_longitudes, engine=engine,
+            resolution=resolution
+        )
+        combined_scn_ext = self.unstack(dataset_ids, combined_data_array)
         combined_scn_ext.load(self.loaded)
         print(f"Combined scenes: {round(time.time() - start_time, 4)} sec")
         return combined_scn_ext
@@ -0,0 +1,464 @@
+import os
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Optional, Union
+
+import numpy as np
+import dask
+import dask.array as da
+from pyresample import AreaDefinition
+
+from wwclouds.config import DATA_PATH_REMAP_PLANS, REMAP_PLANS_MAX_BYTES
+from wwclouds.data_types.output_encoding import OutputEncoding
+from wwclouds.helpers.list_helper import ListHelper
+
+
+def _assign_values(dst: np.ndarray, lat_indexes: np.ndarray, lon_indexes: np.ndarray, values: np.ndarray,
+                   encoding: OutputEncoding) -> None:
+    valid_mask = ~np.isnan(values)
+    plane_indexes = lat_indexes[:, np.newaxis] * dst.shape[-1] + lon_indexes[np.newaxis, :]
+    band_offsets = np.arange(int(np.prod(dst.shape[:-2]))) * dst.shape[-2] * dst.shape[-1]  # Leading band axes
+    flat_indexes = (band_offsets.reshape(dst.shape[:-2] + (1, 1)) + plane_indexes)[valid_mask]
+    valid_values = encoding.encode(values[valid_mask])
+    has_duplicates = len(np.unique(lat_indexes)) != len(lat_indexes) \
+        or len(np.unique(lon_indexes)) != len(lon_indexes)
+    if has_duplicates:  # Keep the last write for each index, as a pixel by pixel loop would
+        _, reversed_first_indexes = np.unique(flat_indexes[::-1], return_index=True)
+        last_indexes = len(flat_indexes) - 1 - reversed_first_indexes
+        flat_indexes, valid_values = flat_indexes[last_indexes], valid_values[last_indexes]
+    dst.reshape(-1)[flat_indexes] = valid_values
+
+
+def _blend_seam(source_values: list[np.ndarray], seam_weights: Optional[np.ndarray],
+                compute_dtype: np.dtype) -> np.ndarray:
+    if len(source_values) == 1:
+        return source_values[0]
+    values1, values2 = source_values
+    weights = seam_weights[np.newaxis, :].astype(compute_dtype, copy=False)
+    nan_mask1, nan_mask2 = np.isnan(values1), np.isnan(values2)
+    return np.where(
+        nan_mask1,
+        values2,
+        np.where(nan_mask2, values1, values1 * (1 - weights) + values2 * weights)
+    )
+
+
+class RemapSection:
+    def __init__(self,
+                 source_indexes: tuple[int, ...],
+                 source_lat_indexes: tuple[np.ndarray, ...],
+                 source_lon_indexes: tuple[np.ndarray, ...],
+                 lat_indexes: np.ndarray,
+                 lon_indexes: np.ndarray,
+                 *,
+                 seam_weights: Optional[np.ndarray] = None):
+        if not len(source_indexes) == len(source_lat_indexes) == len(source_lon_indexes):
+            raise ValueError("every source must have both latitude and longitude indexes")
+        if len(source_indexes) == 2 and seam_weights is None:
+            raise ValueError("seam_weights must be set for sections with two sources")
+        self.source_indexes = tuple(source_indexes)
+        self.source_lat_indexes = tuple(source_lat_indexes)
+        self.source_lon_indexes = tuple(source_lon_indexes)
+        self.lat_indexes = lat_indexes
+        self.lon_indexes = lon_indexes
+        self.seam_weights = seam_weights
+
+    @property
+    def is_merged(self) -> bool:
+        return len(self.source_indexes) == 2
+
+    def take_rows(self, rows: np.ndarray) -> "RemapSection":
+        return RemapSection(
+            self.source_indexes,
+            tuple(lat_indexes[rows] for lat_indexes in self.source_lat_indexes),
+            self.source_lon_indexes,
+            self.lat_indexes[rows],
+            self.lon_indexes,
+            seam_weights=self.seam_weights
+        )
+
+    def take_columns(self, columns_mask: np.ndarray) -> Optional["RemapSection"]:
+        columns = np.flatnonzero(columns_mask[self.lon_indexes])
+        if len(columns) == 0:
+            return None
+        return RemapSection(
+            self.source_indexes,
+            self.source_lat_indexes,
+            tuple(lon_indexes[columns] for lon_indexes in self.source_lon_indexes),
+            self.lat_indexes,
+            self.lon_indexes[columns],
+            seam_weights=self.seam_weights[columns] if self.seam_weights is not None else None
+        )
+
+    def crop(self, lat_index_range: range, lon_index_start: int, lon_index_count: int,
+             lon_length: int) -> Optional["RemapSection"]:
+        rows = np.flatnonzero((lat_index_range.start <= self.lat_indexes) & (self.lat_indexes < lat_index_range.stop))
+        lon_indexes = (self.lon_indexes - lon_index_start) % lon_length  # The window may wrap around the earth
+        columns = np.flatnonzero(lon_indexes < lon_index_count)
+        if len(rows) == 0 or len(columns) == 0:
+            return None
+        return RemapSection(
+            self.source_indexes,
+            tuple(lat_indexes[rows] for lat_indexes in self.source_lat_indexes),
+            tuple(lon_indexes[columns] for lon_indexes in self.source_lon_indexes),
+            self.lat_indexes[rows] - lat_index_range.start,
+            lon_indexes[columns],
+            seam_weights=self.seam_weights[columns] if self.seam_weights is not None else None
+        )
+
+    def get_block(self, lat_index_range: range, lon_index_range: range,
+                  first_source_index: int = 0) -> Optional[tuple["RemapSection", list[tuple[int, tuple[slice, slice]]]]]:
+        rows = np.flatnonzero((lat_index_range.start <= self.lat_indexes) & (self.lat_indexes < lat_index_range.stop))
+        columns = np.flatnonzero(
+            (lon_index_range.start <= self.lon_indexes) & (self.lon_indexes < lon_index_range.stop)
+        )
+        if len(rows) == 0 or len(columns) == 0:
+            return None
+        source_windows, source_lat_indexes, source_lon_indexes = [], [], []
+        for source_index, lat_indexes, lon_indexes \
+                in zip(self.source_indexes, self.source_lat_indexes, self.source_lon_indexes):
+            block_lat_indexes, block_lon_indexes = lat_indexes[rows], lon_indexes[columns]
+            lat_offset, lon_offset = block_lat_indexes.min(), block_lon_indexes.min()
+            window = (
+                slice(lat_offset, block_lat_indexes.max() + 1),
+                slice(lon_offset, block_lon_indexes.max() + 1)
+            )
+            source_windows.append((source_index, window))
+            source_lat_indexes.append(block_lat_indexes - lat_offset)
+            source_lon_indexes.append(block_lon_indexes - lon_offset)
+        block_section = RemapSection(
+            tuple(range(first_source_index, first_source_index + len(source_windows))),
+            tuple(source_lat_indexes),
+            tuple(source_lon_indexes),
+            self.lat_indexes[rows] - lat_index_range.start,
+            self.lon_indexes[columns] - lon_index_range.start,
+            seam_weights=self.seam_weights[columns] if self.seam_weights is not None else None
+        )
+        return block_section, source_windows
+
+    def apply(self, dst: np.ndarray, values_list: list[np.ndarray], encoding: OutputEncoding) -> None:
+        compute_dtype = encoding.compute_dtype
+        source_values = [
+            values_list[source_index][..., lat_indexes[:, np.newaxis], lon_indexes].astype(compute_dtype, copy=False)
+            for source_index, lat_indexes, lon_indexes
+            in zip(self.source_indexes, self.source_lat_indexes, self.source_lon_indexes)
+        ]
+        values = _blend_seam(source_values, self.seam_weights, compute_dtype)
+        _assign_values(dst, self.lat_indexes, self.lon_indexes, values, encoding)
+
+    def to_dict(self, prefix: str) -> dict[str, np.ndarray]:
+        arrays = {
+            f"{prefix}_source_indexes": np.array(self.source_indexes),
+            f"{prefix}_lat_indexes": self.lat_indexes,
+            f"{prefix}_lon_indexes": self.lon_indexes
+        }
+        for index, (lat_indexes, lon_indexes) in enumerate(zip(self.source_lat_indexes, self.source_lon_indexes)):
+            arrays[f"{prefix}_source_lat_indexes_{index}"] = lat_indexes
+            arrays[f"{prefix}_source_lon_indexes_{index}"] = lon_indexes
+        if self.seam_weights is not None:
+            arrays[f"{prefix}_seam_weights"] = self.seam_weights
+        return arrays
+
+    @staticmethod
+    def from_dict(arrays: dict[str, np.ndarray], prefix: str) -> "RemapSection":
+        source_indexes = tuple(int(index) for index in arrays[f"{prefix}_source_indexes"])
+        return RemapSection(
+            source_indexes,
+            tuple(arrays[f"{prefix}_source_lat_indexes_{index}"] for index in range(len(source_indexes))),
+            tuple(arrays[f"{prefix}_source_lon_indexes_{index}"] for index in range(len(source_indexes))),
+            arrays[f"{prefix}_lat_indexes"],
+            arrays[f"{prefix}_lon_indexes"],
+            seam_weights=arrays.get(f"{prefix}_seam_weights")
+        )
+
+
+class GatherSection:
+    def __init__(self,
+                 source_indexes: tuple[int, ...],
+                 source_flat_indexes: tuple[np.ndarray, ...],
+                 lat_indexes: np.ndarray,
+                 lon_indexes: np.ndarray,
+                 *,
+                 seam_weights: Optional[np.ndarray] = None):
+        if len(source_indexes) != len(source_flat_indexes):
+            raise ValueError("every source must have flat indexes")
+        if len(source_indexes) == 2 and seam_weights is None:
+            raise ValueError("seam_weights must be set for sections with two sources")
+        self.source_indexes = tuple(source_indexes)
+        self.source_flat_indexes = tuple(source_flat_indexes)  # Source pixel of every destination pixel, or -1
+        self.lat_indexes = lat_indexes
+        self.lon_indexes = lon_indexes
+        self.seam_weights = seam_weights
+
+    @property
+    def is_merged(self) -> bool:
+        return len(self.source_indexes) == 2
+
+    def __take(self, rows: Union[np.ndarray, slice], columns: Union[np.ndarray, slice],
+               lat_indexes: np.ndarray, lon_indexes: np.ndarray) -> "GatherSection":
+        return GatherSection(
+            self.source_indexes,
+            tuple(flat_indexes[rows][:, columns] for flat_indexes in self.source_flat_indexes),
+            lat_indexes,
+            lon_indexes,
+            seam_weights=self.seam_weights[columns] if self.seam_weights is not None else None
+        )
+
+    def take_rows(self, rows: np.ndarray) -> "GatherSection":
+        return self.__take(rows, slice(None), self.lat_indexes[rows], self.lon_indexes)
+
+    def take_columns(self, columns_mask: np.ndarray) -> Optional["GatherSection"]:
+        columns = np.flatnonzero(columns_mask[self.lon_indexes])
+        if len(columns) == 0:
+            return None
+        return self.__take(slice(None), columns, self.lat_indexes, self.lon_indexes[columns])
+
+    def crop(self, lat_index_range: range, lon_index_start: int, lon_index_count: int,
+             lon_length: int) -> Optional["GatherSection"]:
+        rows = np.flatnonzero((lat_index_range.start <= self.lat_indexes) & (self.lat_indexes < lat_index_range.stop))
+        lon_indexes = (self.lon_indexes - lon_index_start) % lon_length  # The window may wrap around the earth
+        columns = np.flatnonzero(lon_indexes < lon_index_count)
+        if len(rows) == 0 or len(columns) == 0:
+            return None
+        return self.__take(rows, columns, self.lat_indexes[rows] - lat_index_range.start, lon_indexes[columns])
+
+    def apply(self, dst: np.ndarray, values_list: list[np.ndarray], encoding: OutputEncoding) -> None:
+        compute_dtype = encoding.compute_dtype
+        source_values = []
+        for source_index, flat_indexes in zip(self.source_indexes, self.source_flat_indexes):
+            values = values_list[source_index]
+            flat_values = values.reshape(values.shape[:-2] + (-1,))
+            gathered_values = flat_values[..., np.maximum(flat_indexes, 0)].astype(compute_dtype)
+            gathered_values[..., flat_indexes < 0] = np.nan
+            source_values.append(gathered_values)
+        values = _blend_seam(source_values, self.seam_weights, compute_dtype)
+        _assign_values(dst, self.lat_indexes, self.lon_indexes, values, encoding)
+
+    def to_dict(self, prefix: str) -> dict[str, np.ndarray]:
+        arrays = {
+            f"{prefix}_source_indexes": np.array(self.source_indexes),
+            f"{prefix}_lat_indexes": self.lat_indexes,
+            f"{prefix}_lon_indexes": self.lon_indexes
+        }
+        for index, flat_indexes in enumerate(self.source_flat_indexes):
+            arrays[f"{prefix}_source_flat_indexes_{index}"] = flat_indexes
+        if self.seam_weights is not None:
+            arrays[f"{prefix}_seam_weights"] = self.seam_weights
+        return arrays
+
+    @staticmethod
+    def from_dict(arrays: dict[str, np.ndarray], prefix: str) -> "GatherSection":
+        source_indexes = tuple(int(index) for index in arrays[f"{prefix}_source_indexes"])
+        return GatherSection(
+            source_indexes,
+            tuple(arrays[f"{prefix}_source_flat_indexes_{index}"] for index in range(len(source_indexes))),
+            arrays[f"{prefix}_lat_indexes"],
+            arrays[f"{prefix}_lon_indexes"],
+            seam_weights=arrays.get(f"{prefix}_seam_weights")
+        )
+
+
+def _blend_block(remap_plan: "RemapPlan", shape: tuple[int, ...], encoding: OutputEncoding,
+                 *values_list: np.ndarray) -> np.ndarray:
+    dst = np.full(shape, encoding.fill_value, dtype=encoding.dtype)
+    remap_plan.apply(dst, list(values_list), encoding)
+    return dst
+
+
+class RemapPlan:
+    version = 2
+
+    def __init__(self,
+                 lon_delta_step: float,
+                 lat_delta_step: float,
+                 latitude_index_range: tuple[int, int],
+                 sections: list[Union[RemapSection, GatherSection]],
+                 shape: tuple[int, int],
+                 offset: tuple[int, int] = (0, 0)):
+        self.lon_delta_step = lon_delta_step
+        self.lat_delta_step = lat_delta_step
+        self.latitude_index_range = latitude_index_range
+        self.sections = sections
+        self.shape = shape
+        self.offset = offset  # Position of the destination array in the earth array
+
+    def apply(self, dst: np.ndarray, values_list: list[np.ndarray], encoding: OutputEncoding) -> None:
+        for section in self.sections:
+            section.apply(dst, values_list, encoding)
+
+    def split_by_lat_axis(self, count: int) -> list["RemapPlan"]:
+        min_index, max_index = self.latitude_index_range
+        lat_index_ranges = filter(len, ListHelper.split_list(range(min_index, max_index + 1), count))
+        plans = []
+        for lat_index_range in lat_index_ranges:
+            sections = []
+            for section in self.sections:
+                rows = np.flatnonzero(
+                    (lat_index_range.start <= section.lat_indexes) & (section.lat_indexes < lat_index_range.stop)
+                )
+                if len(rows) != 0:
+                    sections.append(section.take_rows(rows))
+            plans.append(RemapPlan(
+                self.lon_delta_step,
+                self.lat_delta_step,
+                (lat_index_range.start, lat_index_range.stop - 1),
+                sections,
+                self.shape,
+                self.offset
+            ))
+        return plans
+
+    def get_columns_mask_for_sources(self, source_indexes: list[int]) -> np.ndarray:
+        columns_mask = np.zeros(self.shape[1], dtype=bool)
+        for section in self.sections:
+            if not set(section.source_indexes).isdisjoint(source_indexes):
+                columns_mask[section.lon_indexes] = True
+        return columns_mask
+
+    def take_columns(self, columns_mask: np.ndarray) -> "RemapPlan":
+        sections = [
+            column_section for column_section in (section.take_columns(columns_mask) for section in self.sections)
+            if column_section is not None
+        ]
+        return RemapPlan(self.lon_delta_step, self.lat_delta_step, self.latitude_index_range, sections, self.shape,
+                         self.offset)
+
+    def __get_dask_block(self, lat_index_range: range, lon_index_range: range, encoding: OutputEncoding,
+                         sources: list[da.Array]) -> da.Array:
+        shape = sources[0].shape[:-2] + (len(lat_index_range), len(lon_index_range))
+        block_sections, source_windows = [], []
+        for section in self.sections:
+            block = section.get_block(lat_index_range, lon_index_range, first_source_index=len(source_windows))
+            if block is not None:
+                block_sections.append(block[0])
+                source_windows.extend(block[1])
+        if len(block_sections) == 0:
+            return da.full(shape, encoding.fill_value, dtype=encoding.dtype, chunks=shape)
+        block_plan = RemapPlan(self.lon_delta_step, self.lat_delta_step, self.latitude_index_range, block_sections,
+                               shape[-2:])
+        windows = [sources[source_index][(Ellipsis, *window)] for source_index, window in source_windows]
+        delayed_block = dask.delayed(_blend_block, pure=True)(block_plan, shape, encoding, *windows)
+        return da.from_delayed(delayed_block, shape, dtype=encoding.dtype)
+
+    def to_dask_array(self, encoding: OutputEncoding, sources: list[da.Array],
+                      chunk_shape: tuple[int, int]) -> da.Array:
+        lat_index_ranges, lon_index_ranges = (
+            [range(start, min(start + chunk_length, length)) for start in range(0, length, chunk_length)]
+            for length, chunk_length in zip(self.shape, chunk_shape)
+        )
+        return da.block([
+            [self.__get_dask_block(lat_index_range, lon_index_range, encoding, sources)
+             for lon_index_range in lon_index_ranges]
+            for lat_index_range in lat_index_ranges
+        ])
+
+    def save(self, filepath: str) -> None:
+        arrays = {
+            "delta_steps": np.array([self.lon_delta_step, self.lat_delta_step]),
+            "latitude_index_range": np.array(self.latitude_index_range),
+            "shape": np.array(self.shape),
+            "offset": np.array(self.offset),
+            "section_count": np.array(len(self.sections))
+        }
+        for index, section in enumerate(self.sections):
+            arrays.update(section.to_dict(f"section{index}"))
+        tmp_filepath = f"{filepath}.tmp.npz"
+        np.savez(tmp_filepath, **arrays)
+        os.replace(tmp_filepath, filepath)
+
+    @staticmethod
+    def load(filepath: str) -> "RemapPlan":
+        with np.load(filepath) as npz_file:
+            arrays = dict(npz_file.items())
+        lon_delta_step, lat_delta_step = (float(step) for step in arrays["delta_steps"])
+        sections = [
+            GatherSection.from_dict(arrays, prefix) if f"{prefix}_source_flat_indexes_0" in arrays
+            else RemapSection.from_dict(arrays, prefix)
+            for prefix in (f"section{index}" for index in range(int(arrays["section_count"])))
+        ]
+        return RemapPlan(
+            lon_delta_step,
+            lat_delta_step,
+            tuple(int(index) for index in arrays["latitude_index_range"]),
+            sections,
+            tuple(int(length) for length in arrays["shape"]),
+            tuple(int(index) for index in arrays["offset"])
+        )
+
+
+class RemapPlanCache:
+    def __init__(self, directory: str = DATA_PATH_REMAP_PLANS, max_bytes: int = REMAP_PLANS_MAX_BYTES,
+                 max_plans_in_memory: int = 8):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_plans_in_memory = max_plans_in_memory
+        self.__plans: OrderedDict[str, RemapPlan] = OrderedDict()
+
+    @staticmethod
+    def get_key(areas: list[AreaDefinition], *parameters) -> str:
+        the_hash = hashlib.sha1()
+        for area in areas:
+            area.update_hash(the_hash)
+        the_hash.update(repr((RemapPlan.version, *parameters)).encode("utf-8"))
+        return the_hash.hexdigest()
+
+    def __get_filepath(self, key: str) -> str:
+        return f"{self.directory}/{key}.npz"
+
+    def __remember(self, key: str, plan: RemapPlan) -> None:
+        self.__plans[key] = plan
+        self.__plans.move_to_end(key)
+        while len(self.__plans) > self.max_plans_in_memory:
+            self.__plans.popitem(last=False)
+
+    def __touch(self, key: str) -> None:
+        # The modification time of a plan file is its last use, which decides the order of eviction
+        try:
+            os.utime(self.__get_filepath(key))
+        except FileNotFoundError:
+            pass
+
+    def __evict(self, protected_key: str) -> None:
+        protected_filepath = self.__get_filepath(protected_key)
+        plan_files = []
+        for filename in os.listdir(self.directory):
+            filepath = f"{self.directory}/{filename}"
+            if not filename.endswith(".npz") or filename.endswith(".tmp.npz") or filepath == protected_filepath:
+                continue
+            try:
+                plan_files.append((os.path.getmtime(filepath), os.path.getsize(filepath), filepath))
+            except FileNotFoundError:  # Evicted by another process
+                continue
+        total_size = sum(size for _, size, _ in plan_files)
+        if os.path.exists(protected_filepath):
+            total_size += os.path.getsize(protected_filepath)
+        for _, size, filepath in sorted(plan_files):
+            if total_size <= self.max_bytes:
+                break
+            try:
+                os.remove(filepath)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def get(self, key: str) -> Optional[RemapPlan]:
+        plan = self.__plans.get(key)
+        if plan is None and os.path.exists(filepath := self.__get_filepath(key)):
+            plan = RemapPlan.load(filepath)
+        if plan is not None:
+            self.__remember(key, plan)
+            self.__touch(key)
+        return plan
+
+    def set(self, key: str, plan: RemapPlan) -> None:
+        self.__remember(key, plan)
+        os.makedirs(self.directory, exist_ok=True)
+        plan.save(self.__get_filepath(key))
+        self.__evict(key)
+
+    def get_or_create(self, key: str, create_func: Callable[[], RemapPlan]) -> RemapPlan:
+        plan = self.get(key)
+        if plan is None:
+            plan = create_func()
+            self.set(key, plan)
+        return plan
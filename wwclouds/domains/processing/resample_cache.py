@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from pyresample import AreaDefinition
+from satpy.resample import prepare_resampler
+
+from wwclouds.config import DATA_PATH_SATPY_RESAMPLE_CACHE, RESAMPLE_CACHE_MAX_BYTES
+
+
+class ResampleCacheStats:
+    def __init__(self):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_written = 0
+        self.bytes_evicted = 0
+
+    def __str__(self) -> str:
+        return f"{self.memory_hits} memory hits, {self.disk_hits} disk hits, {self.misses} misses, " \
+               f"{round(self.bytes_written / 2 ** 20, 1)} MiB written, " \
+               f"{round(self.bytes_evicted / 2 ** 20, 1)} MiB evicted"
+
+
+class ResampleCache:
+    def __init__(self, directory: str = DATA_PATH_SATPY_RESAMPLE_CACHE, max_bytes: int = RESAMPLE_CACHE_MAX_BYTES,
+                 max_resamplers_in_memory: int = 16):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_resamplers_in_memory = max_resamplers_in_memory
+        self.stats = ResampleCacheStats()
+        # Satpy only keeps weak references to its resamplers, so these keep the lookup tables alive across scenes
+        self.__resamplers: OrderedDict[str, Any] = OrderedDict()
+        self.__lock = threading.RLock()
+        self.__key_locks: dict[str, threading.Lock] = dict()
+
+    @property
+    def __index_filepath(self) -> str:
+        return f"{self.directory}/index.json"
+
+    @staticmethod
+    def get_key(source_area: AreaDefinition, destination_area: AreaDefinition, resampler: str) -> str:
+        the_hash = hashlib.sha1()
+        source_area.update_hash(the_hash)
+        destination_area.update_hash(the_hash)
+        the_hash.update(resampler.encode("utf-8"))
+        return the_hash.hexdigest()
+
+    @staticmethod
+    def __get_size(path: str) -> int:
+        if not os.path.isdir(path):
+            return os.path.getsize(path)
+        return sum(
+            os.path.getsize(os.path.join(dir_path, filename))
+            for dir_path, _, filenames in os.walk(path) for filename in filenames
+        )
+
+    def __get_entry_names(self) -> set[str]:
+        index_filename = os.path.basename(self.__index_filepath)
+        return set(  # Hidden entries are still being built
+            filename for filename in os.listdir(self.directory)
+            if not filename.startswith(index_filename) and not filename.startswith(".")
+        )
+
+    def __read_index(self) -> dict[str, dict]:
+        if not os.path.exists(self.__index_filepath):
+            return dict()
+        with open(self.__index_filepath) as file:
+            return json.load(file)
+
+    def __write_index(self, index: dict[str, dict]) -> None:
+        tmp_filepath = f"{self.__index_filepath}.tmp"
+        with open(tmp_filepath, "w") as file:
+            json.dump(index, file)
+        os.replace(tmp_filepath, self.__index_filepath)
+
+    def __remember(self, key: str, resampler_instance: Any) -> None:
+        self.__resamplers[key] = resampler_instance
+        self.__resamplers.move_to_end(key)
+        while len(self.__resamplers) > self.max_resamplers_in_memory:
+            self.__resamplers.popitem(last=False)
+
+    def __evict(self, index: dict[str, dict], protected_key: str) -> None:
+        entry_sizes = dict((name, self.__get_size(f"{self.directory}/{name}")) for name in self.__get_entry_names())
+        total_size = sum(entry_sizes.values())
+        if total_size <= self.max_bytes:
+            return
+        indexed_names = set(name for item in index.values() for name in item["entries"])
+        groups = [(item["last_used"], key, item["entries"]) for key, item in index.items() if key != protected_key]
+        groups.extend(  # Entries which are not in the index are evicted by their modification time
+            (os.path.getmtime(f"{self.directory}/{name}"), None, [name])
+            for name in entry_sizes if name not in indexed_names
+        )
+        for _, key, names in sorted(groups, key=lambda group: group[0]):
+            if total_size <= self.max_bytes:
+                break
+            for name in names:
+                path = f"{self.directory}/{name}"
+                if not os.path.exists(path):
+                    continue
+                shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+                total_size -= entry_sizes.get(name, 0)
+                self.stats.bytes_evicted += entry_sizes.get(name, 0)
+            if key is not None:
+                index.pop(key)
+
+    def __get_key_lock(self, key: str) -> threading.Lock:
+        with self.__lock:
+            return self.__key_locks.setdefault(key, threading.Lock())
+
+    def __get_remembered(self, key: str) -> Any:
+        with self.__lock:
+            resampler_instance = self.__resamplers.get(key)
+            if resampler_instance is not None:
+                self.stats.memory_hits += 1
+                self.__remember(key, resampler_instance)
+                self.__mark_used(key)
+            return resampler_instance
+
+    def __mark_used(self, key: str) -> None:
+        # Memory hits are uses as well, so that tables kept in memory are not the first to be evicted from disk
+        index = self.__read_index()
+        if key in index:
+            index[key]["last_used"] = time.time()
+            self.__write_index(index)
+
+    def __is_on_disk(self, key: str) -> bool:
+        with self.__lock:
+            item = self.__read_index().get(key)
+        return item is not None and all(os.path.exists(f"{self.directory}/{name}") for name in item["entries"])
+
+    def __build(self, key: str, resampler_instance: Any) -> list[str]:
+        # Built in a directory of its own, so that the entries of scenes built concurrently are not mixed up
+        build_directory = f"{self.directory}/.{key}.build"
+        shutil.rmtree(build_directory, ignore_errors=True)
+        os.makedirs(build_directory)
+        resampler_instance.precompute(cache_dir=build_directory)
+        entry_names = sorted(os.listdir(build_directory))
+        for name in entry_names:
+            path = f"{self.directory}/{name}"
+            if os.path.exists(path):  # Entries which are not in the index may already be on disk
+                build_path = f"{build_directory}/{name}"
+                shutil.rmtree(build_path) if os.path.isdir(build_path) else os.remove(build_path)
+            else:
+                os.replace(f"{build_directory}/{name}", path)
+        os.rmdir(build_directory)
+        return entry_names
+
+    def prepare(self, source_area: AreaDefinition, destination_area: AreaDefinition,
+                resampler: str = "bilinear") -> None:
+        # Only the shared index and resamplers are locked, so that different scenes build their tables concurrently
+        key = self.get_key(source_area, destination_area, resampler)
+        if self.__get_remembered(key) is not None:
+            return
+        with self.__get_key_lock(key):
+            if self.__get_remembered(key) is not None:  # Built by another scene while waiting
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            _, resampler_instance = prepare_resampler(source_area, destination_area, resampler=resampler,
+                                                      cache_dir=self.directory)
+            if self.__is_on_disk(key):
+                resampler_instance.precompute(cache_dir=self.directory)
+                entry_names = None
+            else:
+                entry_names = self.__build(key, resampler_instance)
+            with self.__lock:
+                index = self.__read_index()
+                if entry_names is None:
+                    self.stats.disk_hits += 1
+                else:
+                    self.stats.misses += 1
+                    self.stats.bytes_written += sum(
+                        self.__get_size(f"{self.directory}/{name}") for name in entry_names
+                    )
+                    index[key] = {"entries": entry_names}
+                index.setdefault(key, {"entries": []})["last_used"] = time.time()
+                self.__remember(key, resampler_instance)
+                self.__evict(index, key)
+                self.__write_index(index)
@@ -0,0 +1,50 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+import dask
+
+from wwclouds.config import CPU_COUNT
+from wwclouds.domains.processing.scene_ext import SceneExt
+
+
+class ResampleExecutor:
+    def __init__(self, worker_count: int, max_threads: int = CPU_COUNT):
+        if worker_count <= 0 or max_threads <= 0:
+            raise ValueError("worker_count and max_threads must be larger than 0")
+        self.worker_count = worker_count
+        self.max_threads = max_threads
+
+        self.__dask_pool: Optional[ThreadPoolExecutor] = None
+        self.__scene_pool: Optional[ThreadPoolExecutor] = None
+        self.__dask_config: Optional[dask.config.set] = None
+
+    def __enter__(self) -> "ResampleExecutor":
+        # Every scene is computed by the same dask pool, so that concurrent scenes do not oversubscribe the threads
+        self.__dask_pool = ThreadPoolExecutor(max_workers=self.max_threads)
+        self.__scene_pool = ThreadPoolExecutor(max_workers=self.worker_count)
+        self.__dask_config = dask.config.set(scheduler="threads", pool=self.__dask_pool)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        try:
+            self.__scene_pool.shutdown()
+            self.__dask_pool.shutdown()
+        finally:
+            self.__dask_config.__exit__(exc_type, exc_val, exc_tb)
+
+    @staticmethod
+    def __persist(scn: SceneExt) -> SceneExt:
+        for dataset_id in list(scn.keys()):
+            scn[dataset_id] = scn[dataset_id].persist()
+        return scn
+
+    def __resample_and_persist(self, resample_func: Callable[..., SceneExt], *args: Any) -> SceneExt:
+        return self.__persist(resample_func(*args))
+
+    def submit(self, resample_func: Callable[..., SceneExt], *args: Any) -> Future:
+        return self.__scene_pool.submit(self.__resample_and_persist, resample_func, *args)
+
+    def map(self, resample_func: Callable[[SceneExt], SceneExt], scenes: list[SceneExt]) -> list[SceneExt]:
+        with self:
+            futures = [self.submit(resample_func, scn) for scn in scenes]
+            return [future.result() for future in futures]
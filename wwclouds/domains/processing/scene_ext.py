@@ -1,5 +1,8 @@
+import math
 import functools
-from typing import Callable, Union
+from typing import Callable, Optional, Union
+
+import numpy as np
 
 import matplotlib.pyplot as plt
 import satpy.writers
@@ -10,7 +13,12 @@ from satpy.composites import CloudCompositor
 from trollimage.xrimage import XRImage
 from xarray import DataArray
 
-from wwclouds.config import DATA_PATH_SATPY_RESAMPLE_CACHE
+from wwclouds.data_types.axis import Axis
+from wwclouds.data_types.bounding_box import BoundingBox
+from wwclouds.domains.processing.resample_cache import ResampleCache
+from wwclouds.helpers.area_axis_helper import AreaAxisHelper
+from wwclouds.helpers.data_array_helper import DataArraysHelper
+from wwclouds.helpers.longitude_helper import LongitudeHelper
 
 
 def _return_as_scene_ext_decorator(func) -> Callable[..., "SceneExt"]:
@@ -23,6 +31,9 @@ def _return_as_scene_ext_decorator(func) -> Callable[..., "SceneExt"]:
 
 
 class SceneExt(Scene):
+    resample_cache = ResampleCache()
+    __margin_pixel_count = 8
+
     def __init__(self, filenames=None, reader=None, filter_parameters=None,
                  reader_kwargs=None):
         super().__init__(filenames, reader, filter_parameters, reader_kwargs)
@@ -60,6 +71,52 @@ class SceneExt(Scene):
                  **resample_kwargs) -> "SceneExt":
         return super().resample(destination, datasets, generate, unload, resampler, reduce_data, **resample_kwargs)
 
+    def get_native_resolution(self, wavelength: float, resolution: float,
+                              legal_resolutions: list[float]) -> Optional[float]:
+        native_resolutions = sorted(set(
+            data_id["resolution"] for data_id in self.available_dataset_ids()
+            if data_id.get("wavelength") is not None and wavelength in data_id["wavelength"]
+            and data_id["resolution"] in legal_resolutions
+        ))
+        if len(native_resolutions) == 0:
+            return None
+        sufficient_resolutions = [native_resolution for native_resolution in native_resolutions
+                                  if native_resolution <= resolution]
+        return max(sufficient_resolutions) if sufficient_resolutions else min(native_resolutions)
+
+    def decimate_to_resolution(self, resolution: float) -> "SceneExt":
+        if not self.all_same_area:
+            return self
+        area = self.area
+        ratio = resolution / max(area.pixel_size_x, area.pixel_size_y)
+        # Ratios which only miss a whole number by rounding errors are rounded, any other ratio is floored, so that
+        # the data never becomes coarser than the resolution
+        factor = round(ratio) if math.isclose(ratio, round(ratio), rel_tol=1e-3) else math.floor(ratio)
+        if factor < 2:
+            return self
+        decimated_area = area.aggregate(boundary="trim", x=factor, y=factor)
+        decimated_scn = SceneExt.from_scene(self.copy())
+        for dataset_id in self.keys():
+            data_array = self[dataset_id]
+            # NaN pixels are skipped, so that blocks at the edge of the disk are kept instead of shrinking the disk
+            decimated_data_array = data_array.coarsen(boundary="trim", x=factor, y=factor).mean(skipna=True)
+            decimated_data_array.attrs = {
+                **data_array.attrs,
+                "area": decimated_area,
+                "resolution": max(decimated_area.pixel_size_x, decimated_area.pixel_size_y)
+            }
+            decimated_scn[dataset_id] = decimated_data_array
+        return decimated_scn
+
+    def load_for_resolution(self, wavelengths: list[float], resolution: float,
+                            legal_resolutions: list[float]) -> "SceneExt":
+        # Loads the coarsest native data which still meets the resolution, and block averages it if it is much finer
+        for wavelength in wavelengths:
+            native_resolution = self.get_native_resolution(wavelength, resolution, legal_resolutions)
+            self.load([wavelength], resolution=native_resolution if native_resolution is not None
+                      else legal_resolutions)
+        return self.decimate_to_resolution(resolution)
+
     def __imshow_wavelength(self, wavelength: float) -> None:
         plt.figure()
         plt.imshow(self[wavelength])
@@ -79,7 +136,28 @@ class SceneExt(Scene):
         else:
             raise TypeError("query is of an incompatible type")
 
-    def resample_to_eqc_area(self, *, resolution=None, **kwargs) -> "SceneExt":
+    @staticmethod
+    def __crop_area_def(area_def: AreaDefinition, window: BoundingBox, margin: float) -> AreaDefinition:
+        # The area is sliced rather than recreated, so that the pixels stay aligned with the uncropped area
+        lons, lats = AreaAxisHelper.get_lonlat_axes(area_def)
+        # The margin must also cover the edge pixels which are read outside of every longitude section when blending
+        lon_margin = max(margin, SceneExt.__margin_pixel_count * LongitudeHelper.get_diff(lons[0], lons[1]))
+        lat_margin = max(margin, SceneExt.__margin_pixel_count * abs(lats[0] - lats[1]))
+        # Rows are kept symmetric around the equator, as the blend indexes them through their flipped latitudes
+        max_abs_lat = max(map(abs, window.latitude_range)) + lat_margin
+        rows = np.flatnonzero(np.abs(lats) <= max_abs_lat)
+        row_slice = slice(int(rows[0]), int(rows[-1]) + 1) if len(rows) != 0 else slice(None)
+        col_slice = slice(None)
+        if window.longitude_width + lon_margin * 2 < Axis.LON.degree_count / 2:
+            col_start, col_stop = LongitudeHelper.get_first_index_range(
+                lons, LongitudeHelper.add(window.min_lon, -lon_margin), LongitudeHelper.add(window.max_lon, lon_margin)
+            )
+            if col_start != col_stop:
+                col_slice = slice(col_start, col_stop)
+        return area_def[row_slice, col_slice]
+
+    def get_eqc_area_def(self, resolution=None, window: Optional[BoundingBox] = None,
+                         margin: float = 1.0) -> AreaDefinition:
         projection = {"proj": "eqc", "lon_0": self.lon_0}  # Equidistant cylindrical projection
 
         area_def_args = dict()
@@ -91,14 +169,40 @@ class SceneExt(Scene):
             projection=projection,
             **area_def_args
         )
+        if hasattr(area_def, "freeze"):  # Freezes the area the same way as satpy does when resampling
+            area_def = area_def.freeze(self.finest_area())
+        if window is not None:
+            area_def = self.__crop_area_def(area_def, window, margin)
+        return area_def
+
+    def __get_resample_source_area(self, destination_area: AreaDefinition, reduce_data: bool) -> AreaDefinition:
+        if not reduce_data:
+            return self.area
+        try:
+            slice_x, slice_y = self.area.get_area_slices(destination_area)
+        except NotImplementedError:
+            return self.area
+        return self.area[slice_y, slice_x]
+
+    def prewarm_eqc_resampler(self, resolution=None, window: Optional[BoundingBox] = None,
+                              reduce_data=True) -> None:
+        area_def = self.get_eqc_area_def(resolution, window)
+        self.resample_cache.prepare(self.__get_resample_source_area(area_def, reduce_data), area_def)
+
+    def resample_to_eqc_area(self, *, resolution=None, window: Optional[BoundingBox] = None, reduce_data=True,
+                             **kwargs) -> "SceneExt":
+        area_def = self.get_eqc_area_def(resolution, window)
+        if self.all_same_area:
+            self.resample_cache.prepare(self.__get_resample_source_area(area_def, reduce_data), area_def)
         return self.resample(
             destination=area_def,
             resampler="bilinear",
-            cache_dir=DATA_PATH_SATPY_RESAMPLE_CACHE,
+            reduce_data=reduce_data,
+            cache_dir=self.resample_cache.directory,
             **kwargs
         )
 
     def create_cloud_image(self, frequencies: list[float]) -> XRImage:
         compositor = CloudCompositor(name="clouds", transition_min=230.0, transition_max=298.15, transition_gamma=1.5)
-        composite = compositor([self[frequency] for frequency in frequencies])
+        composite = compositor([DataArraysHelper.decode(self[frequency]) for frequency in frequencies])
         return to_image(composite)
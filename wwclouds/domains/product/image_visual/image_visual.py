@@ -1,15 +1,18 @@
-from typing import Union
+from typing import Optional, Union
 import cv2
 import numpy as np
 import pathlib
 
+from wwclouds.data_types.bounding_box import BoundingBox
+
 
 class ImageVisual:
-    def __init__(self, resolution: tuple[int, int], *, load: bool = False):
+    def __init__(self, resolution: tuple[int, int], *, load: bool = False, bbox: Optional[BoundingBox] = None):
         if not isinstance(resolution, tuple) or len(resolution) != 2 or not all(isinstance(dim, int) for dim in resolution):
             raise ValueError("resolution is invalid")
 
         self.resolution = resolution
+        self.bbox = bbox
         self.__image: Union[..., None] = None
 
         if load:
@@ -44,8 +47,18 @@ class ImageVisual:
             raise ValueError("image cannot be used before it's loaded")
         return self.__image
 
+    @staticmethod
+    def __crop_to_bbox(image: np.ndarray, bbox: BoundingBox) -> np.ndarray:
+        height, width = image.shape[:2]
+        y1, y2 = (round((90 - lat) / 180 * height) for lat in (bbox.max_lat, bbox.min_lat))
+        x1 = round((bbox.min_lon + 180) / 360 * width)
+        x_count = max(round(bbox.longitude_width / 360 * width), 1)
+        return np.take(image[y1:max(y2, y1 + 1)], np.arange(x1, x1 + x_count), axis=1, mode="wrap")
+
     def load_world_map(self):
         image = cv2.imread(self.world_map_filepath, cv2.IMREAD_UNCHANGED)
+        if self.bbox is not None:
+            image = self.__crop_to_bbox(image, self.bbox)
         image_resized = cv2.resize(image, self.resolution)
         self.__image = image_resized
 
@@ -1,35 +1,62 @@
 import os
 import argparse
+import asyncio
 import time
 from datetime import datetime, timedelta
+from typing import Optional
 
 import xarray
 from trollimage.xrimage import XRImage
 
 from wwclouds.domains.satellite.satellite_enum import SatelliteEnum
 from wwclouds.domains.satellite.satellite_collection import SatelliteCollection
+from wwclouds.domains.satellite.satellite_mapping import SatelliteMapping
+from wwclouds.domains.satellite.downloader import DownloadEngine, FileReader
 from wwclouds.domains.processing.multiscene_ext import MultiSceneExt
 from wwclouds.domains.processing.scene_ext import SceneExt
+from wwclouds.domains.processing.eqc_blend import LongitudeSection, BlendEngine
+from wwclouds.domains.processing.blend_executor import BlendExecutor, BlendExecutorType
+from wwclouds.domains.processing.resample_executor import ResampleExecutor
+from wwclouds.domains.processing.mosaic_store import MosaicStore, StoredField, StoredMosaic
 from wwclouds.domains.product.product_enum import ProductEnum
-from wwclouds.config import DATA_PATH_PRODUCT
+from wwclouds.data_types.output_encoding import OutputEncoding
+from wwclouds.data_types.axis import Axis
+from wwclouds.data_types.bounding_box import BoundingBox
+from wwclouds.config import DATA_PATH_PRODUCT, DATA_PATH_MOSAIC_STORE, CPU_COUNT
 from wwclouds.domains.product.image_visual.image_visual import ImageVisual
 from wwclouds.domains.product.video_maker.video_maker import VideoMaker
 
 
 class ProductCreator:
     def __init__(self, product_enum: ProductEnum, utctime: datetime, resolution: int,
-                 hours: int = None, images_per_hour: int = None, fps: int = None, **kwargs):
+                 hours: int = None, images_per_hour: int = None, fps: int = None, lazy: bool = False,
+                 memmap: bool = False, dtype: Optional[str] = None, bbox: Optional[BoundingBox] = None,
+                 incremental: bool = False, engine: str = "eqc", resample_workers: Optional[int] = None,
+                 max_threads: int = CPU_COUNT, blend_executor: str = "thread", blend_workers: int = CPU_COUNT,
+                 satellite_collection: Optional[SatelliteCollection] = None, **kwargs):
         self.product_enum = product_enum
         self.utctime = utctime
         self.resolution = resolution
         self.hours = hours
         self.images_per_hour = images_per_hour
         self.fps = fps
+        self.lazy = lazy
+        self.memmap = memmap
+        self.dtype = dtype
+        self.bbox = bbox
+        self.incremental = incremental
+        self.engine = engine
+        self.resample_workers = resample_workers
+        self.max_threads = max_threads
+        self.blend_executor = blend_executor
+        self.blend_workers = blend_workers
 
         self._frequencies = [10.6]
         self._legal_resolutions = [500, 1000, 2000, 3000.403165817]
         self._max_latitude = 70
-        self._satellite_collection = SatelliteCollection(SatelliteEnum.all())
+        # A collection may be shared by products of other times, such as the frames of a video, to share lookups
+        self._satellite_collection = satellite_collection if satellite_collection is not None \
+            else SatelliteCollection(self.__get_satellite_enums())
 
     @staticmethod
     def from_args(**override_kwargs) -> "ProductCreator":
@@ -66,6 +93,63 @@ class ProductCreator:
             help="frames per second (only applicable to video output)",
             type=int
         )
+        parser.add_argument(
+            "--lazy",
+            help="blend the scenes lazily in chunks, to reduce peak memory",
+            action="store_true"
+        )
+        parser.add_argument(
+            "--memmap",
+            help="back the blended earth array with a file in the scratch directory, instead of memory",
+            action="store_true"
+        )
+        parser.add_argument(
+            "--dtype",
+            help="data type of the blended data (defaults to the data type of the satellite data)",
+            choices=["float64", "float32", "uint16"]
+        )
+        parser.add_argument(
+            "--bbox",
+            help="only create the product within the given region, which may cross the antimeridian",
+            nargs=4,
+            type=float,
+            metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT")
+        )
+        parser.add_argument(
+            "--engine",
+            help="resample each satellite to its own EQC area before blending (eqc), "
+                 "or blend the native satellite data directly into the global area (direct)",
+            choices=[blend_engine.name.lower() for blend_engine in BlendEngine],
+            default=BlendEngine.EQC.name.lower()
+        )
+        parser.add_argument(
+            "--incremental",
+            help="only resample and blend again the satellites with new scans since the previously stored mosaic",
+            action="store_true"
+        )
+        parser.add_argument(
+            "--resample-workers",
+            help="resample this many satellite scenes concurrently (defaults to one per satellite)",
+            type=int
+        )
+        parser.add_argument(
+            "--max-threads",
+            help="maximum number of threads shared by all concurrently resampled scenes (defaults to cpu count)",
+            default=CPU_COUNT,
+            type=int
+        )
+        parser.add_argument(
+            "--blend-executor",
+            help="blend the remapped sections serially, with threads or with processes (defaults to threads)",
+            choices=[executor_type.name.lower() for executor_type in BlendExecutorType],
+            default=BlendExecutorType.THREAD.name.lower()
+        )
+        parser.add_argument(
+            "--blend-workers",
+            help="number of threads or processes which blend the remapped sections (defaults to cpu count)",
+            default=CPU_COUNT,
+            type=int
+        )
         args = parser.parse_args()
         args_dict = {**vars(args), **override_kwargs}
 
@@ -82,7 +166,98 @@ class ProductCreator:
                 parser.error(f"video output cannot be created without the following arguments, "
                              f"where integers must be larger than 0: {illegal_args}")
 
-        return ProductCreator(product_enum, utctime, resolution, hours, images_per_hour, fps)
+        if args_dict["incremental"] and args_dict["lazy"]:
+            parser.error("incremental output cannot be combined lazily")
+        if args_dict["engine"] == BlendEngine.DIRECT.name.lower() and args_dict["lazy"]:
+            parser.error("the direct engine cannot combine lazily")
+        if args_dict["resample_workers"] is not None and args_dict["lazy"]:
+            parser.error("scenes resampled concurrently cannot be combined lazily")
+        if args_dict["resample_workers"] is not None and args_dict["resample_workers"] <= 0 \
+                or args_dict["max_threads"] <= 0:
+            parser.error("resample-workers and max-threads must be larger than 0")
+        if args_dict["blend_workers"] <= 0:
+            parser.error("blend-workers must be larger than 0")
+
+        bbox = None
+        if args_dict["bbox"] is not None:
+            try:
+                bbox = BoundingBox.from_list(args_dict["bbox"])
+            except ValueError as error:
+                parser.error(f"bbox is invalid: {error}")
+
+        return ProductCreator(product_enum, utctime, resolution, hours, images_per_hour, fps,
+                              lazy=args_dict["lazy"], memmap=args_dict["memmap"], dtype=args_dict["dtype"], bbox=bbox,
+                              incremental=args_dict["incremental"], engine=args_dict["engine"],
+                              resample_workers=args_dict["resample_workers"], max_threads=args_dict["max_threads"],
+                              blend_executor=args_dict["blend_executor"], blend_workers=args_dict["blend_workers"])
+
+    @staticmethod
+    def prewarm_from_args(args: Optional[list[str]] = None) -> "ProductCreator":
+        parser = argparse.ArgumentParser(
+            prog="wwclouds prewarm",
+            description="precompute the resample lookup tables of every satellite at every legal resolution"
+        )
+        parser.add_argument(
+            "--utctime",
+            help="timestamp of the scans to prewarm from (defaults to current time)",
+            default=datetime.utcnow().timestamp(),
+            type=int
+        )
+        args = parser.parse_args(args)
+        return ProductCreator(ProductEnum.IMAGEDATA, datetime.fromtimestamp(args.utctime), resolution=None)
+
+    def prewarm_resample_cache(self) -> None:
+        start_time = time.time()
+        for satellite_enum in self._satellite_collection.satellite_enums:
+            file_readers = SatelliteCollection([satellite_enum]).download_all(
+                frequencies=self._frequencies, utctime=self.utctime
+            )
+            for resolution in self._legal_resolutions:  # The source areas depend on how much the data is decimated
+                multi_scn_ext = MultiSceneExt([reader.read_to_scene() for reader in file_readers])
+                multi_scn_ext = multi_scn_ext.load_for_resolution(self._frequencies, resolution,
+                                                                  self._legal_resolutions)
+                windows = multi_scn_ext.get_eqc_windows(self.__blended_latitude_range, self.__section_longitudes)
+                for scn, window in zip(multi_scn_ext.scenes, windows):
+                    scn.prewarm_eqc_resampler(resolution, window)
+            print(f"Prewarmed {satellite_enum.name}: {round(time.time() - start_time, 4)} sec")
+        print(f"Resample cache: {SceneExt.resample_cache.stats}")
+
+    @property
+    def __section_longitudes(self) -> list[float]:
+        return list(map(SatelliteMapping.get_sub_longitude, SatelliteEnum.all()))
+
+    @property
+    def __blended_bbox(self) -> Optional[BoundingBox]:
+        if self.bbox is None:
+            return None
+        return self.bbox.clip_latitudes((-self._max_latitude, self._max_latitude))
+
+    @property
+    def __blended_latitude_range(self) -> tuple[float, float]:
+        blended_bbox = self.__blended_bbox
+        return blended_bbox.latitude_range if blended_bbox is not None else (-self._max_latitude, self._max_latitude)
+
+    @property
+    def __download_bbox(self) -> BoundingBox:
+        # Only data within the blended region is downloaded, for the satellites which are split into segments
+        blended_bbox = self.__blended_bbox
+        if blended_bbox is not None:
+            return blended_bbox
+        min_lat, max_lat = self.__blended_latitude_range
+        return BoundingBox(-Axis.LON.degree_count / 2, min_lat, Axis.LON.degree_count / 2, max_lat)
+
+    def __get_satellite_enums(self) -> list[SatelliteEnum]:
+        satellite_enums = SatelliteEnum.all()
+        if self.bbox is None:
+            return satellite_enums
+        lon_sections = LongitudeSection.from_center_longitudes(satellite_enums, self.__section_longitudes)
+        intersecting_satellite_enums = set(
+            satellite_enum
+            for lon_section in lon_sections
+            if self.bbox.intersects_longitudes(lon_section.from_longitude, lon_section.to_longitude)
+            for satellite_enum in lon_section.data_arrays if satellite_enum is not None
+        )
+        return [satellite_enum for satellite_enum in satellite_enums if satellite_enum in intersecting_satellite_enums]
 
     @property
     def __time_subfolder(self) -> str:
@@ -90,7 +265,10 @@ class ProductCreator:
 
     @property
     def __product_directory_path(self) -> str:
-        return f"{DATA_PATH_PRODUCT}/{self.__time_subfolder}/{self.resolution}"
+        directory_path = f"{DATA_PATH_PRODUCT}/{self.__time_subfolder}/{self.resolution}"
+        if self.__blend_engine != BlendEngine.EQC:
+            directory_path = f"{directory_path}/{self.engine}"
+        return directory_path if self.bbox is None else f"{directory_path}/bbox_{self.bbox}"
 
     @property
     def imagevisual_path(self) -> str:
@@ -107,17 +285,128 @@ class ProductCreator:
     def __get_imagedata_path_for_format(self, file_ending: str) -> str:
         return f"{self.__product_directory_path}/imagedata.{file_ending}"
 
-    def __create_combined_scene(self) -> SceneExt:
-        file_readers = self._satellite_collection.download_all(frequencies=self._frequencies, utctime=self.utctime)
+    @property
+    def __mosaic_store_directory(self) -> str:
+        region = f"bbox_{self.bbox}" if self.bbox is not None else "global"
+        frequencies = "_".join(map(str, self._frequencies))
+        dtype = self.dtype or "native"
+        return f"{DATA_PATH_MOSAIC_STORE}/{self.resolution}/{self.engine}/{region}/{dtype}/{frequencies}"
+
+    @property
+    def __blend_engine(self) -> BlendEngine:
+        return BlendEngine.from_str(self.engine)
+
+    @property
+    def __combine_kwargs(self) -> dict:
+        return {
+            "executor": BlendExecutor(BlendExecutorType.from_str(self.blend_executor), self.blend_workers),
+            "use_memmap": self.memmap,
+            "output_encoding": OutputEncoding.from_str(self.dtype) if self.dtype is not None else None,
+            "bbox": self.bbox,
+            "section_longitudes": self.__section_longitudes if self.bbox is not None else None,
+            "engine": self.__blend_engine,
+            "resolution": self.resolution
+        }
+
+    def __get_resampled_multi_scene(self, satellite_collection: SatelliteCollection) -> MultiSceneExt:
+        if self.lazy:  # Lazy scenes are not resampled until they are blended, so there is nothing to overlap
+            return self.__get_phased_resampled_multi_scene(satellite_collection)
+        return self.__get_streamed_resampled_multi_scene(satellite_collection)
+
+    def __get_phased_resampled_multi_scene(self, satellite_collection: SatelliteCollection) -> MultiSceneExt:
+        file_readers = satellite_collection.download_all(frequencies=self._frequencies, utctime=self.utctime,
+                                                         bbox=self.__download_bbox)
         scenes = [reader.read_to_scene() for reader in file_readers]
+        multi_scn_ext = MultiSceneExt(scenes).load_for_resolution(self._frequencies, self.resolution,
+                                                                  self._legal_resolutions)
+        if self.__blend_engine == BlendEngine.DIRECT:
+            return multi_scn_ext.resample_loaded_to_native()
+        return multi_scn_ext.resample_loaded_to_eqc(self.resolution, latitude_range=self.__blended_latitude_range,
+                                                    section_longitudes=self.__section_longitudes)
+
+    def __resample_file_reader(self, file_reader: FileReader) -> SceneExt:
+        multi_scn_ext = MultiSceneExt([file_reader.read_to_scene()]).load_for_resolution(
+            self._frequencies, self.resolution, self._legal_resolutions
+        )
+        if self.__blend_engine == BlendEngine.DIRECT:
+            return multi_scn_ext.resample_all_to_native().scenes[0]
+        # The windows only depend on the section longitudes, so they are the same without the other scenes
+        windows = multi_scn_ext.get_eqc_windows(self.__blended_latitude_range, self.__section_longitudes)
+        return multi_scn_ext.resample_all_to_eqc(self.resolution, windows=windows).scenes[0]
+
+    def __get_streamed_resampled_multi_scene(self, satellite_collection: SatelliteCollection) -> MultiSceneExt:
+        start_time = time.time()
+        worker_count = self.resample_workers or len(satellite_collection.satellites)
+        with ResampleExecutor(worker_count, self.max_threads) as resample_executor:
+            async def resample_when_downloaded(file_reader: FileReader) -> SceneExt:
+                return await asyncio.wrap_future(resample_executor.submit(self.__resample_file_reader, file_reader))
+
+            scenes = DownloadEngine.run(lambda engine: satellite_collection.async_download_all(
+                engine, self._frequencies, self.utctime, on_download=resample_when_downloaded, bbox=self.__download_bbox
+            ))
+        # Groups are shared by all scenes, so the scenes are grouped when every one of them is resampled
         multi_scn_ext = MultiSceneExt(scenes)
-        multi_scn_ext.load(self._frequencies, resolution=self._legal_resolutions)
-        multi_scn_ext_eqc = multi_scn_ext.resample_loaded_to_eqc(self.resolution)
-        comb_scene = multi_scn_ext_eqc.combine(self._max_latitude)
+        multi_scn_ext.loaded.extend(self._frequencies)
+        multi_scn_ext.shared_dataset_ids = multi_scn_ext.group_loaded()
+        print(f"Downloaded and resampled scenes: {round(time.time() - start_time, 4)} sec")
+        print(f"Resample cache: {SceneExt.resample_cache.stats}")
+        return multi_scn_ext
+
+    def __create_combined_scene(self) -> SceneExt:
+        multi_scn_ext_eqc = self.__get_resampled_multi_scene(self._satellite_collection)
+        comb_scene = multi_scn_ext_eqc.combine(self._max_latitude, lazy=self.lazy, **self.__combine_kwargs)
+        return comb_scene
+
+    def __create_combined_scene_incremental(self) -> SceneExt:
+        start_time = time.time()
+        mosaic_store = MosaicStore(self.__mosaic_store_directory)
+        satellite_enums = self._satellite_collection.satellite_enums
+        scan_start_times = self._satellite_collection.get_scan_start_times(self._frequencies, self.utctime)
+        previous_mosaic = mosaic_store.get_mosaic()
+        previous_scan_start_times = previous_mosaic.scan_start_times if previous_mosaic is not None else dict()
+
+        stored_fields = [
+            mosaic_store.get_field(satellite_enum)
+            if previous_scan_start_times.get(satellite_enum.name) == scan_start_time else None
+            for satellite_enum, scan_start_time in zip(satellite_enums, scan_start_times)
+        ]
+        changed_indexes = [
+            index for index, (stored_field, scan_start_time) in enumerate(zip(stored_fields, scan_start_times))
+            if stored_field is None or stored_field.scan_start_time != scan_start_time
+        ]
+        if len(changed_indexes) == 0:
+            dataset_ids, comb_data_array = previous_mosaic.dataset_ids, previous_mosaic.data_array
+        else:
+            changed_collection = SatelliteCollection([satellite_enums[index] for index in changed_indexes])
+            dataset_ids, changed_data_arrays = self.__get_resampled_multi_scene(changed_collection).stack_shared()
+            data_arrays = [stored_field.data_array if stored_field is not None else None
+                           for stored_field in stored_fields]
+            for index, data_array in zip(changed_indexes, changed_data_arrays):
+                mosaic_store.set_field(satellite_enums[index], StoredField(scan_start_times[index], data_array))
+                data_arrays[index] = data_array
+
+            is_updatable = previous_mosaic is not None and len(changed_indexes) < len(satellite_enums) \
+                and set(previous_scan_start_times) == set(satellite_enum.name for satellite_enum in satellite_enums)
+            comb_data_array = MultiSceneExt.combine_stacked(
+                data_arrays, self._max_latitude,
+                previous_data_array=previous_mosaic.data_array if is_updatable else None,
+                changed_indexes=changed_indexes,
+                **self.__combine_kwargs
+            )
+            scan_start_times_by_name = dict(
+                (satellite_enum.name, scan_start_time)
+                for satellite_enum, scan_start_time in zip(satellite_enums, scan_start_times)
+            )
+            mosaic_store.set_mosaic(StoredMosaic(scan_start_times_by_name, dataset_ids, comb_data_array))
+
+        comb_scene = MultiSceneExt.unstack(dataset_ids, comb_data_array)
+        comb_scene.load(self._frequencies)
+        print(f"Updated mosaic with {len(changed_indexes)} of {len(satellite_enums)} satellites: "
+              f"{round(time.time() - start_time, 4)} sec")
         return comb_scene
 
     def __create_cloud_image(self) -> XRImage:
-        comb_scene = self.__create_combined_scene()
+        comb_scene = self.__create_combined_scene_incremental() if self.incremental else self.__create_combined_scene()
         return comb_scene.create_cloud_image(self._frequencies)
 
     def __get_existing_cloud_image(self) -> XRImage:
@@ -151,20 +440,23 @@ class ProductCreator:
     def __create_imagevisual(self) -> str:
         if not os.path.exists(self.imagevisual_path):
             image_path = self.__get_imagedata_path_for_format("png")
-            world_map, image = ImageVisual.from_image_path(image_path, load=True)
+            world_map, image = ImageVisual.from_image_path(image_path, load=True, bbox=self.__blended_bbox)
             world_map.add_4dim_image(image)
             world_map.save_as_png(self.imagevisual_path)
         return self.imagevisual_path
 
     def __create_imagevisuals_for_video(self, hours: int, frames_per_hour: int) -> list[str]:
+        time_stamps = [
+            self.utctime - timedelta(hours=hour, minutes=int((60 / frames_per_hour) * hour_frame))
+            for hour in range(hours) for hour_frame in range(frames_per_hour)
+        ]
+        self._satellite_collection.prefetch_listings(self._frequencies, time_stamps)
         image_paths = []
-        for hour in range(hours):
-            for hour_frame in range(frames_per_hour):
-                minute = int((60 / frames_per_hour) * hour_frame)
-                time_stamp = self.utctime - timedelta(hours=hour, minutes=minute)
-                product_creator = self.__copy(product_enum=ProductEnum.IMAGEVISUAL, utctime=time_stamp)
-                product_creator.create_products()
-                image_paths.append(product_creator.imagevisual_path)
+        for time_stamp in time_stamps:
+            product_creator = self.__copy(product_enum=ProductEnum.IMAGEVISUAL, utctime=time_stamp,
+                                          satellite_collection=self._satellite_collection)
+            product_creator.__create_products()
+            image_paths.append(product_creator.imagevisual_path)
         image_paths.reverse()
         return image_paths
 
@@ -172,7 +464,7 @@ class ProductCreator:
         image_paths = self.__create_imagevisuals_for_video(self.hours, self.images_per_hour)
         VideoMaker(self.__video_path, image_paths, self.fps).create()
 
-    def create_products(self) -> None:
+    def __create_products(self) -> None:
         start_time = time.time()
         print("Creating imagedata")
         self.__create_imagedata_for_products()
@@ -183,3 +475,9 @@ class ProductCreator:
             print("Creating video")
             self.__create_video()
         print(f"Finished in {round(time.time() - start_time, 4)} seconds", end=2*"\n")
+
+    def create_products(self) -> None:
+        try:
+            self.__create_products()
+        finally:
+            BlendExecutor.shutdown_all()  # The pools are shared by every frame, so they are shut down when the run ends
@@ -1,4 +1,5 @@
 from .downloader import Downloader
+from .download_engine import DownloadEngine
 from .file_reader import FileReader
 from .himawari import Himawari
 from .meteosat import Meteosat
@@ -1,19 +1,21 @@
-import boto3
-import boto3.s3.transfer as s3transfer
-from botocore import UNSIGNED
-from botocore.config import Config
 from datetime import datetime, timedelta
-from typing import Iterator
+from typing import Optional
 import abc
-import functools
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
-from wwclouds.domains.satellite.downloader.downloader import Downloader
 from wwclouds.config import CPU_COUNT
+from wwclouds.data_types.bounding_box import BoundingBox
+from wwclouds.domains.satellite.downloader.downloader import Downloader
+from wwclouds.domains.satellite.downloader.download_engine import DownloadEngine
+from wwclouds.domains.satellite.downloader.s3_listing_index import S3Directory, S3ListingIndex
+from wwclouds.domains.satellite.downloader.s3_transfer_service import S3TransferService
 
 
 class Aws(Downloader, metaclass=abc.ABCMeta):
-    s3_client = boto3.client("s3", config=Config(signature_version=UNSIGNED, max_pool_connections=CPU_COUNT))
-    transfer_config = s3transfer.TransferConfig(max_concurrency=CPU_COUNT, use_threads=True)
+    transfer_service = S3TransferService()
+    posthandler_pool = ThreadPoolExecutor(max_workers=CPU_COUNT)
+    listing_index = S3ListingIndex()
 
     def __init__(self, bucket: str, product: str, reader: str, update_frequency: timedelta):
         super().__init__(
@@ -25,69 +27,92 @@ class Aws(Downloader, metaclass=abc.ABCMeta):
         self.product = product
 
     @abc.abstractmethod
-    def _get_aws_prefix_for_band(self, band: str, time: datetime) -> str:
+    def _get_aws_directory(self, time: datetime) -> S3Directory:
         pass
 
     @abc.abstractmethod
-    def _get_scan_start_time_from_object_key(self, object_key: str) -> datetime:
+    def _get_aws_day_directory(self, time: datetime) -> S3Directory:
         pass
 
-    def _iter_aws_by_prefix(self, prefix) -> Iterator[dict[str, any]]:
-        kwargs = {"Bucket": self.bucket, "Prefix": prefix}
-        while True:
-            response = self.s3_client.list_objects_v2(**kwargs)
-            if "Contents" not in response:
-                response["Contents"] = []
-            for obj in response["Contents"]:
-                key = obj["Key"]
-                if not key.startswith(prefix):
-                    continue
-                yield obj
-            try:
-                kwargs["ContinuationToken"] = response["NextContinuationToken"]
-            except KeyError:
-                break
+    @abc.abstractmethod
+    def _get_band_from_object_key(self, object_key: str) -> Optional[str]:
+        pass
+
+    @abc.abstractmethod
+    def _get_scan_start_time_from_object_key(self, object_key: str) -> datetime:
+        pass
 
     def _file_posthandler(self, filepath: str) -> str:
         return filepath
 
-    def _get_all_object_keys_for_band_in_aws_directory(self, band: str, time: datetime) -> str:
-        prefix = self._get_aws_prefix_for_band(band, time)
-        for obj in self._iter_aws_by_prefix(prefix):
-            yield obj["Key"]
-
-    @functools.lru_cache(32)
-    def _get_previous_object_keys_for_band(self, band: str, time: datetime, retries: int = 3) -> list[str]:
-        if retries < 0:
-            return []
-        object_keys = list(self._get_all_object_keys_for_band_in_aws_directory(band, time))
-        best_object_start_time = None
+    def _select_object_keys_for_bbox(self, object_keys: list[str], bbox: Optional[BoundingBox]) -> list[str]:
+        return object_keys
+
+    def __get_directories_for_lookup(self, time: datetime, retries: int) -> list[S3Directory]:
+        directories = []
+        for retry in range(retries + 1):
+            directory = self._get_aws_directory(time - self.update_frequency * retry)
+            if all(directory.prefix != other.prefix for other in directories):
+                directories.append(directory)
+        return directories
+
+    def __index_listing(self, directory: S3Directory, object_keys: list[str]) -> None:
+        objects = []
         for object_key in object_keys:
-            object_start_time = self._get_scan_start_time_from_object_key(object_key)
-            if object_start_time > time:
-                continue
-            elif best_object_start_time is None or object_start_time > best_object_start_time:
-                best_object_start_time = object_start_time
-        if best_object_start_time is None or best_object_start_time > time:
-            return self._get_previous_object_keys_for_band(band, time - self.update_frequency, retries - 1)
-        return list(filter(lambda key: self._get_scan_start_time_from_object_key(key) == best_object_start_time, object_keys))
-
-    def _get_previous_scan_start_time_for_band(self, band: str, time: datetime) -> datetime:
-        object_key = self._get_previous_object_keys_for_band(band, time)[0]
+            band = self._get_band_from_object_key(object_key)
+            if band is not None:
+                objects.append((object_key, band, self._get_scan_start_time_from_object_key(object_key)))
+        self.listing_index.add_listing(self.bucket, self.product, directory, objects)
+
+    async def __async_list_directory(self, engine: DownloadEngine, directory: S3Directory) -> None:
+        if not self.listing_index.is_listed(self.bucket, directory):
+            objects = await engine.list_s3_objects(self.bucket, directory.prefix)
+            self.__index_listing(directory, [obj["Key"] for obj in objects])
+
+    def __get_latest_object_keys(self, band: str, directory: S3Directory, time: datetime) -> list[str]:
+        return self.listing_index.get_latest_object_keys(self.bucket, self.product, band, directory.start_time, time)
+
+    async def _async_get_previous_object_keys_for_band(self, engine: DownloadEngine, band: str, time: datetime,
+                                                       retries: int = 3) -> list[str]:
+        for directory in self.__get_directories_for_lookup(time, retries):
+            await self.__async_list_directory(engine, directory)
+            object_keys = self.__get_latest_object_keys(band, directory, time)
+            if object_keys:
+                return object_keys
+        return []
+
+    async def async_prefetch_listings(self, engine: DownloadEngine, times: list[datetime]) -> None:
+        # Days which span several directories are listed at once, which answers every later lookup within them
+        directory_prefixes_by_day: dict[str, set[str]] = dict()
+        day_directories: dict[str, S3Directory] = dict()
+        for time in times:
+            day_directory = self._get_aws_day_directory(time)
+            day_directories[day_directory.prefix] = day_directory
+            directory_prefixes_by_day.setdefault(day_directory.prefix, set()).add(self._get_aws_directory(time).prefix)
+        await asyncio.gather(*(
+            self.__async_list_directory(engine, day_directories[day_prefix])
+            for day_prefix, directory_prefixes in directory_prefixes_by_day.items() if len(directory_prefixes) > 1
+        ))
+
+    async def _async_get_previous_scan_start_time_for_band(self, engine: DownloadEngine, band: str,
+                                                           time: datetime) -> datetime:
+        object_key = (await self._async_get_previous_object_keys_for_band(engine, band, time))[0]
         return self._get_scan_start_time_from_object_key(object_key)
 
-    def _get_previous_keys_for_bands(self, bands: [str], time: datetime) -> [[str]]:
-        return [self._get_previous_object_keys_for_band(band, time) for band in bands]
-
-    def _download(self, bands: [str], time: datetime) -> [str]:
-        keys_list = self._get_previous_keys_for_bands(bands, time)
-        file_paths = []
-        s3t = s3transfer.create_transfer_manager(self.s3_client, self.transfer_config)
-        for keys in keys_list:
-            for key in keys:
-                file_path = self._get_local_file_path(key)
-                if not self._file_is_downloaded(key):
-                    s3t.download(self.bucket, key, file_path)
-                file_paths.append(file_path)
-        s3t.shutdown()
-        return list(map(self._file_posthandler, file_paths))
+    async def __async_download_key(self, engine: DownloadEngine, key: str) -> str:
+        # Each file is post handled as soon as its own download has finished
+        filepath = self._get_local_file_path(key)
+        if not self._file_is_downloaded(key):
+            await engine.await_threaded_transfer(
+                lambda consume: self.transfer_service.submit(self.bucket, key, filepath, on_progress=consume),
+                lambda: self.transfer_service.cancel(self.bucket, key)
+            )
+        return await asyncio.wrap_future(self.posthandler_pool.submit(self._file_posthandler, filepath))
+
+    async def _async_download(self, engine: DownloadEngine, bands: [str], time: datetime,
+                              bbox: Optional[BoundingBox]) -> [str]:
+        keys_list = await asyncio.gather(*(
+            self._async_get_previous_object_keys_for_band(engine, band, time) for band in bands
+        ))
+        keys = [key for keys in keys_list for key in self._select_object_keys_for_bbox(keys, bbox)]
+        return list(await asyncio.gather(*(self.__async_download_key(engine, key) for key in keys)))
@@ -0,0 +1,73 @@
+import re
+from typing import Iterator, Mapping, Optional
+
+
+class ByteRanges:
+    @staticmethod
+    def coalesce(byte_ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        coalesced_ranges = []
+        for start, stop in sorted(byte_ranges):
+            if coalesced_ranges and start <= coalesced_ranges[-1][1]:
+                coalesced_ranges[-1] = (coalesced_ranges[-1][0], max(stop, coalesced_ranges[-1][1]))
+            else:
+                coalesced_ranges.append((start, stop))
+        return coalesced_ranges
+
+    @staticmethod
+    def get_headers(byte_ranges: list[tuple[int, int]]) -> dict[str, str]:
+        # Ranges are given with exclusive stops, while http ranges are inclusive
+        return {"Range": "bytes=" + ",".join(f"{start}-{stop - 1}" for start, stop in byte_ranges)}
+
+    @staticmethod
+    def __parse_content_range(content_range: str) -> tuple[int, int, Optional[int]]:
+        match = re.match(r"^bytes (\d+)-(\d+)/(\d+|\*)$", content_range.strip())
+        if match is None:
+            raise ValueError(f"invalid content range: {content_range}")
+        start, stop, total_size = match.groups()
+        return int(start), int(stop) + 1, int(total_size) if total_size != "*" else None
+
+    @staticmethod
+    def __iter_multipart(body: bytes, boundary: bytes) -> Iterator[tuple[str, bytes]]:
+        # Parts are read by the length of their content range, so the boundary may also occur within the data
+        delimiter = b"--" + boundary
+        position = 0
+        while True:
+            position = body.index(delimiter, position) + len(delimiter)
+            if body.startswith(b"--", position):
+                return
+            headers_end = body.index(b"\r\n\r\n", position)
+            headers = body[position:headers_end].decode("latin-1")
+            content_range_match = re.search(r"content-range:\s*([^\r\n]+)", headers, re.IGNORECASE)
+            if content_range_match is None:
+                raise ValueError("multipart byte range without content range")
+            content_range = content_range_match.groups()[0]
+            start, stop, _ = ByteRanges.__parse_content_range(content_range)
+            data_start = headers_end + 4
+            yield content_range, body[data_start:data_start + stop - start]
+            position = data_start + stop - start
+
+    @staticmethod
+    def extract(status: int, headers: Mapping[str, str], body: bytes,
+                byte_ranges: list[tuple[int, int]]) -> tuple[list[bytes], Optional[int]]:
+        if status != 206:
+            raise ValueError(f"byte ranges were not served, got status {status}")
+        content_type = headers.get("Content-Type", "")
+        boundary_match = re.search(r'boundary="?([^";]+)"?', content_type)
+        if content_type.startswith("multipart/byteranges") and boundary_match is not None:
+            parts = list(ByteRanges.__iter_multipart(body, boundary_match.groups()[0].encode("latin-1")))
+        else:  # Servers may merge the ranges into a single one
+            parts = [(headers["Content-Range"], body)]
+        total_size = None
+        part_starts = []
+        for content_range, data in parts:
+            start, _, total_size = ByteRanges.__parse_content_range(content_range)
+            part_starts.append((start, data))
+        range_datas = []
+        for start, stop in byte_ranges:
+            for part_start, data in part_starts:
+                if part_start <= start and stop <= part_start + len(data):
+                    range_datas.append(data[start - part_start:stop - part_start])
+                    break
+            else:
+                raise ValueError(f"byte range {start}-{stop - 1} was not served")
+        return range_datas, total_size
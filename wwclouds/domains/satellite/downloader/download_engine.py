@@ -0,0 +1,185 @@
+import asyncio
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+import aiohttp
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+from botocore import UNSIGNED
+
+from wwclouds.config import DOWNLOAD_MAX_CONCURRENCY, DOWNLOAD_CONNECTIONS_PER_HOST, DOWNLOAD_MAX_BYTES_PER_SECOND, \
+    DOWNLOAD_TIMEOUT_SECONDS, DOWNLOAD_RETRIES
+from wwclouds.domains.satellite.downloader.byte_ranges import ByteRanges
+from wwclouds.domains.satellite.downloader.part_file import PartFile
+
+T = TypeVar("T")
+
+
+class BandwidthLimiter:
+    def __init__(self, bytes_per_second: Optional[float], burst_seconds: float = 1.0):
+        self.bytes_per_second = bytes_per_second
+        self.capacity = bytes_per_second * burst_seconds if bytes_per_second is not None else None
+        self.__tokens = self.capacity
+        self.__updated_at = time.monotonic()
+        self.__lock = asyncio.Lock()
+
+    async def consume(self, byte_count: int) -> None:
+        if self.bytes_per_second is None:
+            return
+        async with self.__lock:
+            while True:
+                now = time.monotonic()
+                self.__tokens = min(self.capacity, self.__tokens + (now - self.__updated_at) * self.bytes_per_second)
+                self.__updated_at = now
+                required_tokens = min(byte_count, self.capacity)  # Larger chunks may take the bucket below zero
+                if self.__tokens >= required_tokens:
+                    self.__tokens -= byte_count
+                    return
+                await asyncio.sleep((required_tokens - self.__tokens) / self.bytes_per_second)
+
+
+class DownloadEngine:
+    chunk_size = 1024 * 1024
+
+    def __init__(self, max_concurrency: int = DOWNLOAD_MAX_CONCURRENCY,
+                 connections_per_host: int = DOWNLOAD_CONNECTIONS_PER_HOST,
+                 max_bytes_per_second: Optional[float] = DOWNLOAD_MAX_BYTES_PER_SECOND,
+                 timeout: float = DOWNLOAD_TIMEOUT_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.connections_per_host = connections_per_host
+        self.max_bytes_per_second = max_bytes_per_second
+        self.timeout = timeout
+
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+        self.__semaphore: Optional[asyncio.Semaphore] = None
+        self.__bandwidth_limiter: Optional[BandwidthLimiter] = None
+        self.__session: Optional[aiohttp.ClientSession] = None
+        self.__s3_client_context = None
+        self.__s3_client = None
+        self.__s3_listings: dict[tuple[str, str], asyncio.Future] = dict()
+
+    async def __aenter__(self) -> "DownloadEngine":
+        # Everything bound to the event loop is created here, as the engine is constructed outside of it
+        self.__loop = asyncio.get_running_loop()
+        self.__semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.__bandwidth_limiter = BandwidthLimiter(self.max_bytes_per_second)
+        self.__session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.connections_per_host)
+        )
+        self.__s3_client_context = get_session().create_client(
+            "s3", config=AioConfig(signature_version=UNSIGNED, max_pool_connections=self.connections_per_host)
+        )
+        self.__s3_client = await self.__s3_client_context.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        try:
+            await self.__s3_client_context.__aexit__(exc_type, exc_val, exc_tb)
+        finally:
+            await self.__session.close()
+            self.__s3_listings.clear()
+
+    @staticmethod
+    def run(coroutine_func: Callable[["DownloadEngine"], Awaitable[T]], **engine_kwargs) -> T:
+        async def run_with_engine() -> T:
+            async with DownloadEngine(**engine_kwargs) as engine:
+                return await coroutine_func(engine)
+
+        return asyncio.run(run_with_engine())
+
+    async def with_timeout(self, awaitable: Awaitable[T], name: str) -> T:
+        try:
+            return await asyncio.wait_for(awaitable, self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{name} did not finish within {self.timeout} sec")
+
+    def __consume_from_thread(self, byte_count: int) -> None:
+        # Blocks the calling thread until the bandwidth of the engine allows the bytes. Transfers report negative
+        # progress when they rewind to retry, which does not give any bandwidth back.
+        if byte_count > 0:
+            consumed = asyncio.run_coroutine_threadsafe(self.__bandwidth_limiter.consume(byte_count), self.__loop)
+            consumed.result(self.timeout)  # Bounded, as the loop may stop before the bytes are allowed
+
+    async def await_threaded_transfer(self, start_transfer: Callable[[Optional[Callable[[int], None]]], Future],
+                                      cancel_transfer: Callable[[], None]) -> Any:
+        # Transfers which run on threads outside of the event loop still take a slot of the engine, and draw from its
+        # bandwidth through the callback they are started with, so that all downloads share a single budget
+        consume = self.__consume_from_thread if self.max_bytes_per_second is not None else None
+        async with self.__semaphore:
+            try:
+                return await asyncio.wrap_future(start_transfer(consume))
+            except asyncio.CancelledError:  # Timed out, so the transfer does not keep running after the engine
+                cancel_transfer()
+                raise
+
+    async def __list_s3_objects(self, bucket: str, prefix: str) -> list[dict[str, Any]]:
+        async with self.__semaphore:
+            paginator = self.__s3_client.get_paginator("list_objects_v2")
+            objects = []
+            async for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+                objects.extend(obj for obj in page.get("Contents", []) if obj["Key"].startswith(prefix))
+            return objects
+
+    async def list_s3_objects(self, bucket: str, prefix: str) -> list[dict[str, Any]]:
+        # Listings are shared by every satellite and request within the engine, as scan times and downloads use them
+        listing_key = (bucket, prefix)
+        if listing_key not in self.__s3_listings:
+            self.__s3_listings[listing_key] = asyncio.ensure_future(self.__list_s3_objects(bucket, prefix))
+        return await asyncio.shield(self.__s3_listings[listing_key])
+
+    async def get_json(self, url: str, **kwargs) -> Any:
+        async with self.__semaphore, self.__session.get(url, **kwargs) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def post_json(self, url: str, **kwargs) -> Any:
+        async with self.__semaphore, self.__session.post(url, **kwargs) as response:
+            return await response.json(content_type=None)
+
+    async def __get_byte_ranges(self, url: str, byte_ranges: list[tuple[int, int]], headers: dict[str, str],
+                                **kwargs) -> tuple[list[bytes], Optional[int]]:
+        async with self.__semaphore, self.__session.get(url, headers=headers, **kwargs) as response:
+            response.raise_for_status()
+            if response.status != 206:  # The body is the whole file, which is not read here but by the fallback
+                response.close()
+                raise ValueError(f"byte ranges were not served, got status {response.status}")
+            body = await response.read()
+            await self.__bandwidth_limiter.consume(len(body))
+            return ByteRanges.extract(response.status, response.headers, body, byte_ranges)
+
+    async def get_byte_ranges(self, url: str, byte_ranges: list[tuple[int, int]],
+                              headers: Optional[dict[str, str]] = None, retries: int = DOWNLOAD_RETRIES,
+                              **kwargs) -> tuple[list[bytes], Optional[int]]:
+        headers = {**(headers or dict()), **ByteRanges.get_headers(byte_ranges)}
+        for retry in range(retries + 1):
+            try:
+                return await self.__get_byte_ranges(url, byte_ranges, headers, **kwargs)
+            except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if retry == retries:
+                    raise
+
+    async def __download_url_to_part_file(self, url: str, part_file: PartFile, headers: dict[str, str],
+                                          **kwargs) -> None:
+        headers = {**headers, **part_file.range_headers}
+        async with self.__semaphore, self.__session.get(url, headers=headers, **kwargs) as response:
+            if part_file.is_complete(response.status, response.headers.get("Content-Range")):
+                return
+            response.raise_for_status()
+            with part_file.open(response.status) as file:
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    await self.__bandwidth_limiter.consume(len(chunk))
+                    file.write(chunk)
+
+    async def download_url(self, url: str, filepath: str, headers: Optional[dict[str, str]] = None,
+                           retries: int = DOWNLOAD_RETRIES, **kwargs) -> str:
+        # Interrupted transfers are resumed from their part file, both within this call and in later runs
+        part_file = PartFile(filepath)
+        for retry in range(retries + 1):
+            try:
+                await self.__download_url_to_part_file(url, part_file, headers or dict(), **kwargs)
+                break
+            except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if retry == retries:
+                    raise
+        return part_file.commit()
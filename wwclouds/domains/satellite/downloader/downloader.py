@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+import asyncio
 import os
 import abc
 from typing import List, Optional
@@ -6,6 +7,8 @@ import time as t
 from glob import glob
 
 import wwclouds.config as config
+from wwclouds.data_types.bounding_box import BoundingBox
+from .download_engine import DownloadEngine
 from .file_reader import FileReader
 
 
@@ -19,11 +22,16 @@ class Downloader(metaclass=abc.ABCMeta):
         self.update_frequency = update_frequency
 
     @abc.abstractmethod
-    def _download(self, bands: Optional[List[str]], time: datetime) -> [str]:
+    async def _async_download(self, engine: DownloadEngine, bands: Optional[List[str]], time: datetime,
+                              bbox: Optional[BoundingBox]) -> [str]:
         pass
 
     @abc.abstractmethod
-    def _get_previous_scan_start_time_for_band(self, band: str, time: datetime) -> datetime:
+    async def _async_get_previous_scan_start_time_for_band(self, engine: DownloadEngine, band: str,
+                                                           time: datetime) -> datetime:
+        pass
+
+    async def async_prefetch_listings(self, engine: DownloadEngine, times: list[datetime]) -> None:
         pass
 
     @property
@@ -53,15 +61,27 @@ class Downloader(metaclass=abc.ABCMeta):
         return datetime(time.year, time.month, time.day, time.hour, last_update_minute)
 
     def get_first_scan_start_time_for_bands(self, bands: list[str], time: datetime) -> datetime:
-        scan_start_times = [self._get_previous_scan_start_time_for_band(band, time) for band in bands]
+        return DownloadEngine.run(lambda engine: self.async_get_first_scan_start_time_for_bands(engine, bands, time))
+
+    async def async_get_first_scan_start_time_for_bands(self, engine: DownloadEngine, bands: list[str],
+                                                        time: datetime) -> datetime:
+        scan_start_times = await asyncio.gather(*(
+            self._async_get_previous_scan_start_time_for_band(engine, band, time) for band in bands
+        ))
         return min(scan_start_times)
 
-    def download(self, bands: Optional[List[Optional[str]]] = None, time: datetime = datetime.utcnow()) -> FileReader:
-        if None in bands:
+    def download(self, bands: Optional[List[Optional[str]]] = None, time: datetime = datetime.utcnow(),
+                 bbox: Optional[BoundingBox] = None) -> FileReader:
+        # Downloads are only implemented on the engine, so that every downloader has a single implementation
+        return DownloadEngine.run(lambda engine: self.async_download(engine, bands, time, bbox))
+
+    async def async_download(self, engine: DownloadEngine, bands: Optional[List[Optional[str]]] = None,
+                             time: datetime = datetime.utcnow(), bbox: Optional[BoundingBox] = None) -> FileReader:
+        if bands is not None and None in bands:
             bands = None
         self.__create_dir_if_not_exist()
         start = t.time()
-        file_paths = self._download(bands, time)
+        file_paths = await self._async_download(engine, bands, time, bbox)
         file_reader = FileReader(file_paths, reader=self.reader)
         print(f"Downloaded {self.subdir}: {round(t.time() - start, 4)} sec")
         return file_reader
@@ -1,12 +1,32 @@
 import os.path
 from datetime import datetime, timedelta
+from typing import Optional
 import bz2
 import re
+import shutil
+import tempfile
+import contextlib
 
+import numpy as np
+
+from wwclouds.data_types.axis import Axis
+from wwclouds.data_types.bounding_box import BoundingBox
 from wwclouds.domains.satellite.downloader.aws import Aws
+from wwclouds.domains.satellite.downloader.s3_listing_index import S3Directory
+from wwclouds.helpers.geostationary_helper import GeostationaryHelper
+from wwclouds.helpers.latitude_helper import LatitudeHelper
 
 
 class Himawari(Aws):
+    __decompression_chunk_size = 2 ** 20
+    # Full disk geometry of the 2 km bands, where every band is split into the same latitude stripes
+    __sub_longitude = 140.7
+    __line_count = 5500
+    __line_offset = 2750.5
+    __line_factor = 20466275
+    __segment_count = 10
+    __segment_lonlats = None
+
     def __init__(self):
         super().__init__(
             bucket="noaa-himawari8",
@@ -14,23 +34,89 @@ class Himawari(Aws):
             reader="ahi_hsd",
             update_frequency=timedelta(minutes=10))
 
-    def __get_aws_directory(self, update_time: datetime) -> str:
-        return f"{self.product}/{update_time.year}/{update_time.month:02.0f}/{update_time.day:02.0f}" \
-               f"/{update_time.hour:02.0f}{update_time.minute:02.0f}"
+    def _get_aws_directory(self, time: datetime) -> S3Directory:
+        update_time = self._get_previous_update_time(time)
+        return S3Directory(
+            f"{self.product}/{update_time.year}/{update_time.month:02.0f}/{update_time.day:02.0f}"
+            f"/{update_time.hour:02.0f}{update_time.minute:02.0f}/",
+            update_time, update_time + self.update_frequency
+        )
+
+    def _get_aws_day_directory(self, time: datetime) -> S3Directory:
+        start_time = datetime(time.year, time.month, time.day)
+        return S3Directory(
+            f"{self.product}/{time.year}/{time.month:02.0f}/{time.day:02.0f}/",
+            start_time, start_time + timedelta(days=1)
+        )
+
+    def _get_band_from_object_key(self, object_key: str) -> Optional[str]:
+        band_match = re.match(r"^.*/HS_H08_\d{8}_\d{4}_B(\d+)_FLDK_.*$", object_key)
+        return band_match.groups()[0] if band_match is not None else None
+
+    @staticmethod
+    def __get_segment_lonlats() -> list[tuple[np.ndarray, np.ndarray]]:
+        if Himawari.__segment_lonlats is None:
+            segment_line_count = Himawari.__line_count // Himawari.__segment_count
+            x = GeostationaryHelper.get_scan_angles(
+                np.linspace(0.5, Himawari.__line_count + 0.5, 1101), Himawari.__line_offset, Himawari.__line_factor
+            )
+            segment_lonlats = []
+            for segment_index in range(Himawari.__segment_count):
+                first_line = segment_index * segment_line_count + 0.5
+                lines = np.linspace(first_line, first_line + segment_line_count, 56)
+                y = GeostationaryHelper.get_scan_angles(lines, Himawari.__line_offset, Himawari.__line_factor)
+                lons, lats = GeostationaryHelper.get_lonlats(
+                    x[np.newaxis, :], y[:, np.newaxis], Himawari.__sub_longitude
+                )
+                on_disk = ~np.isnan(lats)
+                segment_lonlats.append((lons[on_disk], lats[on_disk]))
+            Himawari.__segment_lonlats = segment_lonlats
+        return Himawari.__segment_lonlats
+
+    @staticmethod
+    def get_segments_for_bbox(bbox: BoundingBox, margin: float = 1.0) -> list[int]:
+        segments = []
+        for segment_index, (lons, lats) in enumerate(Himawari.__get_segment_lonlats()):
+            in_lons = (lons - bbox.min_lon + margin) % Axis.LON.degree_count <= bbox.longitude_width + margin * 2
+            in_lats = LatitudeHelper.is_between_array(lats, bbox.min_lat - margin, bbox.max_lat + margin)
+            if np.any(in_lons & in_lats):
+                segments.append(segment_index + 1)
+        return segments
+
+    @staticmethod
+    def __get_segment_from_object_key(object_key: str) -> int:
+        return int(re.match(r"^.*_S(\d{2})\d{2}\.DAT.*$", object_key).groups()[0])
 
-    def _get_aws_prefix_for_band(self, band: str, update_time: datetime) -> str:
-        prev_update_time = self._get_previous_update_time(update_time)
-        return f"{self.__get_aws_directory(prev_update_time)}/HS_H08_{prev_update_time.year}{prev_update_time.month:02.0f}" \
-               f"{prev_update_time.day:02.0f}_{prev_update_time.hour:02.0f}{prev_update_time.minute:02.0f}_B{band}_FLDK"
+    def _select_object_keys_for_bbox(self, object_keys: list[str], bbox: Optional[BoundingBox]) -> list[str]:
+        # Missing segments are padded by the reader, so the area of the scene stays the full disk
+        if bbox is None:
+            return object_keys
+        segments = self.get_segments_for_bbox(bbox)
+        selected_object_keys = [
+            object_key for object_key in object_keys if self.__get_segment_from_object_key(object_key) in segments
+        ]
+        return selected_object_keys if selected_object_keys else object_keys  # The reader needs at least one segment
 
     def _file_posthandler(self, filepath: str) -> str:
-        new_filepath = filepath.rstrip(".bz2")
-        if not os.path.exists(new_filepath):
-            if not os.path.exists(filepath):
-                raise FileNotFoundError("bz2 encrypted file cannot be found")
-            with open(new_filepath, "wb") as new_file, bz2.BZ2File(filepath, "rb") as file:
-                for data in iter(lambda: file.read(100 * 1024), b""):
-                    new_file.write(data)
+        # Runs concurrently for every segment, which scales as the bz2 decompressor releases the GIL
+        new_filepath = filepath.removesuffix(".bz2")
+        if os.path.exists(new_filepath):
+            return new_filepath
+        directory, filename = os.path.split(new_filepath)
+        file_descriptor, tmp_filepath = tempfile.mkstemp(prefix=f".{filename}.", suffix=".part", dir=directory)
+        try:
+            with os.fdopen(file_descriptor, "wb") as new_file, bz2.BZ2File(filepath, "rb") as file:
+                shutil.copyfileobj(file, new_file, self.__decompression_chunk_size)
+            os.replace(tmp_filepath, new_filepath)
+        except FileNotFoundError:
+            os.remove(tmp_filepath)
+            if os.path.exists(new_filepath):  # Decompressed by another frame in the meantime
+                return new_filepath
+            raise FileNotFoundError("bz2 encrypted file cannot be found")
+        except BaseException:
+            os.remove(tmp_filepath)
+            raise
+        with contextlib.suppress(FileNotFoundError):
             os.remove(filepath)
         return new_filepath
 
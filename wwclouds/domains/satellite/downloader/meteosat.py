@@ -1,12 +1,18 @@
-import functools
 from datetime import datetime, timedelta
-import requests
+import os
+import asyncio
+import time as t
+import aiohttp
 from urllib.parse import quote_plus
 from enum import Enum, auto
 from typing import List, Optional
 
 from wwclouds.domains.satellite.downloader.downloader import Downloader
+from wwclouds.domains.satellite.downloader.download_engine import DownloadEngine
+from wwclouds.domains.satellite.downloader.part_file import PartFile
+from wwclouds.domains.satellite.downloader.seviri_native_subset import SeviriNativeSubset
 from wwclouds import config
+from wwclouds.data_types.bounding_box import BoundingBox
 from wwclouds.domains.satellite.satellite_enum import SatelliteEnum
 
 
@@ -31,6 +37,11 @@ class MeteosatType(Enum):
 
 
 class Meteosat(Downloader):
+    # The access token is shared by every Meteosat satellite and download, until shortly before it expires
+    __access_token: Optional[tuple[str, float]] = None
+    __access_token_request: Optional[asyncio.Future] = None
+    __access_token_margin_seconds = 60
+
     def __init__(self, satellite_enum: SatelliteEnum):
         meteosat_type = MeteosatType.from_satellite_flag(satellite_enum)
         super().__init__(
@@ -39,22 +50,53 @@ class Meteosat(Downloader):
             update_frequency=timedelta(minutes=15)
         )
         self.collection_id = meteosat_type.collection_id
+        self.__download_urls: dict[datetime, str] = dict()
 
     @property
     def __url_friendly_collection_id(self) -> str:
         return quote_plus(self.collection_id)
 
-    def _get_previous_scan_start_time_for_band(self, band: str, time: datetime):
+    async def _async_get_previous_scan_start_time_for_band(self, engine: DownloadEngine, band: str,
+                                                           time: datetime) -> datetime:
         return self._get_previous_update_time(time)
 
-    def __get_access_token(self) -> str:
-        response = requests.post(
-            url=config.METEOSAT_TOKEN_ENDPOINT,
-            auth=requests.auth.HTTPBasicAuth(config.METEOSAT_CONSUMER_KEY, config.METEOSAT_CONSUMER_SECRET),
+    @staticmethod
+    def __get_cached_access_token() -> Optional[str]:
+        if Meteosat.__access_token is None:
+            return None
+        access_token, expires_at = Meteosat.__access_token
+        return access_token if t.time() < expires_at else None
+
+    @staticmethod
+    def __cache_access_token(response_json: dict) -> str:
+        access_token = Meteosat.__get_access_token_from_response_json(response_json)
+        expires_in = float(response_json.get("expires_in", 0))
+        Meteosat.__access_token = (access_token, t.time() + expires_in - Meteosat.__access_token_margin_seconds)
+        return access_token
+
+    async def __async_request_access_token(self, engine: DownloadEngine) -> str:
+        response_json = await engine.post_json(
+            config.METEOSAT_TOKEN_ENDPOINT,
+            auth=aiohttp.BasicAuth(config.METEOSAT_CONSUMER_KEY, config.METEOSAT_CONSUMER_SECRET),
             data={'grant_type': 'client_credentials'},
             headers={"Content-Type": "application/x-www-form-urlencoded"}
         )
-        response_json = response.json()
+        return self.__cache_access_token(response_json)
+
+    async def __async_get_access_token(self, engine: DownloadEngine) -> str:
+        access_token = self.__get_cached_access_token()
+        if access_token is not None:
+            return access_token
+        # Downloads which start at the same time share one token request, within the event loop of their engine
+        request = Meteosat.__access_token_request
+        if request is None or request.done() or request.get_loop() is not asyncio.get_running_loop():
+            request = Meteosat.__access_token_request = asyncio.ensure_future(
+                self.__async_request_access_token(engine)
+            )
+        return await asyncio.shield(request)
+
+    @staticmethod
+    def __get_access_token_from_response_json(response_json: dict) -> str:
         access_token = response_json.get('access_token')
         if not access_token:
             recived_errors = []
@@ -70,18 +112,14 @@ class Meteosat(Downloader):
                      f"/{time.day:02.0f}/times/{time.hour:02.0f}/{time.minute:02.0f}/products"
         return f"{config.METEOSAT_BROWSE_ENDPOINT}/{url_ending}"
 
-    def __get_product_info_for_time(self, time: datetime) -> dict:
-        url = self.__get_product_url_for_time(time)
-        response = requests.get(url, params={"format": "json"})
-        return response.json()
-
-    def __get_product_id_for_time(self, time: datetime, retries: int = 3) -> Optional[str]:
+    async def __async_get_product_id_for_time(self, engine: DownloadEngine, time: datetime,
+                                              retries: int = 3) -> Optional[str]:
         if retries <= 0:
             return None
-        info = self.__get_product_info_for_time(time)
+        info = await engine.get_json(self.__get_product_url_for_time(time), params={"format": "json"})
         products = info.get("products")
         if not products:
-            return self.__get_product_id_for_time(time - self.update_frequency, retries - 1)
+            return await self.__async_get_product_id_for_time(engine, time - self.update_frequency, retries - 1)
         product = products[0]
         return product["id"]
 
@@ -89,25 +127,70 @@ class Meteosat(Downloader):
         url_ending = f"collections/{self.__url_friendly_collection_id}/products/{product_id}/entry?name={product_id}.nat"
         return f"{config.METEOSAT_DOWNLOAD_ENDPOINT}/{url_ending}"
 
-    @functools.lru_cache(32)
-    def __get_download_url_for_time(self, time: datetime) -> str:
-        product_id = self.__get_product_id_for_time(time)
-        return self.__get_download_url_for_product(product_id)
+    @staticmethod
+    def __get_subset_filepath(filepath: str, bands: Optional[List[str]]) -> Optional[str]:
+        # Subsets are named after their channels, as a product may be needed with other channels later on
+        if bands is None or None in bands:  # Bands without a channel are only found in the whole product
+            return None
+        channels = sorted(set(bands), key=SeviriNativeSubset.channel_names.index)
+        return f"{filepath.removesuffix('.nat')}.{'-'.join(channels)}.nat"
+
+    @staticmethod
+    def __get_existing_filepath(filepath: str, subset_filepath: Optional[str]) -> Optional[str]:
+        for existing_filepath in (filepath, subset_filepath):
+            if existing_filepath is not None and os.path.exists(existing_filepath):
+                return existing_filepath
+        return None
+
+    async def __async_get_download_url_for_time(self, engine: DownloadEngine, time: datetime) -> str:
+        if time not in self.__download_urls:
+            product_id = await self.__async_get_product_id_for_time(engine, time)
+            self.__download_urls[time] = self.__get_download_url_for_product(product_id)
+        return self.__download_urls[time]
+
+    async def __async_get_byte_ranges(self, engine: DownloadEngine, download_url: str,
+                                      byte_ranges: list[tuple[int, int]]) -> tuple[list[bytes], Optional[int]]:
+        access_token = await self.__async_get_access_token(engine)
+        return await engine.get_byte_ranges(
+            download_url, byte_ranges, params={"format": "json"}, headers={"Authorization": f"Bearer {access_token}"}
+        )
 
-    def _download(self, bands: Optional[List[str]], time: datetime) -> [str]:
+    async def __async_download_channels(self, engine: DownloadEngine, download_url: str, subset_filepath: str,
+                                        bands: List[str]) -> str:
+        # Only the header, the line records of the channels and the trailer are fetched
+        (header_bytes,), file_size = await self.__async_get_byte_ranges(
+            engine, download_url, [(0, SeviriNativeSubset.header_size)]
+        )
+        subset = SeviriNativeSubset(header_bytes, file_size, bands)
+        batches = await asyncio.gather(*(
+            self.__async_get_byte_ranges(engine, download_url, byte_ranges)
+            for byte_ranges in subset.get_byte_range_batches(config.METEOSAT_BYTE_RANGES_PER_REQUEST)
+        ))
+        part_file = PartFile(subset_filepath)
+        with part_file.open(200) as file:
+            file.write(subset.header)
+            for range_datas, _ in batches:
+                file.writelines(range_datas)
+        return part_file.commit()
+
+    async def _async_download(self, engine: DownloadEngine, bands: Optional[List[str]], time: datetime,
+                              bbox: Optional[BoundingBox]) -> [str]:
         previous_updated_time = self._get_previous_update_time(time)
-        download_url = self.__get_download_url_for_time(previous_updated_time)
+        download_url = await self.__async_get_download_url_for_time(engine, previous_updated_time)
         filepath = self._get_local_file_path(download_url)
-        if not self._file_is_downloaded(download_url):
-            access_token = self.__get_access_token()
-            stream_response = requests.get(
-                url=download_url,
-                params={"format": "json"},
-                stream=True,
-                headers={"Authorization": f"Bearer {access_token}"})
-            with open(filepath, "wb") as f:
-                for chunk in stream_response.iter_content(chunk_size=1024):
-                    if chunk:
-                        f.write(chunk)
-                        f.flush()
-        return [filepath]
+        subset_filepath = self.__get_subset_filepath(filepath, bands)
+        existing_filepath = self.__get_existing_filepath(filepath, subset_filepath)
+        if existing_filepath is not None:
+            return [existing_filepath]
+        if subset_filepath is not None:
+            try:
+                return [await self.__async_download_channels(engine, download_url, subset_filepath, bands)]
+            except ValueError as e:
+                print(f"Downloading the whole {self.subdir} product, as its channels cannot be fetched: {e}")
+        access_token = await self.__async_get_access_token(engine)
+        return [await engine.download_url(
+            download_url,
+            filepath,
+            params={"format": "json"},
+            headers={"Authorization": f"Bearer {access_token}"}
+        )]
@@ -1,10 +1,10 @@
 from enum import Enum, auto
 from datetime import datetime, timedelta
-from typing import Union
-from functools import lru_cache
+from typing import Optional
 import re
 
 from wwclouds.domains.satellite.downloader.aws import Aws
+from wwclouds.domains.satellite.downloader.s3_listing_index import S3Directory
 from wwclouds.domains.satellite.satellite_enum import SatelliteEnum
 
 
@@ -34,20 +34,25 @@ class NoaaGoes(Aws):
             reader="abi_l1b",
             update_frequency=timedelta(minutes=10))
 
-    def __get_aws_directory(self, time: datetime) -> str:
+    def _get_aws_directory(self, time: datetime) -> S3Directory:
+        start_time = datetime(time.year, time.month, time.day, time.hour)
         day_of_year = time.timetuple().tm_yday
-        return f"{self.product}/{time.year}/{day_of_year:03.0f}/{time.hour:02.0f}"
-
-    @lru_cache(maxsize=32)
-    def __get_scan_mode(self, time: datetime) -> Union[int, None]:
-        prefix = f"{self.__get_aws_directory(time)}/OR_{self.product}-M"
-        scan_mode_index = len(prefix)
-        for obj in self._iter_aws_by_prefix(prefix):
-            return int(obj["Key"][scan_mode_index])
-        return None
-
-    def _get_aws_prefix_for_band(self, band: str, time: datetime) -> str:
-        return f"{self.__get_aws_directory(time)}/OR_{self.product}-M{self.__get_scan_mode(time)}C{band}"
+        return S3Directory(
+            f"{self.product}/{time.year}/{day_of_year:03.0f}/{time.hour:02.0f}/",
+            start_time, start_time + timedelta(hours=1)
+        )
+
+    def _get_aws_day_directory(self, time: datetime) -> S3Directory:
+        start_time = datetime(time.year, time.month, time.day)
+        day_of_year = time.timetuple().tm_yday
+        return S3Directory(
+            f"{self.product}/{time.year}/{day_of_year:03.0f}/", start_time, start_time + timedelta(days=1)
+        )
+
+    def _get_band_from_object_key(self, object_key: str) -> Optional[str]:
+        # The band is found independently of the scan mode, which may change within an hour
+        band_match = re.match(rf"^.*/OR_{self.product}-M\d+C(\d+)_.*$", object_key)
+        return band_match.groups()[0] if band_match is not None else None
 
     def _get_scan_start_time_from_object_key(self, object_key: str) -> datetime:
         start_time_regex = re.compile(r"^.*_s(\d+)._.*$")
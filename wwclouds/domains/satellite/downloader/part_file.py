@@ -0,0 +1,33 @@
+import os
+from typing import BinaryIO, Optional
+
+
+class PartFile:
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        # Hidden, so that unfinished downloads are not taken for downloaded files
+        directory, filename = os.path.split(filepath)
+        self.part_filepath = os.path.join(directory, f".{filename}.part")
+
+    @property
+    def offset(self) -> int:
+        return os.path.getsize(self.part_filepath) if os.path.exists(self.part_filepath) else 0
+
+    @property
+    def range_headers(self) -> dict[str, str]:
+        offset = self.offset
+        return {"Range": f"bytes={offset}-"} if offset else dict()
+
+    def is_complete(self, status: int, content_range: Optional[str]) -> bool:
+        # A range starting at the end of the file is not satisfiable, which means that the part is complete
+        if status != 416 or not self.offset or content_range is None:
+            return False
+        return content_range.split("/")[-1] == str(self.offset)
+
+    def open(self, status: int) -> BinaryIO:
+        # Servers which ignore the range send the whole file, which is then written from the start
+        return open(self.part_filepath, "ab" if status == 206 else "wb")
+
+    def commit(self) -> str:
+        os.replace(self.part_filepath, self.filepath)
+        return self.filepath
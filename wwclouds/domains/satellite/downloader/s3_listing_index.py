@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import calendar
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from wwclouds.config import DATA_PATH_S3_LISTING_INDEX, S3_LISTING_TTL_SECONDS, S3_LISTING_FINAL_AFTER_SECONDS
+
+
+class S3Directory:
+    def __init__(self, prefix: str, start_time: datetime, end_time: datetime):
+        self.prefix = prefix
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def __repr__(self) -> str:
+        return f"S3Directory({self.prefix!r}, {self.start_time}, {self.end_time})"
+
+
+class S3ListingIndex:
+    def __init__(self, filepath: str = DATA_PATH_S3_LISTING_INDEX,
+                 ttl: timedelta = timedelta(seconds=S3_LISTING_TTL_SECONDS),
+                 final_after: timedelta = timedelta(seconds=S3_LISTING_FINAL_AFTER_SECONDS)):
+        self.filepath = filepath
+        self.ttl = ttl
+        self.final_after = final_after
+        self.__is_created = False
+
+    @staticmethod
+    def __to_timestamp(time: datetime) -> int:
+        return calendar.timegm(time.timetuple())
+
+    def __connect(self) -> sqlite3.Connection:
+        # A connection per operation, as the index is used from several threads and processes
+        if not self.__is_created:
+            os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        connection = sqlite3.connect(self.filepath, timeout=30)
+        if not self.__is_created:
+            with connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS objects ("
+                    "bucket TEXT NOT NULL, key TEXT NOT NULL, product TEXT NOT NULL, band TEXT NOT NULL, "
+                    "scan_start_time INTEGER NOT NULL, PRIMARY KEY (bucket, key))"
+                )
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS objects_by_scan_start_time "
+                    "ON objects (bucket, product, band, scan_start_time)"
+                )
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS listings ("
+                    "bucket TEXT NOT NULL, prefix TEXT NOT NULL, listed_at INTEGER NOT NULL, "
+                    "PRIMARY KEY (bucket, prefix))"
+                )
+            self.__is_created = True
+        return connection
+
+    def is_listed(self, bucket: str, directory: S3Directory) -> bool:
+        # Listings of directories which are still being written to expire, while older listings are final
+        listed_after = min(datetime.utcnow() - self.ttl, directory.end_time + self.final_after)
+        with closing(self.__connect()) as connection:
+            row = connection.execute(
+                "SELECT 1 FROM listings WHERE bucket = ? AND substr(?, 1, length(prefix)) = prefix "
+                "AND listed_at >= ? LIMIT 1",
+                (bucket, directory.prefix, self.__to_timestamp(listed_after))
+            ).fetchone()
+        return row is not None
+
+    def add_listing(self, bucket: str, product: str, directory: S3Directory,
+                    objects: Iterable[tuple[str, str, datetime]], listed_at: Optional[datetime] = None) -> None:
+        listed_at = datetime.utcnow() if listed_at is None else listed_at
+        with closing(self.__connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO objects (bucket, key, product, band, scan_start_time) VALUES (?, ?, ?, ?, ?)",
+                ((bucket, key, product, band, self.__to_timestamp(time)) for key, band, time in objects)
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO listings (bucket, prefix, listed_at) VALUES (?, ?, ?)",
+                (bucket, directory.prefix, self.__to_timestamp(listed_at))
+            )
+
+    def get_latest_object_keys(self, bucket: str, product: str, band: str, start_time: datetime,
+                               end_time: datetime) -> list[str]:
+        with closing(self.__connect()) as connection:
+            rows = connection.execute(
+                "SELECT key FROM objects WHERE bucket = ? AND product = ? AND band = ? AND scan_start_time = ("
+                "SELECT max(scan_start_time) FROM objects WHERE bucket = ? AND product = ? AND band = ? "
+                "AND scan_start_time BETWEEN ? AND ?) ORDER BY key",
+                (bucket, product, band, bucket, product, band,
+                 self.__to_timestamp(start_time), self.__to_timestamp(end_time))
+            ).fetchall()
+        return [key for key, in rows]
@@ -0,0 +1,126 @@
+import atexit
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+import boto3
+import boto3.s3.transfer as s3transfer
+from botocore import UNSIGNED
+from botocore.config import Config
+from s3transfer.subscribers import BaseSubscriber
+
+from wwclouds.config import S3_TRANSFER_MAX_CONCURRENCY, S3_TRANSFER_MAX_POOL_CONNECTIONS, \
+    S3_TRANSFER_MULTIPART_CHUNKSIZE
+from wwclouds.domains.satellite.downloader.part_file import PartFile
+
+
+class _TransferSubscriber(BaseSubscriber):
+    def __init__(self, on_progress: Optional[Callable[[int], None]], on_done: Callable[[Any], None]):
+        self.__on_progress = on_progress
+        self.__on_done = on_done
+
+    def on_progress(self, future, bytes_transferred: int, **kwargs) -> None:
+        if self.__on_progress is not None:
+            self.__on_progress(bytes_transferred)
+
+    def on_done(self, future, **kwargs) -> None:
+        self.__on_done(future)
+
+
+class _Transfer:
+    def __init__(self):
+        self.future = Future()
+        self.future.set_running_or_notify_cancel()
+        self.transfer_future = None
+        self.waiter_count = 1
+
+
+class S3TransferService:
+    # Concurrency and bandwidth are budgeted by the download engine which awaits the transfers, so the manager only
+    # needs enough threads to serve every transfer the engine lets through
+    def __init__(self, max_concurrency: int = S3_TRANSFER_MAX_CONCURRENCY,
+                 max_pool_connections: int = S3_TRANSFER_MAX_POOL_CONNECTIONS,
+                 multipart_chunksize: int = S3_TRANSFER_MULTIPART_CHUNKSIZE):
+        self.max_concurrency = max_concurrency
+        self.max_pool_connections = max_pool_connections
+        self.multipart_chunksize = multipart_chunksize
+
+        self.__client = None
+        self.__transfer_manager = None
+        self.__transfers: dict[tuple[str, str], _Transfer] = dict()
+        self.__lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    @property
+    def client(self) -> Any:
+        # Created on first use and kept for the life of the process, so that connections stay warm between frames
+        with self.__lock:
+            if self.__client is None:
+                self.__client = boto3.client("s3", config=Config(
+                    signature_version=UNSIGNED, max_pool_connections=self.max_pool_connections
+                ))
+            return self.__client
+
+    def __get_transfer_manager(self) -> Any:
+        client = self.client
+        with self.__lock:
+            if self.__transfer_manager is None:
+                transfer_config = s3transfer.TransferConfig(
+                    max_concurrency=self.max_concurrency,
+                    multipart_chunksize=self.multipart_chunksize,
+                    use_threads=True
+                )
+                self.__transfer_manager = s3transfer.create_transfer_manager(client, transfer_config)
+            return self.__transfer_manager
+
+    def __on_transfer_done(self, transfer_key: tuple[str, str], filepath: str, transfer: _Transfer,
+                           transfer_future) -> None:
+        with self.__lock:
+            self.__transfers.pop(transfer_key, None)
+        try:
+            transfer_future.result()
+            PartFile(filepath).commit()
+        except BaseException as e:
+            transfer.future.set_exception(e)
+            return
+        transfer.future.set_result(filepath)
+
+    def submit(self, bucket: str, key: str, filepath: str,
+               on_progress: Optional[Callable[[int], None]] = None) -> Future:
+        transfer_manager = self.__get_transfer_manager()
+        transfer_key = (bucket, key)
+        with self.__lock:
+            if transfer_key in self.__transfers:  # The same object may be requested by several frames at once
+                transfer = self.__transfers[transfer_key]
+                transfer.waiter_count += 1
+                return transfer.future
+            transfer = _Transfer()
+            self.__transfers[transfer_key] = transfer
+        transfer_future = transfer_manager.download(
+            bucket, key, PartFile(filepath).part_filepath,
+            subscribers=[_TransferSubscriber(
+                on_progress,
+                lambda done_future: self.__on_transfer_done(transfer_key, filepath, transfer, done_future)
+            )]
+        )
+        with self.__lock:
+            transfer.transfer_future = transfer_future
+        return transfer.future
+
+    def cancel(self, bucket: str, key: str) -> None:
+        # A transfer is only cancelled once every request which is waiting for it has given up
+        with self.__lock:
+            transfer = self.__transfers.get((bucket, key))
+            if transfer is None:
+                return
+            transfer.waiter_count -= 1
+            if transfer.waiter_count > 0 or transfer.transfer_future is None:
+                return
+            transfer_future = transfer.transfer_future
+        transfer_future.cancel()
+
+    def shutdown(self) -> None:
+        with self.__lock:
+            transfer_manager, self.__transfer_manager = self.__transfer_manager, None
+        if transfer_manager is not None:
+            transfer_manager.shutdown()
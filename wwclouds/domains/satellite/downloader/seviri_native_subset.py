@@ -0,0 +1,102 @@
+import numpy as np
+from satpy.readers.eum_base import time_cds_short
+from satpy.readers.seviri_l1b_native_hdr import GSDTRecords, get_native_header, native_trailer
+
+from wwclouds.domains.satellite.downloader.byte_ranges import ByteRanges
+
+
+class SeviriNativeSubset:
+    channel_names = ["VIS006", "VIS008", "IR_016", "IR_039", "WV_062", "WV_073", "IR_087", "IR_097", "IR_108",
+                     "IR_120", "IR_134", "HRV"]  # Same order as the selected band ids in the header
+    header_dtype = get_native_header(with_archive_header=True)
+    header_size = header_dtype.itemsize
+    __archive_header_start = b"FormatName                  : NATIVE"
+    __visir_full_disk_column_count = 3712
+    __hrv_records_per_line = 3
+
+    def __init__(self, header_bytes: bytes, file_size: int, channels: list[str]):
+        # Only files with an archive header list their channels, which the reader needs for a subset
+        if not header_bytes.startswith(self.__archive_header_start) or len(header_bytes) < self.header_size:
+            raise ValueError("native file has no archive header")
+        self.__header_bytes = header_bytes[:self.header_size]
+        header = np.frombuffer(self.__header_bytes, dtype=self.header_dtype, count=1)[0]
+        self.__secondary_header = header["15_SECONDARY_PRODUCT_HEADER"]
+
+        available_channels = [
+            channel_name for channel_name, band_id in zip(self.channel_names, self.__get_value("SelectedBandIDs"))
+            if band_id == "X"
+        ]
+        if not set(channels).issubset(available_channels):
+            raise ValueError(f"channels {sorted(set(channels) - set(available_channels))} are not in the file")
+        self.channels = [channel_name for channel_name in available_channels if channel_name in channels]
+
+        # The reader pads the VISIR columns to a multiple of 4, and only stores half of the full disk HRV columns
+        column_count = int(self.__get_value("WestColumnSelectedRectangle")) \
+            - int(self.__get_value("EastColumnSelectedRectangle")) + 1
+        visir_column_count = column_count + (-column_count % 4)
+        if int(self.__get_value("NumberColumnsVISIR")) != visir_column_count:
+            # The reader keeps the padded count, so the records of such files cannot be located from the header
+            raise ValueError("native file header does not match the padded number of VISIR columns")
+        hrv_column_count = int(self.__get_value("NumberColumnsHRV"))
+        if column_count >= self.__visir_full_disk_column_count:
+            hrv_column_count = int(hrv_column_count / 2)
+        self.line_count = int(self.__get_value("NumberLinesVISIR"))
+
+        visir_record_size = self.__get_line_record_dtype(visir_column_count).itemsize
+        hrv_record_size = self.__get_line_record_dtype(hrv_column_count).itemsize
+        visir_channels = [channel_name for channel_name in available_channels if channel_name != "HRV"]
+        line_ranges = [
+            (index * visir_record_size, (index + 1) * visir_record_size)
+            for index, channel_name in enumerate(visir_channels) if channel_name in self.channels
+        ]
+        line_size = len(visir_channels) * visir_record_size
+        if "HRV" in available_channels:
+            if "HRV" in self.channels:
+                line_ranges.append((line_size, line_size + self.__hrv_records_per_line * hrv_record_size))
+            line_size += self.__hrv_records_per_line * hrv_record_size
+
+        trailer_start = self.header_size + self.line_count * line_size
+        if trailer_start + native_trailer.itemsize != file_size:
+            raise ValueError("native file size does not match its header")
+        self.byte_ranges = ByteRanges.coalesce([
+            (self.header_size + line_index * line_size + start, self.header_size + line_index * line_size + stop)
+            for line_index in range(self.line_count) for start, stop in line_ranges
+        ] + [(trailer_start, file_size)])
+
+    def __get_value(self, name: str) -> str:
+        return self.__secondary_header[name]["Value"].decode("latin-1").strip()
+
+    @staticmethod
+    def __get_line_record_dtype(column_count: int) -> np.dtype:
+        # Same line records as the reader, where every pixel is packed into 10 bits
+        return np.dtype([
+            ("gp_pk", [("GP_PK_HEADER", GSDTRecords.gp_pk_header), ("GP_PK_SH1", GSDTRecords.gp_pk_sh1)]),
+            ("version", np.uint8),
+            ("satid", np.uint16),
+            ("time", (np.uint16, 5)),
+            ("lineno", np.uint32),
+            ("chan_id", np.uint8),
+            ("acq_time", time_cds_short),
+            ("line_validity", np.uint8),
+            ("line_rquality", np.uint8),
+            ("line_gquality", np.uint8),
+            ("line_data", (np.uint8, int(column_count * 1.25)))
+        ])
+
+    @property
+    def header(self) -> bytes:
+        # The reader builds its line records from the selected band ids, so they must only list the subset
+        secondary_header_offset = self.header_dtype.fields["15_SECONDARY_PRODUCT_HEADER"][1]
+        secondary_header_dtype = self.header_dtype.fields["15_SECONDARY_PRODUCT_HEADER"][0]
+        band_ids_dtype, band_ids_offset = secondary_header_dtype.fields["SelectedBandIDs"]
+        value_offset = secondary_header_offset + band_ids_offset + band_ids_dtype.fields["Value"][1]
+        band_ids = "".join("X" if channel_name in self.channels else "-" for channel_name in self.channel_names)
+        header_bytes = bytearray(self.__header_bytes)
+        header_bytes[value_offset:value_offset + len(band_ids)] = band_ids.encode("latin-1")
+        return bytes(header_bytes)
+
+    def get_byte_range_batches(self, ranges_per_request: int) -> list[list[tuple[int, int]]]:
+        return [
+            self.byte_ranges[index:index + ranges_per_request]
+            for index in range(0, len(self.byte_ranges), ranges_per_request)
+        ]
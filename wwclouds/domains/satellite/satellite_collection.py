@@ -1,42 +1,101 @@
+import asyncio
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Any, Awaitable, Callable, Optional
 
+from wwclouds.data_types.bounding_box import BoundingBox
 from wwclouds.domains.satellite.satellite_enum import SatelliteEnum
 from wwclouds.domains.satellite.satellite_mapping import SatelliteMapping
 from wwclouds.domains.satellite.satellite_type import SatelliteType
 from wwclouds.domains.satellite import downloader
+from wwclouds.domains.satellite.downloader.download_engine import DownloadEngine
 
 
 class SatelliteCollection:
     def __init__(self, satellite_enums: list[SatelliteEnum]):
+        self.satellite_enums = list(satellite_enums)
         self.satellites: [SatelliteType] = list(map(SatelliteMapping.get_satellite_type, satellite_enums))
+        self.__scan_start_times: dict[tuple[tuple[float, ...], datetime], list[datetime]] = dict()
 
-    def __get_scan_start_times(self, frequencies: list[float], utctime: datetime) -> list[datetime]:
-        scan_start_times = []
-        for satellite in self.satellites:
-            bands = satellite.get_band_for_frequencies(frequencies)
-            scan_start_time = satellite.downloader.get_first_scan_start_time_for_bands(bands, utctime)
-            scan_start_times.append(scan_start_time)
-        return sorted(scan_start_times)
+    async def __async_get_scan_start_time(self, engine: DownloadEngine, satellite: SatelliteType,
+                                          frequencies: list[float], utctime: datetime) -> datetime:
+        bands = satellite.get_band_for_frequencies(frequencies)
+        return await engine.with_timeout(
+            satellite.downloader.async_get_first_scan_start_time_for_bands(engine, bands, utctime),
+            satellite.downloader.subdir
+        )
 
-    def get_scan_times_strings(self, frequencies: list[float], utctime: datetime) -> tuple[str, str]:
-        scan_times = self.__get_scan_start_times(frequencies, utctime)
+    async def async_get_scan_start_times(self, engine: DownloadEngine, frequencies: list[float],
+                                         utctime: datetime) -> list[datetime]:
+        # The scan start times are kept, so that the products and downloads of a time share a single lookup
+        key = (tuple(frequencies), utctime)
+        if key not in self.__scan_start_times:
+            self.__scan_start_times[key] = list(await asyncio.gather(*(
+                self.__async_get_scan_start_time(engine, satellite, frequencies, utctime)
+                for satellite in self.satellites
+            )))
+        return self.__scan_start_times[key]
+
+    def get_scan_start_times(self, frequencies: list[float], utctime: datetime) -> list[datetime]:
+        scan_start_times = self.__scan_start_times.get((tuple(frequencies), utctime))
+        if scan_start_times is not None:
+            return scan_start_times
+        return DownloadEngine.run(lambda engine: self.async_get_scan_start_times(engine, frequencies, utctime))
+
+    async def async_prefetch_listings(self, engine: DownloadEngine, frequencies: list[float],
+                                      utctimes: list[datetime]) -> None:
+        await asyncio.gather(*(satellite.downloader.async_prefetch_listings(engine, utctimes)
+                               for satellite in self.satellites))
+        await asyncio.gather(*(self.async_get_scan_start_times(engine, frequencies, utctime) for utctime in utctimes))
+
+    def prefetch_listings(self, frequencies: list[float], utctimes: list[datetime]) -> None:
+        start_time = time.time()
+        DownloadEngine.run(lambda engine: self.async_prefetch_listings(engine, frequencies, utctimes))
+        print(f"Prefetched listings and scan start times: {round(time.time() - start_time, 4)} sec")
+
+    @staticmethod
+    def __to_scan_times_strings(scan_start_times: list[datetime]) -> tuple[str, str]:
+        scan_times = sorted(scan_start_times)
         day_str = scan_times[0].strftime("%y%m%d").zfill(6)
         times_str_list = list(
             str(scan_time.hour * 3600 + scan_time.minute * 60 + scan_time.second).zfill(5) for scan_time in scan_times
         )
         return day_str, ''.join(times_str_list)
 
-    def download_all(self, frequencies: Optional[list[float]], utctime: datetime) -> [downloader.FileReader]:
+    def get_scan_times_strings(self, frequencies: list[float], utctime: datetime) -> tuple[str, str]:
+        return self.__to_scan_times_strings(self.get_scan_start_times(frequencies, utctime))
+
+    async def __async_download(self, engine: DownloadEngine, satellite: SatelliteType, frequencies: list[float],
+                               utctime: datetime,
+                               on_download: Optional[Callable[[downloader.FileReader], Awaitable[Any]]],
+                               bbox: Optional[BoundingBox]) -> Any:
+        bands = satellite.get_band_for_frequencies(frequencies)
+        file_reader = await engine.with_timeout(
+            satellite.downloader.async_download(engine, bands, utctime, bbox), satellite.downloader.subdir
+        )
+        return file_reader if on_download is None else await on_download(file_reader)
+
+    async def async_download_all(self, engine: DownloadEngine, frequencies: Optional[list[float]], utctime: datetime,
+                                 on_download: Optional[Callable[[downloader.FileReader], Awaitable[Any]]] = None,
+                                 bbox: Optional[BoundingBox] = None) -> list[Any]:
+        # Every satellite continues with on_download as soon as its own files are downloaded
         if frequencies is None:
             frequencies = []
-        print(f"Downloading all for: {self.get_scan_times_strings(frequencies, utctime)}")
-        file_readers = []
-        for satellite in self.satellites:
-            bands = satellite.get_band_for_frequencies(frequencies)
-            file_readers.append(satellite.downloader.download(bands, utctime))
-        return file_readers
+        scan_start_times = await self.async_get_scan_start_times(engine, frequencies, utctime)
+        print(f"Downloading all for: {self.__to_scan_times_strings(scan_start_times)}")
+        return list(await asyncio.gather(*(
+            self.__async_download(engine, satellite, frequencies, utctime, on_download, bbox)
+            for satellite in self.satellites
+        )))
 
+    def download_all(self, frequencies: Optional[list[float]], utctime: datetime,
+                     bbox: Optional[BoundingBox] = None) -> [downloader.FileReader]:
+        start_time = time.time()
+        file_readers = DownloadEngine.run(
+            lambda engine: self.async_download_all(engine, frequencies, utctime, bbox=bbox)
+        )
+        print(f"Downloaded all: {round(time.time() - start_time, 4)} sec")
+        return file_readers
 
 if __name__ == '__main__':
     pass
@@ -4,17 +4,18 @@ from wwclouds.domains.satellite.satellite_enum import SatelliteEnum
 
 
 class _SatelliteMappingEntry:
-    def __init__(self, satellite_type_class: Type[satellite_type.SatelliteType]):
+    def __init__(self, satellite_type_class: Type[satellite_type.SatelliteType], sub_longitude: float):
         self.satellite_type_class = satellite_type_class
+        self.sub_longitude = sub_longitude  # Longitude of the projection origin in the satellite data
 
 
 class SatelliteMapping:
     _MAPPING = {
-        SatelliteEnum.METEOSAT8: _SatelliteMappingEntry(satellite_type.Meteosat),
-        SatelliteEnum.METEOSAT11: _SatelliteMappingEntry(satellite_type.Meteosat),
-        SatelliteEnum.GOES16: _SatelliteMappingEntry(satellite_type.NoaaGoes),
-        SatelliteEnum.GOES17: _SatelliteMappingEntry(satellite_type.NoaaGoes),
-        SatelliteEnum.HIMAWARI8: _SatelliteMappingEntry(satellite_type.Himawari)
+        SatelliteEnum.METEOSAT8: _SatelliteMappingEntry(satellite_type.Meteosat, 41.5),
+        SatelliteEnum.METEOSAT11: _SatelliteMappingEntry(satellite_type.Meteosat, 0.0),
+        SatelliteEnum.GOES16: _SatelliteMappingEntry(satellite_type.NoaaGoes, -75.0),
+        SatelliteEnum.GOES17: _SatelliteMappingEntry(satellite_type.NoaaGoes, -137.0),
+        SatelliteEnum.HIMAWARI8: _SatelliteMappingEntry(satellite_type.Himawari, 140.7)
     }
 
     @staticmethod
@@ -29,3 +30,7 @@ class SatelliteMapping:
     def get_satellite_type(satellite_enum: SatelliteEnum) -> satellite_type.SatelliteType:
         mapping_entry = SatelliteMapping.__get_entry(satellite_enum)
         return mapping_entry.satellite_type_class(satellite_enum=satellite_enum)
+
+    @staticmethod
+    def get_sub_longitude(satellite_enum: SatelliteEnum) -> float:
+        return SatelliteMapping.__get_entry(satellite_enum).sub_longitude
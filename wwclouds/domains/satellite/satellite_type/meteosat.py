@@ -5,4 +5,17 @@ from wwclouds.domains.satellite.satellite_enum import SatelliteEnum
 
 class Meteosat(SatelliteType):
     def __init__(self, satellite_enum: SatelliteEnum):
-        super().__init__(downloader.Meteosat(satellite_enum), dict())
+        band_frequency_mapping = {
+            "VIS006": (0.56, 0.71),
+            "VIS008": (0.74, 0.88),
+            "IR_016": (1.50, 1.78),
+            "IR_039": (3.48, 4.36),
+            "WV_062": (5.35, 7.15),
+            "WV_073": (6.85, 7.85),
+            "IR_087": (8.30, 9.10),
+            "IR_097": (9.38, 9.94),
+            "IR_108": (9.80, 11.80),
+            "IR_120": (11.00, 13.00),
+            "IR_134": (12.40, 14.40)
+        }
+        super().__init__(downloader.Meteosat(satellite_enum), band_frequency_mapping)
@@ -0,0 +1,19 @@
+import functools
+
+import numpy as np
+from pyproj import Proj
+from pyresample import AreaDefinition
+
+
+class AreaAxisHelper:
+    @staticmethod
+    @functools.lru_cache(32)
+    def get_lonlat_axes(area: AreaDefinition) -> tuple[np.ndarray, np.ndarray]:
+        proj_x, proj_y = area.get_proj_vectors()
+        proj = Proj(area.crs)
+        lons, _ = proj(proj_x, np.full_like(proj_x, proj_y[0]), inverse=True)
+        _, lats = proj(np.full_like(proj_y, proj_x[0]), proj_y, inverse=True)
+        lons, lats = np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64)
+        for axis in lons, lats:
+            axis.flags.writeable = False
+        return lons, lats
@@ -1,4 +1,7 @@
 import abc
+from typing import Optional
+
+import numpy as np
 
 
 class AxisHelper(metaclass=abc.ABCMeta):
@@ -16,3 +19,51 @@ class AxisHelper(metaclass=abc.ABCMeta):
     @abc.abstractmethod
     def get_middle(a: float, b: float) -> float:
         pass
+
+    @staticmethod
+    @abc.abstractmethod
+    def is_between_array(values: np.ndarray, a: float, b: float) -> np.ndarray:
+        pass
+
+    @staticmethod
+    @abc.abstractmethod
+    def get_diff_array(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        pass
+
+    @staticmethod
+    @abc.abstractmethod
+    def get_middle_array(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        pass
+
+    @classmethod
+    @abc.abstractmethod
+    def get_first_index_range(cls, axis_values: np.ndarray, a: float, b: float) -> tuple[int, int]:
+        pass
+
+    @classmethod
+    def get_indexes_from_axis(cls, axis_values: np.ndarray, from_axis_val: float, to_axis_val: float,
+                              edge_size: int = 0,
+                              max_length: Optional[int] = None) -> np.ndarray:
+        axis_length = len(axis_values)
+        start, stop = cls.get_first_index_range(axis_values, from_axis_val, to_axis_val)
+        if start == stop:
+            return np.array([], dtype=np.int64)
+
+        edge_offsets = np.arange(edge_size, dtype=np.int64)
+        edge_before = (start - 1 - edge_offsets) % axis_length
+        edge_after = (stop + edge_offsets) % axis_length if stop < axis_length else edge_offsets[:0]
+        indexes = np.concatenate([edge_before, np.arange(start, stop, dtype=np.int64), edge_after])
+
+        if max_length is not None and max_length < len(indexes):
+            middle_axis_val = cls.get_middle(from_axis_val, to_axis_val)
+            diffs = cls.get_diff_array(np.asarray(axis_values)[indexes], middle_axis_val)
+            start_index = 0
+            end_index = len(indexes) - 1
+            for _ in range(len(indexes) - max_length):
+                if diffs[start_index] > diffs[end_index]:
+                    start_index += 1
+                else:
+                    end_index -= 1
+            indexes = indexes[start_index:(end_index + 1)]
+
+        return indexes
@@ -1,3 +1,4 @@
+import numpy as np
 import xarray as xr
 from datetime import datetime
 
@@ -8,3 +9,16 @@ class DataArraysHelper:
         start_time = min(data_array.attrs["start_time"] for data_array in data_arrays)
         end_time = max(data_array.attrs["end_time"] for data_array in data_arrays)
         return start_time, end_time
+
+    @staticmethod
+    def decode(data_array: xr.DataArray) -> xr.DataArray:
+        if not any(key in data_array.attrs for key in ("scale_factor", "add_offset", "_FillValue")):
+            return data_array
+        attrs = dict(data_array.attrs)
+        scale_factor = attrs.pop("scale_factor", 1.0)
+        add_offset = attrs.pop("add_offset", 0.0)
+        fill_value = attrs.pop("_FillValue", None)
+        decoded = data_array.where(data_array != fill_value) if fill_value is not None else data_array
+        decoded = (decoded * scale_factor + add_offset).astype(np.float32)
+        decoded.attrs = attrs
+        return decoded
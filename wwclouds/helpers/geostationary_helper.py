@@ -0,0 +1,30 @@
+import numpy as np
+
+
+class GeostationaryHelper:
+    # Constants of the CGMS normalized geostationary projection, in km
+    __satellite_distance = 42164.0
+    __radius_ratio_squared = 1.006739501  # Squared ratio between the equatorial and polar radius
+    __distance_constant = 1737122264.0  # Squared satellite distance minus the squared equatorial radius
+
+    @staticmethod
+    def get_scan_angles(pixels: np.ndarray, offset: float, factor: float) -> np.ndarray:
+        return np.deg2rad((np.asarray(pixels, dtype=np.float64) - offset) * 2 ** 16 / factor)
+
+    @staticmethod
+    def get_lonlats(x: np.ndarray, y: np.ndarray, sub_longitude: float) -> tuple[np.ndarray, np.ndarray]:
+        # Scan angles are in radians, where y grows southwards. Points outside of the earth disk are nan
+        x, y = np.broadcast_arrays(x, y)
+        cos_x, cos_y, sin_x, sin_y = np.cos(x), np.cos(y), np.sin(x), np.sin(y)
+        y_term = cos_y ** 2 + GeostationaryHelper.__radius_ratio_squared * sin_y ** 2
+        discriminant = (GeostationaryHelper.__satellite_distance * cos_x * cos_y) ** 2 \
+            - y_term * GeostationaryHelper.__distance_constant
+        with np.errstate(invalid="ignore"):
+            sd = np.sqrt(discriminant)
+        sn = (GeostationaryHelper.__satellite_distance * cos_x * cos_y - sd) / y_term
+        s1 = GeostationaryHelper.__satellite_distance - sn * cos_x * cos_y
+        s2 = sn * sin_x * cos_y
+        s3 = -sn * sin_y
+        lons = (np.rad2deg(np.arctan2(s2, s1)) + sub_longitude + 180) % 360 - 180
+        lats = np.rad2deg(np.arctan(GeostationaryHelper.__radius_ratio_squared * s3 / np.hypot(s1, s2)))
+        return lons, lats
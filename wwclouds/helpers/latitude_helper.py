@@ -1,3 +1,5 @@
+import numpy as np
+
 from wwclouds.helpers.axis_helper import AxisHelper
 
 
@@ -15,3 +17,25 @@ class LatitudeHelper(AxisHelper):
     @staticmethod
     def get_middle(a: float, b: float) -> float:
         return (a + b) / 2
+
+    @staticmethod
+    def is_between_array(lats: np.ndarray, lat_a: float, lat_b: float) -> np.ndarray:
+        lat_min, lat_max = sorted((lat_a, lat_b))
+        return (lat_min <= lats) & (lats <= lat_max)
+
+    @staticmethod
+    def get_diff_array(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return np.abs(np.subtract(a, b))
+
+    @staticmethod
+    def get_middle_array(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return np.add(a, b) / 2
+
+    @classmethod
+    def get_first_index_range(cls, lats: np.ndarray, lat_a: float, lat_b: float) -> tuple[int, int]:
+        if len(lats) > 1 and lats[0] > lats[-1]:
+            raise ValueError("latitudes must be sorted in ascending order")
+        lat_min, lat_max = sorted((lat_a, lat_b))
+        start = int(np.searchsorted(lats, lat_min, side="left"))
+        stop = int(np.searchsorted(lats, lat_max, side="right"))
+        return (start, stop) if start < stop else (0, 0)
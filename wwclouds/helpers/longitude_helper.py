@@ -1,4 +1,7 @@
 import functools
+
+import numpy as np
+
 from wwclouds.data_types.axis import Axis
 from wwclouds.helpers.axis_helper import AxisHelper
 
@@ -37,3 +40,94 @@ class LongitudeHelper(AxisHelper):
         range_width = LongitudeHelper.get_diff(lon_a, lon_b)
         lon_middle = LongitudeHelper.get_middle(lon_a, lon_b)
         return LongitudeHelper.get_diff(lon_middle, lon) <= range_width / 2
+
+    @staticmethod
+    def add_array(lons: np.ndarray, num: np.ndarray) -> np.ndarray:
+        fixed_lons = np.add(lons, Axis.LON.degree_count / 2)
+        fixed_results = np.mod(fixed_lons + num, Axis.LON.degree_count)
+        return fixed_results - (Axis.LON.degree_count / 2)
+
+    @staticmethod
+    def get_diff_array(lons_a: np.ndarray, lons_b: np.ndarray) -> np.ndarray:
+        lon_diffs = np.abs(np.subtract(lons_a, lons_b))
+        return np.minimum(lon_diffs, Axis.LON.degree_count - lon_diffs)
+
+    @staticmethod
+    def get_middle_array(lons_a: np.ndarray, lons_b: np.ndarray) -> np.ndarray:
+        lon_diffs = LongitudeHelper.get_diff_array(lons_a, lons_b)
+        lon_middles = []
+        for lons in lons_a, lons_b:
+            cur_lon_middles = np.add(lons, lon_diffs / 2)
+            cur_lon_middles = np.where(
+                cur_lon_middles > Axis.LON.degree_count / 2,
+                cur_lon_middles - Axis.LON.degree_count,
+                cur_lon_middles
+            )
+            lon_middles.append(cur_lon_middles)
+        lon_middle_diffs = [
+            LongitudeHelper.get_diff_array(lons_a, lons) + LongitudeHelper.get_diff_array(lons_b, lons)
+            for lons in lon_middles
+        ]
+        return np.where(lon_middle_diffs[0] <= lon_middle_diffs[1], *lon_middles)
+
+    @staticmethod
+    def is_between_array(lons: np.ndarray, lon_a: float, lon_b: float) -> np.ndarray:
+        range_width = LongitudeHelper.get_diff(lon_a, lon_b)
+        lon_middle = LongitudeHelper.get_middle(lon_a, lon_b)
+        return LongitudeHelper.get_diff_array(lon_middle, lons) <= range_width / 2
+
+    @staticmethod
+    def __get_wrap_index(lons: np.ndarray) -> int:
+        low, high = 1, len(lons)
+        while low < high:
+            middle = (low + high) // 2
+            if lons[middle] < lons[0]:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    @staticmethod
+    def __get_value_ranges(lon_a: float, lon_b: float) -> list[tuple[float, float]]:
+        half_width = LongitudeHelper.get_diff(lon_a, lon_b) / 2
+        lon_middle = LongitudeHelper.get_middle(lon_a, lon_b)
+        lon_low, lon_high = lon_middle - half_width, lon_middle + half_width
+        max_lon = Axis.LON.degree_count / 2
+        if lon_low < -max_lon:
+            return [(-max_lon, lon_high), (lon_low + Axis.LON.degree_count, max_lon)]
+        elif lon_high > max_lon:
+            return [(-max_lon, lon_high - Axis.LON.degree_count), (lon_low, max_lon)]
+        return [(lon_low, lon_high)]
+
+    @classmethod
+    def get_first_index_range(cls, lons: np.ndarray, lon_a: float, lon_b: float) -> tuple[int, int]:
+        # Expects an ascending axis of longitudes, which wraps around at most once
+        lons_length = len(lons)
+        wrap_index = LongitudeHelper.__get_wrap_index(lons)
+        index_ranges = []
+        for offset, lons_sorted in ((0, lons[:wrap_index]), (wrap_index, lons[wrap_index:])):
+            for lon_low, lon_high in LongitudeHelper.__get_value_ranges(lon_a, lon_b):
+                start = offset + int(np.searchsorted(lons_sorted, lon_low, side="left"))
+                stop = offset + int(np.searchsorted(lons_sorted, lon_high, side="right"))
+                if start < stop:
+                    index_ranges.append((start, stop))
+        if len(index_ranges) == 0:
+            return 0, 0
+
+        index_ranges.sort()
+        start, stop = index_ranges[0]
+        for cur_start, cur_stop in index_ranges[1:]:
+            if cur_start > stop:
+                break
+            stop = max(stop, cur_stop)
+
+        # Align the range edges with is_between, as the range bounds may round differently
+        while start > 0 and cls.is_between(lons[start - 1], lon_a, lon_b):
+            start -= 1
+        while start < stop and not cls.is_between(lons[start], lon_a, lon_b):
+            start += 1
+        while stop < lons_length and cls.is_between(lons[stop], lon_a, lon_b):
+            stop += 1
+        while stop > start and not cls.is_between(lons[stop - 1], lon_a, lon_b):
+            stop -= 1
+        return (start, stop) if start < stop else (0, 0)
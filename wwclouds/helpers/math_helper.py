@@ -1,7 +1,13 @@
 from math import exp
 
+import numpy as np
+
 
 class MathHelper:
     @staticmethod
     def sigmoid(x: float) -> float:
         return 1 / (1 + exp(-x))
+
+    @staticmethod
+    def sigmoid_array(x: np.ndarray) -> np.ndarray:
+        return 1 / (1 + np.exp(-x))